@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import argparse
+import importlib
+import subprocess
+
+# Single entry point for every script. Only the standard library is imported here; the
+# generators, OpenAI, pandas and the Google clients are imported by the subcommand that
+# needs them, and .env is only loaded once a command actually runs, so `--help` and
+# importing any module have no side effects.
+#
+#   python cli.py job_description [--input titles.csv]
+#   python cli.py queue work interview_questions --forever
+#   python cli.py plan job_description --mode all
+#   python cli.py bench-import
+
+GENERATORS = {
+    "job_description": "job_desc_gen",
+    "interview_questions": "interview_ques_gen",
+    "resume_template": "py_resume_temp_gen",
+    "skills_guide": "skills_gen",
+}
+
+def import_times(module: str) -> list:
+    # Runs `python -X importtime -c "import <module>"` in a fresh interpreter and returns
+    # (cumulative microseconds, package) for every import, slowest first
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, package = line[len("import time:"):].split("|")
+        times.append((int(cumulative), package.strip()))
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1])
+    return sorted(times, reverse=True)
+
+def bench_import(modules: list, top: int) -> None:
+    for module in modules:
+        times = import_times(module)
+        total = next((us for us, package in times if package == module), None)
+        print(json.dumps({
+            "module": module,
+            "import_ms": round(total / 1000, 1) if total is not None else None,
+            "slowest": [{"package": package, "ms": round(us / 1000, 1)} for us, package in times[1:top + 1]],
+        }))
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="SEO content generation")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for content_type in GENERATORS:
+        command = commands.add_parser(content_type, help=f"generate {content_type.replace('_', ' ')} pages")
+        command.add_argument("--input", help="titles CSV/JSONL file, or - for stdin")
+        command.add_argument("--verbose", action="store_true", help="print full responses")
+
+    queue = commands.add_parser("queue", help="queue-backed workers (work_queue.py)")
+    queue.add_argument("action", choices=["enqueue", "work", "status", "eta"])
+    queue.add_argument("content_type", choices=sorted(GENERATORS))
+    queue.add_argument("source", nargs="?", help="titles file for enqueue")
+    queue.add_argument("--forever", action="store_true", help="keep polling once the queue is drained")
+
+    plan = commands.add_parser("plan", help="estimate calls, cost and duration of a run")
+    plan.add_argument("content_types", nargs="+", choices=sorted(GENERATORS))
+    plan.add_argument("--input", help="titles CSV/JSONL (defaults to each generator's own input)")
+    plan.add_argument("--mode", choices=["serial", "async", "batch", "packed", "all"], default="async")
+
+    commands.add_parser("routing", help="pass rate, latency and cost per model from the usage history")
+
+    profile = commands.add_parser("profile", help="show cached role profiles")
+    profile.add_argument("titles", nargs="*")
+    profile.add_argument("--report", action="store_true", help="tokens per title and per call with and without profiles")
+
+    audit = commands.add_parser("dedup-audit", help="near-duplicate pairs across a whole worksheet")
+    audit.add_argument("content_type", choices=[ct for ct in GENERATORS if ct != "skills_guide"])
+
+    related = commands.add_parser("related", help="related-roles links for the job description worksheet")
+    related.add_argument("--rebuild", action="store_true", help="recompute every title instead of new and changed ones")
+
+    slug = commands.add_parser("slugs", help="seed the slug index from a worksheet's slug column")
+    slug.add_argument("content_type", choices=["job_description"])
+
+    fake = commands.add_parser("cms-fake", help="local stand-in for the CMS items API (fake_cms.py)")
+    fake.add_argument("--port", type=int, default=8765)
+    fake.add_argument("--requests-per-minute", type=int, default=600)
+
+    box = commands.add_parser("outbox", help="Google writes waiting in the local outbox (outbox.py)")
+    box.add_argument("action", choices=["status", "drain"])
+    box.add_argument("content_type", nargs="?", choices=[ct for ct in GENERATORS if ct != "skills_guide"])
+
+    shards = commands.add_parser("shards", help="sheet shards and title locations from the manifest (sheet_shards.py)")
+    shards.add_argument("sink", help="content type, e.g. interview_questions or job_description:de")
+    shards.add_argument("titles", nargs="*", help="titles to locate; lists the shards when omitted")
+
+    refresh = commands.add_parser("refresh", help="regenerate stale titles under a daily token budget (refresh.py)")
+    refresh.add_argument("action", choices=["status", "seed", "run"])
+    # skills_guide output is appended, not upserted by title, so regenerating it would duplicate rows
+    refresh.add_argument("content_type", choices=[ct for ct in GENERATORS if ct != "skills_guide"])
+    refresh.add_argument("--forever", action="store_true", help="keep running, pacing refreshes over the day")
+
+    bench = commands.add_parser("bench-import", help="import time per module (python -X importtime)")
+    bench.add_argument("modules", nargs="*", default=["cli"] + list(GENERATORS.values()))
+    bench.add_argument("--top", type=int, default=10)
+    return parser
+
+def load_env() -> None:
+    # Loads .env into os.environ; modules read their settings when imported, so this has to
+    # run before them
+    from dotenv import load_dotenv
+    load_dotenv()
+
+def run_script(command: str) -> None:
+    # `python <script>.py args` runs `cli.py <command> args`. Each script calls this first
+    # thing in its __main__ block and never returns, so the rest of the script is not
+    # executed as __main__: .env is loaded before anything reads settings, and the module is
+    # imported once, under its own name, by the command.
+    main([command] + sys.argv[1:])
+    sys.exit(0)
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    if args.command == "bench-import":
+        bench_import(args.modules, args.top)
+        return
+
+    load_env()
+    if getattr(args, "input", None):
+        os.environ["TITLES_INPUT"] = args.input
+    if getattr(args, "verbose", False):
+        os.environ["VERBOSE"] = "1"
+
+    if args.command in GENERATORS:
+        importlib.import_module(GENERATORS[args.command]).main()
+    elif args.command == "queue":
+        import work_queue
+        work_queue.main(args.action, args.content_type, args.source, args.forever)
+    elif args.command == "plan":
+        import run_planner
+        run_planner.main(args.content_types, args.mode)
+    elif args.command == "routing":
+        import model_routing
+        for row in model_routing.routing_report():
+            print(json.dumps(row))
+    elif args.command == "dedup-audit":
+        import near_duplicates
+        generator = importlib.import_module(GENERATORS[args.content_type])
+        for pair in near_duplicates.audit_worksheet(generator):
+            print(json.dumps(pair))
+    elif args.command == "related":
+        import related_roles
+        related_roles.sync_worksheet(importlib.import_module(GENERATORS["job_description"]), args.rebuild)
+    elif args.command == "slugs":
+        import slugs
+        generator = importlib.import_module(GENERATORS[args.content_type])
+        slugs.seed_from_worksheet(generator.SLUG_COLLECTION, generator)
+    elif args.command == "cms-fake":
+        import fake_cms
+        fake_cms.serve(args.port, args.requests_per_minute)
+    elif args.command == "outbox":
+        import outbox
+        if args.action == "drain":
+            if not args.content_type:
+                raise SystemExit("outbox drain needs a content type")
+            outbox.drain(importlib.import_module(GENERATORS[args.content_type]), args.content_type)
+        else:
+            for row in outbox.default_outbox().status():
+                print(json.dumps(row))
+    elif args.command == "shards":
+        import sheet_shards
+        sheet_shards.main(args.sink, args.titles)
+    elif args.command == "refresh":
+        import refresh
+        refresh.main(args.action, args.content_type, args.forever)
+    elif args.command == "profile":
+        import role_profile
+        if args.report:
+            print(json.dumps(role_profile.report(), indent=2))
+        for title in args.titles:
+            print(json.dumps(role_profile.get_profile(title), indent=2))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import queue
+import threading
+import urllib.error
+import urllib.request
+import google_batch
+
+# Publishes generated rows straight to a Webflow-style CMS collection (items API v2), so a
+# row is live as soon as it is generated instead of waiting for a manual CSV import. Rows
+# are upserted by slug: the slug -> item index is loaded once with paged list calls, known
+# slugs go out in bulk PATCHes and new ones in bulk POSTs of up to CMS_BATCH_SIZE items,
+# and every request passes a CMS_REQUESTS_PER_MINUTE token bucket (a 429 waits out
+# Retry-After). The item id, locale and timestamps the CMS returns are written back into
+# the row, which is then handed to the next sink (normally the SheetSink), so the sheet
+# records what is live. Like the SheetSink it runs on a background thread.
+#
+# Enabled when CMS_COLLECTION_ID is set. For local runs start the stand-in server with
+# `python cli.py cms-fake` and point CMS_API_URL at it.
+
+CMS_API_URL = os.getenv("CMS_API_URL", "https://api.webflow.com/v2")
+CMS_API_TOKEN = os.getenv("CMS_API_TOKEN", "")
+CMS_COLLECTION_ID = os.getenv("CMS_COLLECTION_ID", "")
+# The items API accepts at most 100 items per bulk create, update or publish
+CMS_BATCH_SIZE = min(100, int(os.getenv("CMS_BATCH_SIZE", "100")))
+CMS_REQUESTS_PER_MINUTE = int(os.getenv("CMS_REQUESTS_PER_MINUTE", "60"))
+CMS_MAX_RETRIES = int(os.getenv("CMS_MAX_RETRIES", "5"))
+# "1" publishes items to the live site after each upsert; otherwise they stay staged
+CMS_PUBLISH = os.getenv("CMS_PUBLISH", "0") == "1"
+CMS_MAX_PENDING = int(os.getenv("CMS_MAX_PENDING", "20"))
+
+# Row columns the CMS owns; they are filled from its responses, never sent
+METADATA_COLUMNS = ["collection_id", "locale_id", "item_id", "created_on", "updated_on", "published_on"]
+# CMS response field -> row column
+RESPONSE_COLUMNS = {
+    "cmsLocaleId": "locale_id",
+    "id": "item_id",
+    "createdOn": "created_on",
+    "lastUpdated": "updated_on",
+    "lastPublished": "published_on",
+}
+
+_CLOSE = object()
+
+class CMSError(Exception):
+    def __init__(self, status: int, body: str):
+        super().__init__(f"CMS request failed with {status}: {body[:500]}")
+        self.status_code = status
+        self.body = body
+
+def enabled() -> bool:
+    return bool(CMS_COLLECTION_ID)
+
+def chunks(items: list, size: int = CMS_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class CMSClient:
+    def __init__(self, base_url: str = None, token: str = None, collection_id: str = None,
+                 requests_per_minute: int = CMS_REQUESTS_PER_MINUTE):
+        self.base_url = (base_url or CMS_API_URL).rstrip("/")
+        self.token = token if token is not None else CMS_API_TOKEN
+        self.collection_id = collection_id or CMS_COLLECTION_ID
+        self.limiter = google_batch.RateLimiter(requests_per_minute)
+
+    def request(self, method: str, path: str, body: dict = None) -> dict:
+        # One API call; 429s wait for Retry-After and count against CMS_MAX_RETRIES
+        url = f"{self.base_url}/collections/{self.collection_id}{path}"
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        for attempt in range(CMS_MAX_RETRIES + 1):
+            self.limiter.acquire()
+            request = urllib.request.Request(url, data=data, method=method, headers={
+                "Authorization": f"Bearer {self.token}",
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            })
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    payload = response.read()
+                    return json.loads(payload) if payload else {}
+            except urllib.error.HTTPError as e:
+                error = CMSError(e.code, e.read().decode("utf-8", "replace"))
+                if e.code != 429 or attempt == CMS_MAX_RETRIES:
+                    raise error
+                wait = float(e.headers.get("Retry-After") or 2 ** attempt)
+                print(f"CMS rate limited, waiting {wait:.0f}s")
+                time.sleep(wait)
+
+    def list_items(self):
+        offset = 0
+        while True:
+            page = self.request("GET", f"/items?offset={offset}&limit=100")
+            items = page.get("items", [])
+            yield from items
+            offset += len(items)
+            if not items or offset >= page.get("pagination", {}).get("total", 0):
+                return
+
+    def create_items(self, items: list) -> list:
+        return self.request("POST", "/items", {"items": items}).get("items", [])
+
+    def update_items(self, items: list) -> list:
+        return self.request("PATCH", "/items", {"items": items}).get("items", [])
+
+    def publish_items(self, item_ids: list) -> list:
+        return self.request("POST", "/items/publish", {"itemIds": item_ids}).get("publishedItemIds", [])
+
+class CMSSink:
+    def __init__(self, columns: list, then=None, client: CMSClient = None, field_map: dict = None):
+        # columns names each row cell; `name` comes from the first column, `slug` from the
+        # slug column and every other non-metadata column becomes a field whose slug is the
+        # column name with hyphens (field_map / CMS_FIELD_MAP override single columns).
+        # `then` is the next sink (anything with submit/close), e.g. a SheetSink.
+        self.columns = columns
+        self.then = then
+        self.client = client or CMSClient()
+        self.field_map = field_map or json.loads(os.getenv("CMS_FIELD_MAP", "{}"))
+        self.slug_index = columns.index("slug")
+        self.index = None
+        self.failed = {}
+        self._queue = queue.Queue(maxsize=CMS_MAX_PENDING)
+        self._thread = threading.Thread(target=self._run, name="cms-sink", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows: list) -> None:
+        self._queue.put(rows)
+
+    def flush(self) -> None:
+        self._queue.join()
+        if self.then is not None:
+            self.then.flush()
+
+    def take_failed(self) -> dict:
+        # Waits for everything submitted so far; returns and forgets {title: error} from both sinks
+        self.flush()
+        failed, self.failed = self.failed, {}
+        if self.then is not None:
+            failed.update(self.then.take_failed())
+        return failed
+
+    def close(self) -> dict:
+        # Publishes what is left, then closes the next sink; returns {title: error} from both
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        failed = dict(self.failed)
+        if self.then is not None:
+            failed.update(self.then.close())
+        return failed
+
+    def load_index(self) -> dict:
+        index = {item["fieldData"]["slug"]: item for item in self.client.list_items() if item.get("fieldData", {}).get("slug")}
+        print(f"CMS index loaded: {len(index)} items")
+        return index
+
+    def field_data(self, row: list) -> dict:
+        fields = {"name": row[0], "slug": row[self.slug_index]}
+        for column, value in zip(self.columns[1:], row[1:]):
+            if column in METADATA_COLUMNS or column == "slug":
+                continue
+            fields[self.field_map.get(column, column.replace("_", "-"))] = value
+        return fields
+
+    def write_back(self, row: list, item: dict) -> None:
+        if "collection_id" in self.columns:
+            row[self.columns.index("collection_id")] = self.client.collection_id
+        for key, column in RESPONSE_COLUMNS.items():
+            if column in self.columns and item.get(key):
+                row[self.columns.index(column)] = item[key]
+
+    def write(self, rows: dict) -> None:
+        # rows maps slug -> row; rows come back with the CMS metadata filled in
+        if self.index is None:
+            self.index = self.load_index()
+        updates = [slug for slug in rows if slug in self.index]
+        creates = [slug for slug in rows if slug not in self.index]
+
+        written = []
+        for batch in chunks(updates):
+            written += self.client.update_items([
+                {"id": self.index[slug]["id"], "isArchived": False, "isDraft": False, "fieldData": self.field_data(rows[slug])}
+                for slug in batch
+            ])
+        for batch in chunks(creates):
+            written += self.client.create_items([
+                {"isArchived": False, "isDraft": False, "fieldData": self.field_data(rows[slug])}
+                for slug in batch
+            ])
+        for item in written:
+            self.index[item["fieldData"]["slug"]] = item
+
+        if CMS_PUBLISH:
+            published = set()
+            for batch in chunks([self.index[slug]["id"] for slug in rows]):
+                published.update(self.client.publish_items(batch))
+            stamp = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+            for slug in rows:
+                if self.index[slug]["id"] in published:
+                    self.index[slug]["lastPublished"] = stamp
+        for slug, row in rows.items():
+            self.write_back(row, self.index[slug])
+        print(f"CMS flush: {len(updates)} items updated, {len(creates)} items created")
+
+    def write_with_retries(self, rows: dict) -> None:
+        for attempt in range(CMS_MAX_RETRIES + 1):
+            try:
+                self.write(rows)
+                return
+            except Exception as e:
+                print(f"CMS flush of {len(rows)} rows failed (attempt {attempt + 1}):", e)
+                if attempt == CMS_MAX_RETRIES:
+                    self.failed.update({row[0]: e for row in rows.values()})
+                    return
+                # A create can fail because another writer took the slug meanwhile; reload
+                self.index = None
+                time.sleep(2 ** attempt)
+
+    def _run(self) -> None:
+        while True:
+            batches = [self._queue.get()]
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = {}
+            for batch in batches:
+                if batch is not _CLOSE:
+                    rows.update((row[self.slug_index], row) for row in batch if row[self.slug_index])
+            if rows:
+                self.write_with_retries(rows)
+            if self.then is not None:
+                # Rows that failed to publish still reach the sheet, without an item id
+                forwarded = [row for batch in batches if batch is not _CLOSE for row in batch]
+                if forwarded:
+                    self.then.submit(forwarded)
+            for _ in batches:
+                self._queue.task_done()
+            if any(batch is _CLOSE for batch in batches):
+                return
@@ -0,0 +1,243 @@
+import os
+import time
+import asyncio
+import contextvars
+import threading
+import traceback
+from collections import defaultdict, deque
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Additive-increase / multiplicative-decrease concurrency limits, one per external service.
+# Each call holds a slot; a call that completes near its usual latency grows the limit by
+# about one slot per round of calls, while a 429/503 or a call far slower than the recent
+# baseline cuts it by AIMD_DECREASE. Callers whose latency grows with the size of the answer
+# set the slot's "work" (completion tokens for OpenAI), and latency is compared per unit of
+# work, so a long completion is not mistaken for congestion. The limit therefore tracks what the service can take
+# right now instead of a hand-tuned worker count. Limits are per process.
+
+AIMD_DECREASE = float(os.getenv("AIMD_DECREASE", "0.5"))
+# A call slower than this multiple of the recent baseline latency counts as congestion
+AIMD_LATENCY_TOLERANCE = float(os.getenv("AIMD_LATENCY_TOLERANCE", "2.0"))
+# Baseline latency is this percentile of the last AIMD_LATENCY_WINDOW calls
+AIMD_BASELINE_PERCENTILE = 10
+AIMD_LATENCY_WINDOW = 100
+OVERLOAD_STATUSES = {429, 503}
+# Share of the OpenAI limit only high-tier titles may use (scheduler.py), held back only while
+# a high-tier call is waiting or running
+HIGH_PRIORITY_RESERVE = float(os.getenv("HIGH_PRIORITY_RESERVE", "0.25"))
+
+# Scheduling tier of the title being generated on this thread; set by generate_all from
+# title_priorities, which the work queue fills for each claimed batch
+priority = contextvars.ContextVar("priority", default="normal")
+title_priorities = {}
+
+def status_of(exception):
+    # openai errors carry status_code, googleapiclient HttpError carries resp.status and
+    # gspread APIError carries response.status_code
+    status = getattr(exception, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exception, "resp", None), "status", None)
+    if status is None:
+        status = getattr(getattr(exception, "response", None), "status_code", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_overload(exception) -> bool:
+    return status_of(exception) in OVERLOAD_STATUSES
+
+class AIMDLimiter:
+    def __init__(self, name: str, initial: int, minimum: int = 1, maximum: int = 64, reserve: float = 0.0):
+        # reserve is the share of the limit held back for high-priority callers
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.reserve = reserve
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.high_active = 0
+        self.high_waiting = 0
+        self.completed = 0
+        self.overloads = 0
+        self.last_decrease = 0.0
+        self._latencies = defaultdict(lambda: deque(maxlen=AIMD_LATENCY_WINDOW))
+        self._cond = threading.Condition()
+
+    def is_high(self) -> bool:
+        return bool(self.reserve) and priority.get() == "high"
+
+    def ceiling(self, high: bool) -> int:
+        # Slots a caller may fill. Work-conserving: other callers only leave the reserve free
+        # while high-priority calls are waiting or running, so a run with no high-tier titles
+        # uses the whole limit
+        if self.reserve and not high and (self.high_waiting or self.high_active):
+            return max(1, int(self.limit * (1 - self.reserve)))
+        return int(self.limit)
+
+    def _take(self, high: bool) -> None:
+        self.in_flight += 1
+        if high:
+            self.high_active += 1
+
+    def try_acquire(self) -> bool:
+        high = self.is_high()
+        with self._cond:
+            if self.in_flight < self.ceiling(high):
+                self._take(high)
+                return True
+            return False
+
+    def acquire(self) -> None:
+        high = self.is_high()
+        with self._cond:
+            self.high_waiting += high
+            try:
+                while self.in_flight >= self.ceiling(high):
+                    self._cond.wait()
+            finally:
+                self.high_waiting -= high
+            self._take(high)
+
+    async def aacquire(self) -> None:
+        # Polls so the slot can be shared by threads running their own event loops
+        if self.try_acquire():
+            return
+        high = self.is_high()
+        with self._cond:
+            self.high_waiting += high
+        try:
+            while not self.try_acquire():
+                await asyncio.sleep(0.05)
+        finally:
+            with self._cond:
+                self.high_waiting -= high
+
+    def baseline(self, key):
+        latencies = sorted(self._latencies[key])
+        if len(latencies) < 10:
+            return None
+        return latencies[len(latencies) * AIMD_BASELINE_PERCENTILE // 100]
+
+    def release(self, latency: float = None, overloaded: bool = False, key=None) -> None:
+        # latency is None for calls that ended without a signal (cancelled, non-overload error)
+        high = self.is_high()
+        with self._cond:
+            self.in_flight -= 1
+            if high:
+                self.high_active -= 1
+            if overloaded:
+                self.overloads += 1
+                self._decrease()
+            elif latency is not None:
+                self.completed += 1
+                baseline = self.baseline(key)
+                self._latencies[key].append(latency)
+                if baseline is not None and latency > baseline * AIMD_LATENCY_TOLERANCE:
+                    self._decrease()
+                else:
+                    # +1 slot once every `limit` completions
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def _decrease(self) -> None:
+        # One cut per latency period, so a burst of 429s from the same window counts once
+        now = time.monotonic()
+        if now - self.last_decrease < 1.0:
+            return
+        self.last_decrease = now
+        previous = int(self.limit)
+        self.limit = max(self.minimum, self.limit * AIMD_DECREASE)
+        if int(self.limit) != previous:
+            print(f"{self.name} concurrency limit {previous} -> {int(self.limit)}")
+
+    @contextmanager
+    def slot(self, key=None):
+        # Yields the call's sample; set sample["work"] to compare latency per unit of work
+        self.acquire()
+        start = time.time()
+        sample = {"work": 1}
+        try:
+            yield sample
+        except Exception as e:
+            self.release(None, is_overload(e), key)
+            raise
+        except BaseException:
+            self.release(None, False, key)
+            raise
+        self.release((time.time() - start) / max(1, sample["work"]), False, key)
+
+    @asynccontextmanager
+    async def aslot(self, key=None):
+        await self.aacquire()
+        start = time.time()
+        sample = {"work": 1}
+        try:
+            yield sample
+        except Exception as e:
+            self.release(None, is_overload(e), key)
+            raise
+        except BaseException:
+            # Cancelled, e.g. the losing half of a hedged request
+            self.release(None, False, key)
+            raise
+        self.release((time.time() - start) / max(1, sample["work"]), False, key)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return {
+                "name": self.name,
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "overloads": self.overloads,
+            }
+
+def _limiter(name: str, initial: int, maximum: int, reserve: float = 0.0) -> AIMDLimiter:
+    prefix = name.upper()
+    return AIMDLimiter(
+        name,
+        int(os.getenv(f"{prefix}_CONCURRENCY_INITIAL", str(initial))),
+        maximum=int(os.getenv(f"{prefix}_CONCURRENCY_MAX", str(maximum))),
+        reserve=reserve,
+    )
+
+openai_limiter = _limiter("openai", 4, 32, HIGH_PRIORITY_RESERVE)
+docs_limiter = _limiter("docs", 2, 8)
+drive_limiter = _limiter("drive", 2, 8)
+sheets_limiter = _limiter("sheets", 1, 4)
+
+LIMITERS = {limiter.name: limiter for limiter in (openai_limiter, docs_limiter, drive_limiter, sheets_limiter)}
+
+def metrics() -> list:
+    return [limiter.metrics() for limiter in LIMITERS.values()]
+
+def metrics_line() -> str:
+    return ", ".join(f"{m['name']} {m['in_flight']}/{m['limit']}" for m in metrics())
+
+def with_priority(generate, title: str):
+    token = priority.set(title_priorities.get(title, "normal"))
+    try:
+        return generate(title)
+    finally:
+        priority.reset(token)
+
+def generate_all(generate, titles: list):
+    # Runs generate(title) for every title on threads; how many are really talking to
+    # OpenAI at once is decided by openai_limiter. Returns ({title: result}, {title: error})
+    # in input order.
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, min(len(titles), openai_limiter.maximum))) as executor:
+        # Each title runs in a copy of the caller's context, so usage_history tags set around
+        # the batch (e.g. refresh=True) reach the calls made on the worker threads
+        futures = {title: executor.submit(contextvars.copy_context().run, with_priority, generate, title) for title in titles}
+        for title, future in futures.items():
+            try:
+                results[title] = future.result()
+            except Exception as e:
+                print(f"Generation failed for {title}:", e)
+                traceback.print_exception(type(e), e, e.__traceback__)
+                errors[title] = e
+    print("Concurrency:", metrics_line())
+    return results, errors
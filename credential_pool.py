@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+import google_batch
+import concurrency
+
+# All Google writes are spread over a pool of service accounts so Docs/Drive/Sheets
+# throughput scales with the number of accounts. Every account needs edit access to
+# the output spreadsheet; docs stay readable by anyone and are also shared with
+# DOCS_SHARE_WITH (comma-separated emails) so it doesn't matter which account owns them.
+#
+# Quotas are per account, so workers sharing the same keys must not all use every account
+# at full rate. With CREDENTIAL_POOL_WORKERS set to the number of workers, worker i (from
+# CREDENTIAL_POOL_WORKER, assigned by the work queue) takes every Nth account starting at
+# i; with more workers than accounts, each worker takes one account and its per-minute
+# limits are divided by the number of workers on it. The index comes from registration
+# order, not liveness: a restarted worker registers again and gets the next index, so
+# until the fleet is restarted together two live workers can land on the same share.
+
+THROTTLE_COOLDOWN_SECONDS = float(os.getenv("THROTTLE_COOLDOWN_SECONDS", "30"))
+CREDENTIAL_POOL_WORKERS = int(os.getenv("CREDENTIAL_POOL_WORKERS", "1"))
+
+def keyfiles_from_env(default_keyfile: str) -> list:
+    keyfiles = [k.strip() for k in os.getenv("GOOGLE_CREDENTIALS_FILES", "").split(",") if k.strip()]
+    return keyfiles or [os.getenv("GOOGLE_CREDENTIALS_FILE", default_keyfile)]
+
+def service_account_email(keyfile: str) -> str:
+    with open(keyfile, "r", encoding="utf-8") as f:
+        return json.load(f).get("client_email")
+
+def is_throttle_error(exception) -> bool:
+    status = getattr(getattr(exception, "resp", None), "status", None)
+    if status is None:
+        # gspread wraps the HTTP response in APIError.response
+        status = getattr(getattr(exception, "response", None), "status_code", None)
+    return status == 429
+
+class ServiceAccount:
+    def __init__(self, keyfile: str, connect, sharers: int = 1):
+        # sharers is the number of workers using this account, which split its quotas
+        self.keyfile = keyfile
+        self._connect = connect
+        self._connection = None
+        self.docs_limiter = google_batch.RateLimiter(max(1, int(os.getenv("DOCS_WRITES_PER_MINUTE", "60")) // sharers))
+        self.drive_limiter = google_batch.RateLimiter(max(1, int(os.getenv("DRIVE_WRITES_PER_MINUTE", "600")) // sharers))
+        self.sheets_limiter = google_batch.RateLimiter(max(1, int(os.getenv("SHEETS_WRITES_PER_MINUTE", "60")) // sharers))
+        self.calls = deque()
+        self.throttle_count = 0
+        self.throttled_until = 0.0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        # The generator's own connect function, built once per account
+        if self._connection is None:
+            self._connection = self._connect(self.keyfile)
+        return self._connection
+
+    def record(self, count: int = 1) -> None:
+        now = time.time()
+        with self._lock:
+            self.calls.extend([now] * count)
+
+    def record_throttle(self) -> None:
+        # Each 429 doubles the cooldown (capped at 10 minutes) before the account is preferred again
+        with self._lock:
+            self.throttle_count += 1
+            cooldown = min(600, THROTTLE_COOLDOWN_SECONDS * 2 ** min(self.throttle_count - 1, 5))
+            self.throttled_until = time.time() + cooldown
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.throttle_count = 0
+
+    def load(self) -> int:
+        # Calls sent in the last minute
+        cutoff = time.time() - 60
+        with self._lock:
+            while self.calls and self.calls[0] < cutoff:
+                self.calls.popleft()
+            return len(self.calls)
+
+    def is_throttled(self) -> bool:
+        return time.time() < self.throttled_until
+
+# Rate limits are per account; the adaptive concurrency limits are per service
+CONCURRENCY_LIMITERS = {
+    "docs_limiter": concurrency.docs_limiter,
+    "drive_limiter": concurrency.drive_limiter,
+    "sheets_limiter": concurrency.sheets_limiter,
+}
+
+class CredentialPool:
+    def __init__(self, keyfiles: list, connect, worker: int = None, workers: int = None):
+        # Every key file in the pool, including those other workers use
+        self.keyfiles = list(keyfiles)
+        worker = int(os.getenv("CREDENTIAL_POOL_WORKER", "0")) if worker is None else worker
+        workers = max(1, CREDENTIAL_POOL_WORKERS if workers is None else workers)
+        slot = worker % workers
+        if workers <= len(keyfiles):
+            self.accounts = [ServiceAccount(keyfile, connect) for keyfile in keyfiles[slot::workers]]
+        else:
+            # Workers slot, slot + len(keyfiles), ... share one account
+            account = slot % len(keyfiles)
+            self.accounts = [ServiceAccount(keyfiles[account], connect, len(range(account, workers, len(keyfiles))))]
+
+    def pick(self) -> ServiceAccount:
+        # Least-loaded account that isn't cooling down after a 429; if every account is
+        # throttled, the one whose cooldown ends first
+        available = [account for account in self.accounts if not account.is_throttled()]
+        if not available:
+            return min(self.accounts, key=lambda account: account.throttled_until)
+        return min(available, key=lambda account: account.load())
+
+    def call(self, fn, limiter: str = "sheets_limiter"):
+        # Runs fn(account) on the least-loaded account, moving on to another account on a 429
+        last_error = None
+        for _ in range(len(self.accounts)):
+            account = self.pick()
+            getattr(account, limiter).acquire()
+            account.record()
+            try:
+                with CONCURRENCY_LIMITERS[limiter].slot():
+                    result = fn(account)
+            except Exception as e:
+                if not is_throttle_error(e):
+                    raise
+                print(f"Service account {account.keyfile} throttled, trying another account")
+                account.record_throttle()
+                last_error = e
+                continue
+            account.record_success()
+            return result
+        raise last_error
+
+    def stats(self) -> list:
+        return [
+            {"keyfile": account.keyfile, "calls_last_minute": account.load(), "throttled": account.is_throttled()}
+            for account in self.accounts
+        ]
+
+def load_pool(connect, default_keyfile: str) -> CredentialPool:
+    # connect(keyfile) is the generator's connect_to_google_sheets_docs
+    return CredentialPool(keyfiles_from_env(default_keyfile), connect)
@@ -0,0 +1,155 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("cms-fake")
+
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-memory stand-in for the CMS items API used by cms_sink.py, for trying the publishing
+# pipeline without touching the live site. It implements list, bulk create, bulk update
+# and publish for any collection id, the 100-item bulk limit, unique slugs per collection
+# and a per-minute request limit answered with 429 + Retry-After.
+#
+#   python cli.py cms-fake --port 8765
+#   CMS_API_URL=http://127.0.0.1:8765/v2 CMS_COLLECTION_ID=jobs python cli.py job_description
+
+MAX_BULK_ITEMS = 100
+
+def now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+
+class FakeCMS:
+    def __init__(self, requests_per_minute: int = 600):
+        self.requests_per_minute = requests_per_minute
+        # collection id -> {item id: item}
+        self.collections = {}
+        self.requests = deque()
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+    def retry_after(self) -> int:
+        # 0 when the request may go ahead, otherwise seconds until the window frees a slot
+        now = time.time()
+        with self.lock:
+            self.request_count += 1
+            while self.requests and self.requests[0] < now - 60:
+                self.requests.popleft()
+            if len(self.requests) >= self.requests_per_minute:
+                return int(self.requests[0] + 60 - now) + 1
+            self.requests.append(now)
+            return 0
+
+    def handle(self, method: str, collection_id: str, action: str, query: dict, body: dict):
+        # Returns (status, response body)
+        with self.lock:
+            items = self.collections.setdefault(collection_id, {})
+            if method == "GET" and action == "items":
+                offset, limit = int(query.get("offset", ["0"])[0]), min(100, int(query.get("limit", ["100"])[0]))
+                ordered = list(items.values())
+                return 200, {"items": ordered[offset:offset + limit],
+                             "pagination": {"offset": offset, "limit": limit, "total": len(ordered)}}
+
+            if method in ("POST", "PATCH") and action in ("items", "items/publish"):
+                key = "itemIds" if action == "items/publish" else "items"
+                batch = body.get(key) or []
+                if len(batch) > MAX_BULK_ITEMS:
+                    return 400, {"code": "validation_error", "message": f"{key} accepts at most {MAX_BULK_ITEMS} entries"}
+                if action == "items/publish":
+                    unknown = [item_id for item_id in batch if item_id not in items]
+                    if unknown:
+                        return 404, {"code": "resource_not_found", "message": f"unknown items {unknown}"}
+                    for item_id in batch:
+                        items[item_id]["lastPublished"] = now()
+                    return 202, {"publishedItemIds": batch}
+                if method == "POST":
+                    return self.create(collection_id, items, batch)
+                return self.update(items, batch)
+        return 404, {"code": "route_not_found", "message": f"{method} {action}"}
+
+    def create(self, collection_id: str, items: dict, batch: list):
+        taken = {item["fieldData"].get("slug") for item in items.values()}
+        slugs = [entry.get("fieldData", {}).get("slug") for entry in batch]
+        if not all(slugs) or len(set(slugs)) != len(slugs) or taken & set(slugs):
+            return 400, {"code": "validation_error", "message": "slug missing or already in use"}
+        created = []
+        for entry in batch:
+            stamp = now()
+            item = {
+                "id": uuid.uuid4().hex[:24],
+                "cmsLocaleId": "default",
+                "lastPublished": None,
+                "lastUpdated": stamp,
+                "createdOn": stamp,
+                "isArchived": entry.get("isArchived", False),
+                "isDraft": entry.get("isDraft", False),
+                "fieldData": dict(entry["fieldData"]),
+            }
+            items[item["id"]] = item
+            created.append(item)
+        return 202, {"items": created}
+
+    def update(self, items: dict, batch: list):
+        if any(entry.get("id") not in items for entry in batch):
+            return 404, {"code": "resource_not_found", "message": "unknown item id"}
+        updated = []
+        for entry in batch:
+            item = items[entry["id"]]
+            item["fieldData"].update(entry.get("fieldData", {}))
+            item["isArchived"] = entry.get("isArchived", item["isArchived"])
+            item["isDraft"] = entry.get("isDraft", item["isDraft"])
+            item["lastUpdated"] = now()
+            updated.append(item)
+        return 200, {"items": updated}
+
+def handler_for(cms: FakeCMS):
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self, status: int, body: dict, headers: dict = None) -> None:
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def dispatch(self) -> None:
+            wait = cms.retry_after()
+            if wait:
+                self.respond(429, {"code": "too_many_requests", "message": "rate limit"}, {"Retry-After": str(wait)})
+                return
+            url = urlparse(self.path)
+            # /v2/collections/<collection id>/items[/publish]
+            parts = url.path.strip("/").split("/")
+            if len(parts) < 4 or parts[1] != "collections":
+                self.respond(404, {"code": "route_not_found", "message": url.path})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else {}
+            status, response = cms.handle(self.command, parts[2], "/".join(parts[3:]), parse_qs(url.query), body)
+            self.respond(status, response)
+
+        do_GET = do_POST = do_PATCH = dispatch
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    return Handler
+
+def start(port: int = 0, requests_per_minute: int = 600):
+    # Serves on a background thread; returns (server, cms, base URL). port 0 picks a free port.
+    cms = FakeCMS(requests_per_minute)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler_for(cms))
+    threading.Thread(target=server.serve_forever, name="fake-cms", daemon=True).start()
+    return server, cms, f"http://127.0.0.1:{server.server_address[1]}/v2"
+
+def serve(port: int, requests_per_minute: int = 600) -> None:
+    cms = FakeCMS(requests_per_minute)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler_for(cms))
+    print(f"Fake CMS listening on http://127.0.0.1:{port}/v2")
+    server.serve_forever()
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import asyncio
+import importlib
+from typing import Any, List, Optional
+from pydantic import BaseModel
+import model_routing
+import openai_calls
+import role_profile
+import sectional
+import usage_history
+
+# Library entry point for services that embed the generators instead of running the scripts.
+# generate_many takes titles from any iterable or async iterable and yields each title's
+# validated pydantic record as soon as it completes, with the calls, tokens, cost and time it
+# took. No sheet, doc or DataFrame is involved; what happens to the records is up to the
+# caller. At most max_in_flight titles are generated at once (and every call still holds a
+# slot of the shared OpenAI concurrency limit), titles are only pulled from the source as
+# slots free up, and closing the stream or cancelling the consuming task cancels the titles
+# still in flight. Near-duplicate checks, docs and sheet writes stay in the scripts.
+#
+#   async with contextlib.aclosing(generation.generate_many(titles, "job_description")) as stream:
+#       async for result in stream:
+#           if result.error is None:
+#               save(result.record.model_dump(), result.prompt_tokens + result.completion_tokens)
+
+GENERATION_MAX_IN_FLIGHT = int(os.getenv("GENERATION_MAX_IN_FLIGHT", "16"))
+
+# Content type -> (generator module, record model, flag selecting sectional generation)
+GENERATION_SPECS = {
+    "job_description": ("job_desc_gen", "JobDetails", None),
+    "interview_questions": ("interview_ques_gen", "InterviewQuestions", "INTERVIEW_SECTIONAL"),
+    "resume_template": ("py_resume_temp_gen", "BasicSections", "RESUME_SECTIONAL"),
+    "skills_guide": ("skills_gen", "SkillsGuide", None),
+}
+
+class Generated(BaseModel):
+    # One finished title: record is the validated model, or None with the exception in error
+    title: str
+    content_type: str
+    record: Optional[Any] = None
+    error: Optional[Any] = None
+    seconds: float
+    calls: int
+    models: List[str]
+    prompt_tokens: int
+    completion_tokens: int
+    cost: Optional[float] = None
+
+async def agenerate_content(content_type: str, title: str, client) -> dict:
+    # The generator's own request, validator and sectional mode, run on the caller's event loop
+    module_name, model_name, sectional_flag = GENERATION_SPECS[content_type]
+    generator = importlib.import_module(module_name)
+    if role_profile.ROLE_PROFILE:
+        try:
+            # Cached here so the synchronous with_profile below finds it without a call
+            await role_profile.aget_profile(title, client)
+        except Exception as e:
+            print(f"Role profile for {title} unavailable, generating without it:", e)
+    if sectional_flag and getattr(generator, sectional_flag):
+        content, _, _ = await sectional.agenerate_sections(content_type, generator.build_section_requests(title), client)
+        return content
+    request = role_profile.with_profile(generator.build_request(title), title, getattr(generator, "PROFILE_REDUNDANT", ()))
+    response = await model_routing.acreate_routed(content_type, request, generator.validate_content, client)
+    problems = openai_calls.check_content(response, generator.validate_content)
+    if problems:
+        raise ValueError(f"{content_type} for {title} failed validation: " + "; ".join(problems))
+    return json.loads(response.choices[0].message.content)
+
+async def agenerate_one(content_type: str, title: str, client) -> Generated:
+    module_name, model_name, _ = GENERATION_SPECS[content_type]
+    model = getattr(importlib.import_module(module_name), model_name)
+    start = time.time()
+    record, error = None, None
+    with usage_history.collected() as records, usage_history.tagged(title=title, role_profile=role_profile.ROLE_PROFILE):
+        try:
+            record = model.model_validate(await agenerate_content(content_type, title, client))
+        except Exception as e:
+            error = e
+    costs = [r.get("cost") for r in records]
+    return Generated(
+        title=title,
+        content_type=content_type,
+        record=record,
+        error=error,
+        seconds=round(time.time() - start, 3),
+        calls=len(records),
+        models=sorted({r["model"] for r in records if r.get("model")}),
+        prompt_tokens=sum(r.get("prompt_tokens") or 0 for r in records),
+        completion_tokens=sum(r.get("completion_tokens") or 0 for r in records),
+        cost=round(sum(costs), 6) if costs and None not in costs else None,
+    )
+
+async def aiter_titles(titles):
+    if hasattr(titles, "__aiter__"):
+        async for title in titles:
+            yield title
+    else:
+        for title in titles:
+            yield title
+
+async def generate_many(titles, content_type: str, max_in_flight: int = GENERATION_MAX_IN_FLIGHT, client=None):
+    # Async iterator of Generated in completion order. A failed title is yielded with its
+    # error rather than raised, so one bad title does not end the stream.
+    if content_type not in GENERATION_SPECS:
+        raise ValueError(f"Unknown content type {content_type!r}, expected one of {sorted(GENERATION_SPECS)}")
+    own_client = client is None
+    client = client or openai_calls.connect_to_async_openai()
+    source = aiter_titles(titles)
+    in_flight = set()
+    next_title = None
+    exhausted = False
+    try:
+        while True:
+            # The source is read as a task too, so a slow source never holds back finished titles
+            if next_title is None and not exhausted and len(in_flight) < max_in_flight:
+                next_title = asyncio.ensure_future(source.__anext__())
+            waiting = in_flight | ({next_title} if next_title else set())
+            if not waiting:
+                break
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if next_title in done:
+                try:
+                    title = next_title.result()
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    in_flight.add(asyncio.ensure_future(agenerate_one(content_type, title, client)))
+                next_title = None
+            for task in done & in_flight:
+                in_flight.discard(task)
+                yield task.result()
+    finally:
+        leftover = in_flight | ({next_title} if next_title else set())
+        for task in leftover:
+            task.cancel()
+        await asyncio.gather(*leftover, return_exceptions=True)
+        await source.aclose()
+        if own_client:
+            await client.close()
@@ -0,0 +1,182 @@
+import os
+import time
+import threading
+import concurrency
+
+# Google's batch endpoints accept at most 100 calls per HTTP round trip
+BATCH_LIMIT = 100
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "3"))
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+class RateLimiter:
+    # Token bucket refilled continuously at `per_minute`; calls inside a batch count individually.
+    # A caller takes its tokens at once and sleeps off any deficit, so the bucket can go into
+    # debt: a batch larger than `per_minute` waits its share instead of never fitting, and
+    # later callers wait until the debt is repaid.
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, count: int = 1) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.per_minute, self.tokens + (now - self.updated) * self.per_minute / 60)
+            self.updated = now
+            self.tokens -= count
+            wait = -self.tokens * 60 / self.per_minute if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+# Default per-user write quotas; raise them if the project has a larger allocation
+docs_write_limiter = RateLimiter(int(os.getenv("DOCS_WRITES_PER_MINUTE", "60")))
+drive_write_limiter = RateLimiter(int(os.getenv("DRIVE_WRITES_PER_MINUTE", "600")))
+
+def is_retryable(exception) -> bool:
+    from googleapiclient.errors import HttpError
+    return isinstance(exception, HttpError) and exception.resp.status in RETRYABLE_STATUSES
+
+def execute_batched(service, requests: dict, limiter: RateLimiter = None, account=None, concurrency_limiter=None):
+    # requests maps an item key to an unexecuted HttpRequest. The calls are sent in
+    # batches of BATCH_LIMIT; throttled or 5xx items are retried with backoff and any
+    # other failure is reported for that item only. Returns (results, errors) keyed alike.
+    # When the calls run as a pooled service account, its load and 429s are recorded, and
+    # each batch round trip holds a slot of the service's adaptive concurrency limit.
+    results, errors = {}, {}
+    pending = dict(requests)
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        retry = {}
+        keys = list(pending)
+        for start in range(0, len(keys), BATCH_LIMIT):
+            chunk = keys[start:start + BATCH_LIMIT]
+            overloaded = []
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    results[request_id] = response
+                    return
+                if concurrency.is_overload(exception):
+                    overloaded.append(request_id)
+                if account is not None and is_retryable(exception) and exception.resp.status == 429:
+                    account.record_throttle()
+                if is_retryable(exception) and attempt < BATCH_MAX_RETRIES:
+                    retry[request_id] = pending[request_id]
+                else:
+                    errors[request_id] = exception
+
+            batch = service.new_batch_http_request(callback=callback)
+            for key in chunk:
+                batch.add(pending[key], request_id=key)
+            if limiter is not None:
+                limiter.acquire(len(chunk))
+            if account is not None:
+                account.record(len(chunk))
+            if concurrency_limiter is None:
+                batch.execute()
+            else:
+                concurrency_limiter.acquire()
+                sent = time.time()
+                try:
+                    batch.execute()
+                except Exception as e:
+                    concurrency_limiter.release(None, concurrency.is_overload(e))
+                    raise
+                # Latency baselines are kept per batch-size bucket, since 100 calls take longer than 5
+                concurrency_limiter.release(None if overloaded else time.time() - sent, bool(overloaded), len(chunk) // 10)
+        if not retry:
+            break
+        print(f"Retrying {len(retry)} throttled or failed batch calls")
+        time.sleep(2 ** attempt)
+        pending = retry
+    return results, errors
+
+def replacement_requests(replacements: dict) -> list:
+    requests = []
+    for placeholder, new_text in replacements.items():
+        requests.append({
+            'replaceAllText': {
+                'containsText': {
+                    'text': '{{' + placeholder + '}}',  # Ensure this matches the placeholder format in your template
+                    'matchCase': True,
+                },
+                'replaceText': new_text  # The replacement text
+            }
+        })
+    return requests
+
+def create_docs(docs_service, drive_service, docs: dict, account=None, checkpoint=None):
+    # docs maps a key (job title) to {'title': ..., 'requests': [...]}, where requests
+    # are the template formatting followed by the placeholder replacements. Every doc
+    # goes through create -> batchUpdate -> public permission, each phase batched across
+    # all docs. Progress is written back into the doc dicts ('document_id' once created,
+    # 'updated' once filled) and checkpoint(keys) is called after each phase, so a caller
+    # that persists them can resume a doc at the step it failed on instead of creating it
+    # again. Returns ({key: document_id}, {key: error}); a doc that fails after creation
+    # keeps its id in the error message.
+    docs_limiter = account.docs_limiter if account is not None else docs_write_limiter
+    drive_limiter = account.drive_limiter if account is not None else drive_write_limiter
+    created, errors = execute_batched(
+        docs_service,
+        {key: docs_service.documents().create(body={'title': doc['title']})
+         for key, doc in docs.items() if not doc.get('document_id')},
+        docs_limiter,
+        account,
+        concurrency.docs_limiter
+    )
+    for key, response in created.items():
+        docs[key]['document_id'] = response.get('documentId')
+    if checkpoint is not None and created:
+        checkpoint(list(created))
+    document_ids = {key: doc['document_id'] for key, doc in docs.items() if doc.get('document_id')}
+
+    updated, update_errors = execute_batched(
+        docs_service,
+        {key: docs_service.documents().batchUpdate(documentId=document_id, body={'requests': docs[key]['requests']})
+         for key, document_id in document_ids.items() if not docs[key].get('updated')},
+        docs_limiter,
+        account,
+        concurrency.docs_limiter
+    )
+    for key in updated:
+        docs[key]['updated'] = True
+    if checkpoint is not None and updated:
+        checkpoint(list(updated))
+    updated = [key for key in document_ids if docs[key].get('updated')]
+
+    public_permission = {
+        'type': 'anyone',
+        'role': 'reader'
+    }
+    shared, share_errors = execute_batched(
+        drive_service,
+        {key: drive_service.permissions().create(fileId=document_ids[key], body=public_permission, fields='id')
+         for key in updated},
+        drive_limiter,
+        account,
+        concurrency.drive_limiter
+    )
+
+    # Docs owned by any pooled service account stay editable by the team
+    share_with = [email.strip() for email in os.getenv("DOCS_SHARE_WITH", "").split(",") if email.strip()]
+    for email in share_with:
+        _, editor_errors = execute_batched(
+            drive_service,
+            {key: drive_service.permissions().create(
+                fileId=document_ids[key],
+                body={'type': 'user', 'role': 'writer', 'emailAddress': email},
+                sendNotificationEmail=False,
+                fields='id')
+             for key in shared},
+            drive_limiter,
+            account,
+            concurrency.drive_limiter
+        )
+        for key, error in editor_errors.items():
+            print(f"Sharing {document_ids[key]} with {email} failed:", error)
+
+    for key, error in {**update_errors, **share_errors}.items():
+        errors[key] = f"document {document_ids[key]}: {error}"
+    for key, error in errors.items():
+        print(f"Google Doc for {key} failed:", error)
+    return {key: document_ids[key] for key in shared}, errors
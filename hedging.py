@@ -0,0 +1,97 @@
+import os
+import asyncio
+import threading
+import usage_history
+
+# Hedging is opt-in: HEDGE_REQUESTS=1 enables it for every content type
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_TOKEN_BUDGET = int(os.getenv("HEDGE_TOKEN_BUDGET", "200000"))
+
+def hedging_enabled() -> bool:
+    return os.getenv("HEDGE_REQUESTS", "0").lower() in ("1", "true", "yes")
+
+class HedgeBudget:
+    # Global cap on the extra tokens duplicate requests may spend in this process
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.spent = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> bool:
+        with self._lock:
+            if self.spent + tokens > self.max_tokens:
+                return False
+            self.spent += tokens
+            return True
+
+    def settle(self, reserved: int, actual: int) -> None:
+        # Replace the up-front estimate with what the hedge really cost
+        with self._lock:
+            self.spent += actual - reserved
+
+hedge_budget = HedgeBudget(HEDGE_TOKEN_BUDGET)
+
+def hedge_delay(content_type: str, model: str = None):
+    # Seconds to wait before firing a duplicate, or None while history is too thin
+    latencies = usage_history.recent_values(content_type, "latency", model)
+    if len(latencies) < HEDGE_MIN_SAMPLES:
+        return None
+    return usage_history.percentile(latencies, HEDGE_PERCENTILE)
+
+def estimated_tokens(content_type: str, model: str = None) -> int:
+    records = usage_history.recent_records(content_type, model)
+    totals = [(r.get("prompt_tokens") or 0) + (r.get("completion_tokens") or 0) for r in records]
+    return usage_history.percentile(totals, 50) or 0
+
+def response_tokens(response) -> int:
+    # response may also be (response, ...) as returned by a timed attempt
+    if isinstance(response, tuple):
+        response = response[0]
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0
+    return (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+
+async def hedged_call(make_call, content_type: str, model: str = None, budget: HedgeBudget = hedge_budget):
+    # make_call() returns a fresh coroutine for one attempt of the request.
+    # Returns (result, hedged) where hedged tells whether the duplicate won.
+    primary = asyncio.ensure_future(make_call())
+    pending = {primary}
+    try:
+        delay = hedge_delay(content_type, model)
+        if delay is None:
+            return await primary, False
+
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return primary.result(), False
+
+        reserved = estimated_tokens(content_type, model)
+        if not budget.reserve(reserved):
+            print(f"Hedge budget exhausted ({budget.spent}/{budget.max_tokens} tokens), waiting on primary")
+            return await primary, False
+
+        print(f"Request exceeded p{HEDGE_PERCENTILE:g} latency ({delay:.1f}s) for {content_type}, firing hedge")
+        hedge = asyncio.ensure_future(make_call())
+        pending = {primary, hedge}
+        winner = None
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((t for t in (primary, hedge) if t in done and t.exception() is None), None)
+    finally:
+        # The loser (or everything, if we were cancelled) is cancelled here
+        for task in pending:
+            task.cancel()
+
+    if not hedge.done() or hedge.cancelled():
+        # The primary won and the hedge was cancelled mid-flight (cancel() only requests it, so
+        # the task may not have finished yet). Its real usage is never returned, so the
+        # reservation is settled at the estimate: it stays charged in full.
+        budget.settle(reserved, reserved)
+    else:
+        budget.settle(reserved, response_tokens(hedge.result()) if hedge.exception() is None else 0)
+    if winner is None:
+        # Both attempts failed: surface the primary's error
+        return primary.result(), False
+    return winner.result(), winner is hedge
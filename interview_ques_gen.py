@@ -1,19 +1,29 @@
-from openai import OpenAI
+if __name__ == "__main__":
+    import cli
+    cli.run_script("interview_questions")
+
 import os
-from dotenv import load_dotenv
-load_dotenv()
-import json
 import traceback
 from pydantic import BaseModel
 from typing import List, Dict
-import pandas as pd
 import time
-from oauth2client.service_account import ServiceAccountCredentials
-import gspread
-from googleapiclient.discovery import build
+import model_routing
+import role_profile
+import usage_history
+import sectional
+import google_batch
+import credential_pool
+import sheet_sink
+import outbox
+import concurrency
+import refresh
+import near_duplicates
+import title_stream
 import html
+import itertools
 import warnings
-warnings.filterwarnings("ignore")
+import threading
+import tracemalloc
 
 class QuestionDetails(BaseModel):
     interview_question: str
@@ -46,34 +56,39 @@ class InterviewQuestions(BaseModel):
     mid_level: JobLevelQuestions
     senior_level: JobLevelQuestions
 
-def read_input_csv() -> pd.DataFrame:
-    all_job_titles = pd.read_csv(r".\data\Job Titles - Job Titles - Final.csv")
-    all_job_titles = all_job_titles.apply(lambda x: x.str.title()).copy()
-    return all_job_titles
-
-def connect_to_openai() -> OpenAI:
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") 
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    return client
-
-def process_response(response, prompt_tokens, completion_tokens):
-    try:
-        return json.loads(response), prompt_tokens, completion_tokens
-    except json.JSONDecodeError as e:
-        print("JSON decoding error:", e)
-        traceback.print_exc()  # Print the full traceback for debugging purposes
-        return {}, None, None  # Return None for tokens if there's an error
-    except AttributeError as e:
-        print("Attribute error:", e)
-        traceback.print_exc()
-        return {}, None, None  # Handle missing attributes if needed
-    except Exception as e:
-        print("Unexpected error:", e)
-        traceback.print_exc()  # Catch any other unexpected errors
-        return {}, None, None
-
-def get_openai_resp(job_title):
-    response = connect_to_openai().chat.completions.create(
+SENIORITY_LEVELS = ("entry_level", "mid_level", "senior_level")
+
+def validate_level(level: str, level_questions: JobLevelQuestions) -> list:
+    # The 61-column sheet layout depends on exactly 3 generic questions per level
+    problems = []
+    if len(level_questions.generic_questions) != 3:
+        problems.append(f"{level}: expected 3 generic questions, got {len(level_questions.generic_questions)}")
+    for question in level_questions.generic_questions + [level_questions.soft_skill_question, level_questions.behavioral_question]:
+        if not question.what_hiring_managers_should_pay_attention_to:
+            problems.append(f"{level}: empty hiring manager notes for '{question.interview_question}'")
+        if len(question.model_answer.split()) < 15:
+            problems.append(f"{level}: model answer too short for '{question.interview_question}'")
+    return problems
+
+def validate_content(content: dict) -> list:
+    return validate_questions(InterviewQuestions(**content))
+
+def validate_questions(interview_questions: "InterviewQuestions") -> list:
+    problems = []
+    for level in SENIORITY_LEVELS:
+        problems.extend(validate_level(level, getattr(interview_questions, level)))
+    return problems
+
+def level_validator(level: str):
+    # Validates a sectional response holding a single seniority level
+    return lambda content: validate_level(level, JobLevelQuestions(**content[level]))
+
+def read_input_titles(schedule: bool = False):
+    # Streams title-cased titles from the CSV (TITLES_INPUT may point at another CSV/JSONL file or "-" for stdin)
+    return title_stream.iter_titles(os.getenv("TITLES_INPUT", r".\data\Job Titles - Job Titles - Final.csv"), "job_titles", str.title, schedule=schedule)
+
+def build_request(job_title: str) -> dict:
+    return dict(
     model="gpt-4o",
     messages=[
         {
@@ -405,11 +420,49 @@ def get_openai_resp(job_title):
     presence_penalty=0
     )
 
+# INTERVIEW_SECTIONAL=1 generates the three seniority levels as concurrent sub-requests
+INTERVIEW_SECTIONAL = os.getenv("INTERVIEW_SECTIONAL", "0").lower() in ("1", "true", "yes")
+SECTION_MAX_TOKENS = int(os.getenv("INTERVIEW_SECTION_MAX_TOKENS", "6000"))
+
+# The sample questions are dropped from the prompt when a role profile grounds the role
+PROFILE_REDUNDANT = [("# Examples", "# Notes")]
+
+def build_section_requests(job_title: str) -> dict:
+    request = role_profile.with_profile(build_request(job_title), job_title, PROFILE_REDUNDANT)
+    return {
+        level: (sectional.section_request(request, level, [level], SECTION_MAX_TOKENS), level_validator(level))
+        for level in SENIORITY_LEVELS
+    }
+
+def get_openai_resp(job_title):
+    # Returns (InterviewQuestions, prompt tokens, completion tokens). The ~16k-token body is
+    # parsed once, by the validation step, and the model it built is the one returned.
+    if INTERVIEW_SECTIONAL:
+        content, prompt_tokens, completion_tokens = sectional.generate_sections("interview_questions", build_section_requests(job_title))
+        return InterviewQuestions.model_validate(content), prompt_tokens, completion_tokens
+
+    validated = {}
+    def validate(content: dict) -> list:
+        # Keeps the model of the response checked last, which is the one create_routed returns
+        validated.clear()
+        validated["questions"] = InterviewQuestions(**content)
+        return validate_questions(validated["questions"])
+
+    response = model_routing.create_routed("interview_questions", role_profile.with_profile(build_request(job_title), job_title, PROFILE_REDUNDANT), validate)
+
     completion_tokens = response.usage.completion_tokens
     prompt_tokens = response.usage.prompt_tokens
-    return process_response(response.choices[0].message.content, prompt_tokens, completion_tokens)
+    # A truncated response is returned without validation, so there is no model to reuse
+    if response.choices[0].finish_reason == "length" or "questions" not in validated:
+        return InterviewQuestions.model_validate_json(response.choices[0].message.content), prompt_tokens, completion_tokens
+    return validated["questions"], prompt_tokens, completion_tokens
+
+DEFAULT_CREDENTIALS_FILE = r".\qureos-engineering.json"
 
-def connect_to_google_sheets_docs():
+def connect_to_google_sheets_docs(keyfile: str = None):
+    from oauth2client.service_account import ServiceAccountCredentials
+    import gspread
+    from googleapiclient.discovery import build
     # Define the scope to include both Google Sheets and Google Docs
     scope = [
         "https://spreadsheets.google.com/feeds",
@@ -421,7 +474,7 @@ def connect_to_google_sheets_docs():
     
     # Load the credentials from the JSON key file
     credentials = ServiceAccountCredentials.from_json_keyfile_name(
-        r".\qureos-engineering.json", 
+        keyfile or os.getenv("GOOGLE_CREDENTIALS_FILE", DEFAULT_CREDENTIALS_FILE), 
         scope
     )
     
@@ -452,12 +505,7 @@ def get_template_structure(docs_service):
     
     return content, document_style, headers_footers
 
-def create_google_doc_with_formatting(docs_service, drive_service, job_title: str, template_content: dict, template_document_setup: dict, template_header_footer: dict) -> str:
-    # Create a new Google Doc
-    document = docs_service.documents().create(body={'title': job_title + " Interview Questions Template"}).execute()
-    document_id = document.get('documentId')
-    print(f"Created document with ID: {document_id}. Job Title:", job_title)
-    
+def build_template_requests(template_content: dict, template_document_setup: dict) -> list:
     # Initialize the current index to track position in the document
     current_index = 1
     requests = []
@@ -538,6 +586,16 @@ def create_google_doc_with_formatting(docs_service, drive_service, job_title: st
             }
         }
         requests.append(document_style_request)
+    return requests
+
+def create_google_doc_with_formatting(docs_service, drive_service, job_title: str, template_content: dict, template_document_setup: dict, template_header_footer: dict) -> str:
+    # Create a new Google Doc
+    document = docs_service.documents().create(body={'title': job_title + " Interview Questions Template"}).execute()
+    document_id = document.get('documentId')
+    print(f"Created document with ID: {document_id}. Job Title:", job_title)
+
+    requests = build_template_requests(template_content, template_document_setup)
+
     # Apply the requests to the new document
     docs_service.documents().batchUpdate(documentId=document_id, body={'requests': requests}).execute()
 
@@ -554,72 +612,37 @@ def create_google_doc_with_formatting(docs_service, drive_service, job_title: st
     
     return document_id
 
-def prepare_data_for_upload(content: dict) -> list:    
-    # Helper function to convert a list to HTML-encoded unordered list
-    def convert_list_html(class_list: list) -> str:
-        if isinstance(class_list, list):
-            # Ensure each item is a string (if it's a list, join the items first)
-            html_encoded_list = []
-            for item in class_list:
-                if isinstance(item, list):  # Handle if item is a list
-                    item = ", ".join(map(str, item))  # Join list items into a string
-                html_encoded_list.append(html.escape(str(item)))  # Escape the string
-            html_list = "<ul>\n"
-            for item in html_encoded_list:
-                html_list += f"  <li>{item}</li>\n"
-            html_list += "</ul>"
-            return html_list
-        return "N/A"
-
-    # Helper function to extract data for a given question type
-    def extract_seniority_level_data(seniority_level: list, question_type: str):
-        extracted_data = []
-        if seniority_level and isinstance(seniority_level, dict):
-            question_data = seniority_level.get(question_type, {})
-            if isinstance(question_data, dict):
-                    extracted_data.append(question_data.get("interview_question", "N/A"))
-                    extracted_data.append(question_data.get("model_answer", "N/A"))
-                    extracted_data.append(question_data.get("example", "N/A"))
-                    extracted_data.append(convert_list_html(question_data.get("what_hiring_managers_should_pay_attention_to")))
-            if isinstance(question_data, list):  # If it's a list, handle each item separately
-                for item in question_data:
-                    extracted_data.append(item.get("interview_question", "N/A"))
-                    extracted_data.append(item.get("model_answer", "N/A"))
-                    extracted_data.append(item.get("example", "N/A"))
-                    extracted_data.append(convert_list_html(item.get("what_hiring_managers_should_pay_attention_to")))
-            return extracted_data
-
-    # Main function to create sheet data
-    def create_sheet_data(content):
-        converted_content = []
-        for level, seniority_level in content.items():
-            # Extract generic questions, soft skill questions, and behavioral questions
-            # converted_content.append("")  # Job title (empty)
-            converted_content.extend(extract_seniority_level_data(seniority_level, "generic_questions"))
-            converted_content.extend(extract_seniority_level_data(seniority_level, "soft_skill_question"))
-            converted_content.extend(extract_seniority_level_data(seniority_level, "behavioral_question"))
-            # converted_content.append("")  # Google Doc Link (empty)
-        return converted_content
-
-    return create_sheet_data(content)
-
-
-def push_to_gs(sheet: gspread.Worksheet, sheet_data: list) -> None:
+def convert_list_html(class_list: list) -> str:
+    # HTML-encoded unordered list
+    items = "".join(f"  <li>{html.escape(str(item))}</li>\n" for item in class_list)
+    return f"<ul>\n{items}</ul>"
+
+def question_cells(question) -> list:
+    return [
+        question.interview_question,
+        question.model_answer,
+        question.example,
+        convert_list_html(question.what_hiring_managers_should_pay_attention_to),
+    ]
+
+def prepare_data_for_upload(questions: InterviewQuestions) -> list:
+    # Reads the cells straight off the validated model, level by level in column order:
+    # 3 generic questions, then the soft skill and behavioral question
+    sheet_data = []
+    for level in SENIORITY_LEVELS:
+        level_questions = getattr(questions, level)
+        for question in level_questions.generic_questions:
+            sheet_data.extend(question_cells(question))
+        sheet_data.extend(question_cells(level_questions.soft_skill_question))
+        sheet_data.extend(question_cells(level_questions.behavioral_question))
+    return sheet_data
+
+def push_to_gs(sheet: "gspread.Worksheet", sheet_data: list) -> None:
     # Clear existing data and insert new data
     sheet.append_rows(sheet_data)
 
 def push_to_docs(docs_service, document_id, replacements):
-    requests = []
-    for placeholder, new_text in replacements.items():
-        requests.append({
-            'replaceAllText': {
-                'containsText': {
-                    'text': '{{' + placeholder + '}}',  # Ensure this matches the placeholder format in your template
-                    'matchCase': True,
-                },
-                'replaceText': new_text  # The replacement text
-            }
-        })
+    requests = google_batch.replacement_requests(replacements)
     try:
         # Execute the batch update to replace text in Google Docs
         result = docs_service.documents().batchUpdate(
@@ -628,42 +651,116 @@ def push_to_docs(docs_service, document_id, replacements):
     except Exception as e:
         print("An error occurred:", e)
 
-if __name__ == "__main__":
-    job_titles_df = read_input_csv()
-
-    for _, row in job_titles_df.iterrows():
+SHEET_COLUMNS = ['job_title', 'entry_level_generic_questions_interview_question_1', 'entry_level_generic_questions_model_answer_1',	'entry_level_generic_questions_example_1',	'entry_level_generic_questions_what_hiring_managers_should_pay_attention_to_1',	'entry_level_generic_questions_interview_question_2',	'entry_level_generic_questions_model_answer_2',	'entry_level_generic_questions_example_2',	'entry_level_generic_questions_what_hiring_managers_should_pay_attention_to_2',	'entry_level_generic_questions_interview_question_3',	'entry_level_generic_questions_model_answer_3',	'entry_level_generic_questions_example_3',	'entry_level_generic_questions_what_hiring_managers_should_pay_attention_to_3',	'entry_level_soft_skill_question_interview_question',	'entry_level_soft_skill_question_model_answer',	'entry_level_soft_skill_question_example',	'entry_level_soft_skill_question_what_hiring_managers_should_pay_attention_to',	'entry_level_behavioral_question_interview_question',	'entry_level_behavioral_question_model_answer',	'entry_level_behavioral_question_example',	'entry_level_behavioral_question_what_hiring_managers_should_pay_attention_to',	'mid_level_generic_questions_interview_question_1',	'mid_level_generic_questions_model_answer_1',	'mid_level_generic_questions_example_1',	'mid_level_generic_questions_what_hiring_managers_should_pay_attention_to_1',	'mid_level_generic_questions_interview_question_2',	'mid_level_generic_questions_model_answer_2',	'mid_level_generic_questions_example_2',	'mid_level_generic_questions_what_hiring_managers_should_pay_attention_to_2',	'mid_level_generic_questions_interview_question_3',	'mid_level_generic_questions_model_answer_3',	'mid_level_generic_questions_example_3',	'mid_level_generic_questions_what_hiring_managers_should_pay_attention_to_3',	'mid_level_soft_skill_question_interview_question',	'mid_level_soft_skill_question_model_answer',	'mid_level_soft_skill_question_example',	'mid_level_soft_skill_question_what_hiring_managers_should_pay_attention_to',	'mid_level_behavioral_question_interview_question',	'mid_level_behavioral_question_model_answer',	'mid_level_behavioral_question_example',	'mid_level_behavioral_question_what_hiring_managers_should_pay_attention_to',	'senior_level_generic_questions_interview_question_1',	'senior_level_generic_questions_model_answer_1',	'senior_level_generic_questions_example_1',	'senior_level_generic_questions_what_hiring_managers_should_pay_attention_to_1',	'senior_level_generic_questions_interview_question_2',	'senior_level_generic_questions_model_answer_2',	'senior_level_generic_questions_example_2',	'senior_level_generic_questions_what_hiring_managers_should_pay_attention_to_2',	'senior_level_generic_questions_interview_question_3',	'senior_level_generic_questions_model_answer_3',	'senior_level_generic_questions_example_3',	'senior_level_generic_questions_what_hiring_managers_should_pay_attention_to_3',	'senior_level_soft_skill_question_interview_question',	'senior_level_soft_skill_question_model_answer',	'senior_level_soft_skill_question_example',	'senior_level_soft_skill_question_what_hiring_managers_should_pay_attention_to',	'senior_level_behavioral_question_interview_question',	'senior_level_behavioral_question_model_answer',	'senior_level_behavioral_question_example',	'senior_level_behavioral_question_what_hiring_managers_should_pay_attention_to', 'link']
+
+# Docs are created for this many titles at a time with batched HTTP requests
+DOCS_BATCH_SIZE = int(os.getenv("DOCS_BATCH_SIZE", "50"))
+
+# Full responses are only dumped with VERBOSE=1; each is ~16k tokens
+VERBOSE = os.getenv("VERBOSE", "0").lower() in ("1", "true", "yes")
+# At most this many titles hold a full response at once, which bounds the memory of
+# generation at INTERVIEW_MAX_IN_FLIGHT x the per-title peak. MEMORY_PROFILE=1 prints the
+# process-wide traced memory after each title, which covers every title in flight at the time
+in_flight_titles = threading.BoundedSemaphore(int(os.getenv("INTERVIEW_MAX_IN_FLIGHT", "8")))
+MEMORY_PROFILE = os.getenv("MEMORY_PROFILE", "0").lower() in ("1", "true", "yes")
+
+# Text checked for near-duplicates across titles, by sheet column
+DUPLICATE_FIELDS = {
+    "model_answers": [column for column in SHEET_COLUMNS if "model_answer" in column],
+    "examples": [column for column in SHEET_COLUMNS if "_example" in column],
+}
+
+def generate_row(job_title: str):
+    # Generation stage for one title: returns (sheet row, placeholder replacements)
+    return near_duplicates.first_distinct(
+        "interview_questions", job_title,
+        lambda attempt: make_row(job_title),
+        lambda result: near_duplicates.column_texts(result[1], DUPLICATE_FIELDS))
+
+def make_row(job_title: str):
+    # The row and the replacements share the same strings, so a pending title holds one copy of its text
+    with in_flight_titles:
         time_start = time.time()
-        response = get_openai_resp(row['job_titles'])
-        content, prompt_tokens, completion_tokens = response
-        print(json.dumps(content, indent=4))
+        with usage_history.tagged(title=job_title, role_profile=role_profile.ROLE_PROFILE):
+            questions, prompt_tokens, completion_tokens = get_openai_resp(job_title)
+        if VERBOSE:
+            print(questions.model_dump_json(indent=4))
         print("Prompt tokens:", prompt_tokens)
         print("Completion tokens:", completion_tokens)
 
-        validated_data = InterviewQuestions(**content)
-
-        sheet_data = prepare_data_for_upload(content)
-        sheet_data.insert(0, row['job_titles'])
-        sheet_data.append('')
+        sheet_data = [job_title] + prepare_data_for_upload(questions) + ['']
+        del questions
+        replacements = dict(zip(SHEET_COLUMNS, sheet_data))
 
-        push_df = pd.DataFrame([sheet_data], columns=['job_title', 'entry_level_generic_questions_interview_question_1', 'entry_level_generic_questions_model_answer_1',	'entry_level_generic_questions_example_1',	'entry_level_generic_questions_what_hiring_managers_should_pay_attention_to_1',	'entry_level_generic_questions_interview_question_2',	'entry_level_generic_questions_model_answer_2',	'entry_level_generic_questions_example_2',	'entry_level_generic_questions_what_hiring_managers_should_pay_attention_to_2',	'entry_level_generic_questions_interview_question_3',	'entry_level_generic_questions_model_answer_3',	'entry_level_generic_questions_example_3',	'entry_level_generic_questions_what_hiring_managers_should_pay_attention_to_3',	'entry_level_soft_skill_question_interview_question',	'entry_level_soft_skill_question_model_answer',	'entry_level_soft_skill_question_example',	'entry_level_soft_skill_question_what_hiring_managers_should_pay_attention_to',	'entry_level_behavioral_question_interview_question',	'entry_level_behavioral_question_model_answer',	'entry_level_behavioral_question_example',	'entry_level_behavioral_question_what_hiring_managers_should_pay_attention_to',	'mid_level_generic_questions_interview_question_1',	'mid_level_generic_questions_model_answer_1',	'mid_level_generic_questions_example_1',	'mid_level_generic_questions_what_hiring_managers_should_pay_attention_to_1',	'mid_level_generic_questions_interview_question_2',	'mid_level_generic_questions_model_answer_2',	'mid_level_generic_questions_example_2',	'mid_level_generic_questions_what_hiring_managers_should_pay_attention_to_2',	'mid_level_generic_questions_interview_question_3',	'mid_level_generic_questions_model_answer_3',	'mid_level_generic_questions_example_3',	'mid_level_generic_questions_what_hiring_managers_should_pay_attention_to_3',	'mid_level_soft_skill_question_interview_question',	'mid_level_soft_skill_question_model_answer',	'mid_level_soft_skill_question_example',	'mid_level_soft_skill_question_what_hiring_managers_should_pay_attention_to',	'mid_level_behavioral_question_interview_question',	'mid_level_behavioral_question_model_answer',	'mid_level_behavioral_question_example',	'mid_level_behavioral_question_what_hiring_managers_should_pay_attention_to',	'senior_level_generic_questions_interview_question_1',	'senior_level_generic_questions_model_answer_1',	'senior_level_generic_questions_example_1',	'senior_level_generic_questions_what_hiring_managers_should_pay_attention_to_1',	'senior_level_generic_questions_interview_question_2',	'senior_level_generic_questions_model_answer_2',	'senior_level_generic_questions_example_2',	'senior_level_generic_questions_what_hiring_managers_should_pay_attention_to_2',	'senior_level_generic_questions_interview_question_3',	'senior_level_generic_questions_model_answer_3',	'senior_level_generic_questions_example_3',	'senior_level_generic_questions_what_hiring_managers_should_pay_attention_to_3',	'senior_level_soft_skill_question_interview_question',	'senior_level_soft_skill_question_model_answer',	'senior_level_soft_skill_question_example',	'senior_level_soft_skill_question_what_hiring_managers_should_pay_attention_to',	'senior_level_behavioral_question_interview_question',	'senior_level_behavioral_question_model_answer',	'senior_level_behavioral_question_example',	'senior_level_behavioral_question_what_hiring_managers_should_pay_attention_to', 'link'])     
-        sheet_data = push_df.values.tolist() 
-        
-        sheet, docs_service, drive_service = connect_to_google_sheets_docs()
-        template_content, template_document_setup, template_header_footer = get_template_structure(docs_service)
-        doc_document_id = create_google_doc_with_formatting(docs_service, drive_service, row['job_titles'], template_content, template_document_setup, template_header_footer)
-
-        # Update Google Doc
-        replacements = {col: push_df[col].iloc[0] for col in push_df.columns}
-        push_to_docs(docs_service, doc_document_id, replacements)
-
-        google_doc_link = "https://docs.google.com/document/d/" + doc_document_id + "/copy"
-        print("Google doc link:", google_doc_link)
-        sheet_data[0][-1] = google_doc_link  # Assuming the link should be in the last column of the row
-
-        # Push to Google Sheets
-        push_to_gs(sheet, sheet_data)
-        
-        print("Data has been pushed successfully")   
+        if MEMORY_PROFILE:
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"Traced memory (process-wide) after {job_title}: {current / 1024:.0f} KiB current, {peak / 1024:.0f} KiB peak since the last report")
+            tracemalloc.reset_peak()
 
         time_end = time.time()
-        print("Time elapsed:", round(time_end-time_start, 2),"secs")
\ No newline at end of file
+        print("Time elapsed:", round(time_end-time_start, 2),"secs")
+    return sheet_data, replacements
+
+def open_outputs():
+    pool = credential_pool.load_pool(connect_to_google_sheets_docs, DEFAULT_CREDENTIALS_FILE)
+    sheet, docs_service, drive_service = pool.pick().connect()
+    template_content, template_document_setup, template_header_footer = get_template_structure(docs_service)
+    template_requests = build_template_requests(template_content, template_document_setup)
+    # Sheet rows are upserted by job title from a background writer
+    return pool, template_requests, sheet_sink.SheetSink(pool, content_type="interview_questions")
+
+def flush_pending(pending: dict, outputs) -> None:
+    # pending maps job title -> (sheet row, placeholder replacements)
+    pool, template_requests, sink = outputs
+    docs = {
+        job_title: {
+            'title': job_title + " Interview Questions Template",
+            'requests': template_requests + google_batch.replacement_requests(replacements)
+        }
+        for job_title, (row, replacements) in pending.items()
+    }
+    # Docs and rows are recorded in the outbox before any Google call; with the docs circuit
+    # open the rows still reach the sheet, and get their doc link once the backlog drains
+    errors = outbox.write_docs("interview_questions", pool, docs, {job_title: row for job_title, (row, replacements) in pending.items()}, sink)
+    print(f"Queued {len(pending)} rows for the sheet, {len(errors)} docs failed")
+
+def flush_outputs(outputs) -> dict:
+    # Waits for the rows queued so far; returns {job title: error} for rows that never made it
+    return outputs[-1].take_failed()
+
+def close_outputs(outputs) -> dict:
+    # Waits for queued sheet writes; returns {job title: error} for rows that never made it
+    failed = outputs[-1].close()
+    for job_title, error in failed.items():
+        print(f"Sheet write failed for {job_title}:", error)
+    return failed
+
+def process_titles(job_titles: list, outputs) -> dict:
+    # Runs generate -> doc -> sheet for a batch of titles. Returns {job title: error} for
+    # titles that could not be generated or get a doc batch; a missing doc only leaves the link
+    # empty. Sheet rows are written in the background and reported by close_outputs.
+    # Titles are generated concurrently, as many at once as the OpenAI concurrency limit allows
+    pending, errors = concurrency.generate_all(generate_row, job_titles)
+    refresh.record("interview_questions", list(pending))
+    if pending:
+        try:
+            flush_pending(pending, outputs)
+        except Exception as e:
+            print("Writing batch failed:", e)
+            traceback.print_exc()
+            errors.update({job_title: e for job_title in pending})
+    return errors
+
+def main() -> None:
+    warnings.filterwarnings("ignore")
+    if MEMORY_PROFILE:
+        tracemalloc.start()
+    job_titles = read_input_titles()
+    outputs = open_outputs()
+
+    while True:
+        batch = list(itertools.islice(job_titles, DOCS_BATCH_SIZE))
+        if not batch:
+            break
+        process_titles(batch, outputs)
+    close_outputs(outputs)
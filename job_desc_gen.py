@@ -1,20 +1,32 @@
-from openai import OpenAI
+if __name__ == "__main__":
+    import cli
+    cli.run_script("job_description")
+
 import os
-from dotenv import load_dotenv
-load_dotenv()
 import json
 import traceback
 from pydantic import BaseModel, Field, ValidationError
 from typing import List
-import pandas as pd
 import time
-from oauth2client.service_account import ServiceAccountCredentials
-import gspread
-from googleapiclient.discovery import build
+import itertools
+import model_routing
+import role_profile
+import usage_history
+import google_batch
+import credential_pool
+import sheet_sink
+import outbox
+import cms_sink
+import concurrency
+import refresh
+import near_duplicates
+import title_stream
+import slugs
+import localize
 
-def read_input_csv() -> pd.DataFrame:
-    all_job_titles = pd.read_csv(r".\data\HR Templates  - Job titles.csv")[['clean_job_titles']].copy()
-    return all_job_titles
+def read_input_titles(schedule: bool = False):
+    # Streams titles from the CSV (TITLES_INPUT may point at another CSV/JSONL file or "-" for stdin)
+    return title_stream.iter_titles(os.getenv("TITLES_INPUT", r".\data\HR Templates  - Job titles.csv"), "clean_job_titles", schedule=schedule)
 
 class FocusArea(BaseModel):
     focus_area: str = Field(..., description="Name of the KPI focus area")
@@ -42,12 +54,30 @@ class JobDetails(BaseModel):
     class Config:
         extra = "ignore"
 
-def connect_to_openai() -> OpenAI:
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") 
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    return client
+def validate_content(content: dict) -> list:
+    # Schema validation plus the quality bounds the prompt asks for
+    job_details = JobDetails(**content)
+    problems = []
+    if not 6 <= len(job_details.key_responsibilities) <= 10:
+        problems.append(f"expected 6-10 key responsibilities, got {len(job_details.key_responsibilities)}")
+    if len(job_details.kpis_focus) != 3:
+        problems.append(f"expected 3 KPI focus areas, got {len(job_details.kpis_focus)}")
+    if len(job_details.skills) < 3:
+        problems.append(f"expected at least 3 skills, got {len(job_details.skills)}")
+    if not job_details.tools:
+        problems.append("no tools listed")
+    if not 20 <= len(job_details.kpis.split()) <= 70:
+        problems.append(f"kpis paragraph is {len(job_details.kpis.split())} words")
+    if len(job_details.job_description.split()) < 20:
+        problems.append("job description is too short")
+    return problems
+
+DEFAULT_CREDENTIALS_FILE = r"C:\Users\Abrar\Desktop\Programs\Github\Qureos-Workspace\Modules\qureos-engineering.json"
 
-def connect_to_google_sheets_docs():
+def connect_to_google_sheets_docs(keyfile: str = None):
+    from oauth2client.service_account import ServiceAccountCredentials
+    import gspread
+    from googleapiclient.discovery import build
     # Define the scope to include both Google Sheets and Google Docs
     scope = [
         "https://spreadsheets.google.com/feeds",
@@ -59,7 +89,7 @@ def connect_to_google_sheets_docs():
     
     # Load the credentials from the JSON key file
     credentials = ServiceAccountCredentials.from_json_keyfile_name(
-        r"C:\Users\Abrar\Desktop\Programs\Github\Qureos-Workspace\Modules\qureos-engineering.json", 
+        keyfile or os.getenv("GOOGLE_CREDENTIALS_FILE", DEFAULT_CREDENTIALS_FILE), 
         scope
     )
     
@@ -140,13 +170,12 @@ def prepare_data_for_upload(content: dict, key_responsibilities_html: str, skill
     
     return sheet_data
 
-def push_to_gs(sheet: gspread.Worksheet, sheet_data: list) -> None:
+def push_to_gs(sheet: "gspread.Worksheet", sheet_data: list) -> None:
     # Clear existing data and insert new data
     sheet.append_rows(sheet_data)
 
-def get_gen_content(job_title: str):
-
-    response = connect_to_openai().chat.completions.create(
+def build_request(job_title: str) -> dict:
+    return dict(
     model="gpt-4o",
     messages=[
         {
@@ -291,6 +320,17 @@ def get_gen_content(job_title: str):
     }
     )
 
+# The worked SEO Manager example only shows the shape and tone of an answer; with a role
+# profile (and the strict schema) it is dropped from the prompt
+PROFILE_REDUNDANT = [('{\n    "job_title": "SEO Manager"', None)]
+
+def get_gen_content(job_title: str, regenerate: bool = False):
+    request = role_profile.with_profile(build_request(job_title), job_title, PROFILE_REDUNDANT)
+    if regenerate:
+        # The prompt runs at temperature 0, which would return the same duplicate text again
+        request = dict(request, temperature=DUPLICATE_RETRY_TEMPERATURE)
+    response = model_routing.create_routed("job_description", request, validate_content)
+
     completion_tokens = response.usage.completion_tokens
     prompt_tokens = response.usage.prompt_tokens
     return process_response(response.choices[0].message.content, prompt_tokens, completion_tokens)
@@ -300,12 +340,7 @@ def get_template_structure(docs_service):
     document = docs_service.documents().get(documentId=template_doc_id).execute()
     return document.get('body').get('content')
 
-def create_google_doc_with_formatting(docs_service, drive_service, job_title: str, template_content: str) -> str:
-    # Create a new Google Doc
-    document = docs_service.documents().create(body={'title': job_title + " JD Template"}).execute()
-    document_id = document.get('documentId')
-    print(f"Created document with ID: {document_id}. Job Title:", job_title)
-    
+def build_template_requests(template_content: str) -> list:
     # Initialize the current index to track position in the document
     current_index = 1
     requests = []
@@ -343,6 +378,16 @@ def create_google_doc_with_formatting(docs_service, drive_service, job_title: st
 
                         requests.append(style_request)
 
+    return requests
+
+def create_google_doc_with_formatting(docs_service, drive_service, job_title: str, template_content: str) -> str:
+    # Create a new Google Doc
+    document = docs_service.documents().create(body={'title': job_title + " JD Template"}).execute()
+    document_id = document.get('documentId')
+    print(f"Created document with ID: {document_id}. Job Title:", job_title)
+
+    requests = build_template_requests(template_content)
+
     # Apply the requests to the new document
     docs_service.documents().batchUpdate(documentId=document_id, body={'requests': requests}).execute()
 
@@ -360,17 +405,7 @@ def create_google_doc_with_formatting(docs_service, drive_service, job_title: st
     return document_id
 
 def push_to_docs(docs_service, document_id, replacements):
-    requests = []
-    for placeholder, new_text in replacements.items():
-        requests.append({
-            'replaceAllText': {
-                'containsText': {
-                    'text': '{{' + placeholder + '}}',  # Ensure this matches the placeholder format in your template
-                    'matchCase': True,
-                },
-                'replaceText': new_text  # The replacement text
-            }
-        })
+    requests = google_batch.replacement_requests(replacements)
     try:
         # Execute the batch update to replace text in Google Docs
         result = docs_service.documents().batchUpdate(
@@ -379,49 +414,156 @@ def push_to_docs(docs_service, document_id, replacements):
     except Exception as e:
         print("An error occurred:", e)
 
-if __name__ == "__main__":
-    all_job_titles = read_input_csv()
+SHEET_COLUMNS = ['job_title', 'slug', 'collection_id', 'locale_id', 'item_id', 'created_on', 'updated_on', 'published_on', 'job_description', 'key_responsibilities_text','key_responsibilities_html', 'skills_text', 'skills_html', 'kpis', 'kpis_focus_1', 'description_1', 'kpis_focus_2', 'description_2', 'kpis_focus_3', 'description_3', 'reports_to', 'collaborates_with', 'leads', 'tools_text', 'tools_html', 'qualification', 'link']
+
+# Docs are created for this many titles at a time with batched HTTP requests
+DOCS_BATCH_SIZE = int(os.getenv("DOCS_BATCH_SIZE", "50"))
+
+# Text checked for near-duplicates across titles, by sheet column
+DUPLICATE_FIELDS = {
+    "job_description": ["job_description"],
+    "key_responsibilities": ["key_responsibilities_text"],
+    "kpis": ["kpis"],
+}
+DUPLICATE_RETRY_TEMPERATURE = 0.7
 
-    for idx, each_job_title in all_job_titles.iterrows():
-        start = time.time()
-        response = get_gen_content(each_job_title["clean_job_titles"])  # Pass the correct value here
-        content, prompt_tokens, completion_tokens = response
-        print(json.dumps(content, indent=4))
-        print("Prompt tokens:", prompt_tokens)
-        print("Completion tokens:", completion_tokens)
+# Slugs are unique within this collection (slugs.py)
+SLUG_COLLECTION = os.getenv("JOB_DESC_SLUG_COLLECTION", "job_description")
 
-        # Validate data
+# Fields copied into every locale untranslated
+LOCALIZE_KEEP_FIELDS = ("tools",)
+
+def generate_row(job_title: str):
+    # Generation stage for one title: returns (sheet row, placeholder replacements, {locale: row})
+    row, replacements, content = near_duplicates.first_distinct(
+        "job_description", job_title,
+        lambda attempt: make_row(job_title, regenerate=attempt > 0),
+        lambda result: near_duplicates.column_texts(result[1], DUPLICATE_FIELDS))
+    return row, replacements, localized_rows(job_title, content, row)
+
+def localized_rows(job_title: str, content: dict, row: list) -> dict:
+    # The validated record translated into each of LOCALES (localize.py) rather than generated
+    # again, as rows sharing the English slug. A locale that fails is left out of this run
+    # instead of failing the title.
+    rows = {}
+    for locale in localize.LOCALES:
         try:
-            job_details = JobDetails(**content)
-        except ValidationError as e:
-            print(e)
-
-        key_responsibilities_html, skills_html, tools_html = convert_data_to_html(content)
-        sheet_data = prepare_data_for_upload(content, key_responsibilities_html, skills_html, tools_html)
-        # print(sheet_data)
-        
-        # Prepare DataFrame
-        push_df = pd.DataFrame([sheet_data], columns=['job_title', 'slug', 'collection_id', 'locale_id', 'item_id', 'created_on', 'updated_on', 'published_on', 'job_description', 'key_responsibilities_text','key_responsibilities_html', 'skills_text', 'skills_html', 'kpis', 'kpis_focus_1', 'description_1', 'kpis_focus_2', 'description_2', 'kpis_focus_3', 'description_3', 'reports_to', 'collaborates_with', 'leads', 'tools_text', 'tools_html', 'qualification', 'link'])     
-        sheet_data = push_df.values.tolist()  
-        sheet, docs_service, drive_service = connect_to_google_sheets_docs()
-
-        # Template handling
-        template_content = get_template_structure(docs_service)
-        doc_document_id = create_google_doc_with_formatting(docs_service, drive_service, each_job_title["clean_job_titles"], template_content)
-
-        # Update Google Doc
-        replacements = {col: push_df[col].iloc[0] for col in push_df.columns}
-        push_to_docs(docs_service, doc_document_id, replacements)
-
-        # Assign Google Doc link to sheet data
-        google_doc_link = "https://docs.google.com/document/d/" + doc_document_id + "/copy"
-        print("Google doc link:", google_doc_link)
-        sheet_data[0][-1] = google_doc_link  # Assuming the link should be in the last column of the row
-
-        # Push to Google Sheets
-        print("Sheet data:", sheet_data)
-        push_to_gs(sheet, sheet_data)
-        
-        print("Data has been pushed successfully")   
-        end = time.time()
-        print("Time taken:", round(end - start, 2), "seconds")
+            with usage_history.tagged(title=job_title, locale=locale):
+                translated = localize.localize_record(content, JobDetails, locale, LOCALIZE_KEEP_FIELDS)
+        except Exception as e:
+            print(f"Translating {job_title} into {locale} failed:", e)
+            continue
+        sheet_data = prepare_data_for_upload(translated, *convert_data_to_html(translated))
+        sheet_data[1] = row[1]
+        sheet_data[3] = localize.locale_id(locale)
+        rows[locale] = sheet_data
+    return rows
+
+def make_row(job_title: str, regenerate: bool = False):
+    start = time.time()
+    with usage_history.tagged(title=job_title, role_profile=role_profile.ROLE_PROFILE):
+        response = get_gen_content(job_title, regenerate)
+    content, prompt_tokens, completion_tokens = response
+    print(json.dumps(content, indent=4))
+    print("Prompt tokens:", prompt_tokens)
+    print("Completion tokens:", completion_tokens)
+
+    # Validate data
+    try:
+        job_details = JobDetails(**content)
+    except ValidationError as e:
+        print(e)
+
+    key_responsibilities_html, skills_html, tools_html = convert_data_to_html(content)
+    sheet_data = prepare_data_for_upload(content, key_responsibilities_html, skills_html, tools_html)
+    # Slug is keyed on the input title so a regenerated row keeps its URL
+    sheet_data[1] = slugs.assign(SLUG_COLLECTION, job_title)
+
+    # Prepare DataFrame
+    import pandas as pd
+    push_df = pd.DataFrame([sheet_data], columns=SHEET_COLUMNS)
+    replacements = {col: push_df[col].iloc[0] for col in push_df.columns}
+
+    end = time.time()
+    print("Time taken:", round(end - start, 2), "seconds")
+    return push_df.values.tolist()[0], replacements, content
+
+def open_outputs():
+    pool = credential_pool.load_pool(connect_to_google_sheets_docs, DEFAULT_CREDENTIALS_FILE)
+    sheet, docs_service, drive_service = pool.pick().connect()
+
+    # Template handling
+    template_requests = build_template_requests(get_template_structure(docs_service))
+    # Sheet rows are upserted by job title from a background writer; with a CMS collection
+    # configured they are published first and reach the sheet with their item ids
+    sink = sheet_sink.SheetSink(pool, content_type="job_description")
+    if cms_sink.enabled():
+        sink = cms_sink.CMSSink(SHEET_COLUMNS, then=sink)
+    # Translated rows go to a "<worksheet> (<locale>)" tab per locale, upserted by their own title
+    locale_sinks = {
+        locale: sheet_sink.SheetSink(
+            pool, lambda account, locale=locale: localize.locale_worksheet(account.connect()[0], locale, SHEET_COLUMNS),
+            content_type=f"job_description:{locale}")
+        for locale in localize.LOCALES
+    }
+    return pool, template_requests, locale_sinks, sink
+
+def flush_pending(pending: dict, outputs) -> None:
+    # pending maps job title -> (sheet row, placeholder replacements, {locale: row})
+    pool, template_requests, locale_sinks, sink = outputs
+    docs = {
+        job_title: {
+            'title': job_title + " JD Template",
+            'requests': template_requests + google_batch.replacement_requests(replacements)
+        }
+        for job_title, (row, replacements, localized) in pending.items()
+    }
+    # Docs and rows are recorded in the outbox before any Google call; with the docs circuit
+    # open the rows still reach the sheet, and get their doc link once the backlog drains
+    errors = outbox.write_docs("job_description", pool, docs, {job_title: row for job_title, (row, replacements, localized) in pending.items()}, sink)
+    print(f"Queued {len(pending)} rows for the sheet, {len(errors)} docs failed")
+    for locale, locale_sink in locale_sinks.items():
+        locale_sink.submit([localized[locale] for row, replacements, localized in pending.values() if locale in localized])
+
+def flush_outputs(outputs) -> dict:
+    # Waits for the rows queued so far; returns {job title: error} for rows that never made it
+    failed = outputs[-1].take_failed()
+    for locale_sink in outputs[2].values():
+        failed.update(locale_sink.take_failed())
+    return failed
+
+def close_outputs(outputs) -> dict:
+    # Waits for queued sheet writes; returns {job title: error} for rows that never made it
+    failed = outputs[-1].close()
+    for locale_sink in outputs[2].values():
+        failed.update(locale_sink.close())
+    for job_title, error in failed.items():
+        print(f"Sheet write failed for {job_title}:", error)
+    return failed
+
+def process_titles(job_titles: list, outputs) -> dict:
+    # Runs generate -> doc -> sheet for a batch of titles. Returns {job title: error} for
+    # titles that could not be generated or get a doc batch; a missing doc only leaves the link
+    # empty. Sheet rows are written in the background and reported by close_outputs.
+    # Titles are generated concurrently, as many at once as the OpenAI concurrency limit allows
+    pending, errors = concurrency.generate_all(generate_row, job_titles)
+    refresh.record("job_description", list(pending))
+    if pending:
+        try:
+            flush_pending(pending, outputs)
+        except Exception as e:
+            print("Writing batch failed:", e)
+            traceback.print_exc()
+            errors.update({job_title: e for job_title in pending})
+    return errors
+
+def main() -> None:
+    all_job_titles = read_input_titles()
+    outputs = open_outputs()
+
+    while True:
+        batch = list(itertools.islice(all_job_titles, DOCS_BATCH_SIZE))
+        if not batch:
+            break
+        process_titles(batch, outputs)
+    close_outputs(outputs)
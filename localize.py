@@ -0,0 +1,223 @@
+import os
+import json
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import model_routing
+import openai_calls
+
+# Locale fan-out by translation instead of regeneration. A record that has already passed
+# validation (JobDetails, InterviewQuestions, BasicSections, ...) is reduced to its text
+# leaves; leaves already translated for the locale come from LOCALIZE_CACHE, the rest are
+# packed LOCALIZE_MAX_STRINGS / LOCALIZE_MAX_CHARS at a time into requests whose strict JSON
+# schema mirrors the record's own shape (lists become "0", "1", ... keys), so the model can
+# neither drop nor add a field. The translated record is validated with the same pydantic
+# model as the original. A locale costs the translated text, not the generation prompt.
+#
+#   LOCALES=de,fr LOCALE_IDS='{"de": "<cms locale id>"}' python cli.py job_description
+
+LOCALES = [locale.strip() for locale in os.getenv("LOCALES", "").split(",") if locale.strip()]
+# Locale code -> the CMS locale id written to the row's locale_id column
+LOCALE_IDS = json.loads(os.getenv("LOCALE_IDS", "{}"))
+LOCALIZE_CACHE = os.getenv("LOCALIZE_CACHE", "translations.db")
+LOCALIZE_MAX_STRINGS = int(os.getenv("LOCALIZE_MAX_STRINGS", "80"))
+LOCALIZE_MAX_CHARS = int(os.getenv("LOCALIZE_MAX_CHARS", "8000"))
+
+SYSTEM_PROMPT = (
+    "Translate every string value in the user's JSON into the language of locale {locale}. "
+    "Return the same JSON structure with the same keys. Keep HTML tags, placeholders in double "
+    "braces, numbers, product, tool and company names unchanged. Use the terminology an HR "
+    "professional in that locale would use."
+)
+
+def locale_id(locale: str) -> str:
+    return LOCALE_IDS.get(locale, locale)
+
+def text_leaves(value, path: tuple = ()) -> list:
+    # [(path, text)] for every string worth translating; list items are addressed by index
+    if isinstance(value, str):
+        text = value.strip()
+        if not text or text.startswith(("http://", "https://")) or text.replace(".", "", 1).isdigit():
+            return []
+        return [(path, value)]
+    if isinstance(value, dict):
+        return [leaf for key, item in value.items() for leaf in text_leaves(item, path + (key,))]
+    if isinstance(value, (list, tuple)):
+        return [leaf for index, item in enumerate(value) for leaf in text_leaves(item, path + (str(index),))]
+    return []
+
+def nest(leaves: list) -> dict:
+    # Rebuilds the record's shape from (path, text) pairs, with lists as index-keyed objects
+    payload = {}
+    for path, text in leaves:
+        node = payload
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = text
+    return payload
+
+def mirror_schema(payload) -> dict:
+    if isinstance(payload, dict):
+        return {
+            "type": "object",
+            "properties": {key: mirror_schema(value) for key, value in payload.items()},
+            "required": list(payload),
+            "additionalProperties": False,
+        }
+    return {"type": "string"}
+
+def lookup(payload: dict, path: tuple):
+    for key in path:
+        payload = payload[key]
+    return payload
+
+def assign(record, path: tuple, text: str) -> None:
+    for key in path[:-1]:
+        record = record[int(key)] if isinstance(record, list) else record[key]
+    last = path[-1]
+    if isinstance(record, list):
+        record[int(last)] = text
+    else:
+        record[last] = text
+
+def chunks(leaves: list) -> list:
+    packed, current, size = [], [], 0
+    for leaf in leaves:
+        if current and (len(current) >= LOCALIZE_MAX_STRINGS or size + len(leaf[1]) > LOCALIZE_MAX_CHARS):
+            packed.append(current)
+            current, size = [], 0
+        current.append(leaf)
+        size += len(leaf[1])
+    if current:
+        packed.append(current)
+    return packed
+
+def build_request(leaves: list, locale: str) -> dict:
+    payload = nest(leaves)
+    return dict(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT.format(locale=locale)},
+            {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+        ],
+        temperature=0,
+        # Translations run longer than English, and non-Latin scripts take more tokens per character
+        max_tokens=min(16000, max(1024, sum(len(text) for _, text in leaves))),
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "translation", "strict": True, "schema": mirror_schema(payload)},
+        },
+    )
+
+def check_translation(leaves: list):
+    # Validator for the routing cascade: every leaf present and non-empty
+    def validate(content: dict) -> list:
+        missing = []
+        for path, _ in leaves:
+            try:
+                text = lookup(content, path)
+            except (KeyError, TypeError):
+                text = None
+            if not isinstance(text, str) or not text.strip():
+                missing.append("/".join(path))
+        return [f"missing translations: {', '.join(missing[:10])}"] if missing else []
+    return validate
+
+class TranslationCache:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                locale TEXT, source_hash TEXT, translation TEXT,
+                PRIMARY KEY (locale, source_hash)
+            )""")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, locale: str, texts: list) -> dict:
+        found = {}
+        with self._lock:
+            for text in set(texts):
+                row = self.conn.execute(
+                    "SELECT translation FROM translations WHERE locale = ? AND source_hash = ?",
+                    (locale, self.key(text))).fetchone()
+                if row:
+                    found[text] = row[0]
+        return found
+
+    def put_many(self, locale: str, translations: dict) -> None:
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?)",
+                ((locale, self.key(text), translation) for text, translation in translations.items()))
+
+_cache = None
+
+def translation_cache() -> TranslationCache:
+    global _cache
+    if _cache is None:
+        _cache = TranslationCache(LOCALIZE_CACHE)
+    return _cache
+
+async def atranslate(leaves: list, locale: str) -> dict:
+    # {source text: translation} for the given leaves, one request per packed chunk, concurrently
+    packed = chunks(leaves)
+    async with openai_calls.connect_to_async_openai() as client:
+        responses = await asyncio.gather(*(
+            model_routing.acreate_routed("localize", build_request(chunk, locale), check_translation(chunk), client)
+            for chunk in packed))
+    translations = {}
+    for chunk, response in zip(packed, responses):
+        content = json.loads(response.choices[0].message.content)
+        problems = check_translation(chunk)(content)
+        if problems:
+            raise ValueError(f"{locale} translation incomplete: {problems[0]}")
+        translations.update((text, lookup(content, path)) for path, text in chunk)
+    return translations
+
+def localize_record(record: dict, model, locale: str, keep: tuple = ()) -> dict:
+    # Returns the record with its text translated, validated by `model` (the pydantic class
+    # the original passed); top-level fields in `keep` (tool names, ...) are left as they are.
+    # Raises if the translation is incomplete or fails validation.
+    leaves = [(path, text) for path, text in text_leaves(record) if path[0] not in keep]
+    cache = translation_cache()
+    translations = cache.get_many(locale, [text for _, text in leaves])
+    missing = [(path, text) for path, text in leaves if text not in translations]
+    # Repeated strings (common skills, team names) are sent once
+    unique = {}
+    for path, text in missing:
+        unique.setdefault(text, (path, text))
+    unique = list(unique.values())
+    if unique:
+        fresh = asyncio.run(atranslate(unique, locale))
+        cache.put_many(locale, fresh)
+        translations.update(fresh)
+    print(f"{locale}: {len(leaves)} strings, {len(unique)} sent for translation")
+
+    localized = json.loads(json.dumps(record))
+    for path, text in leaves:
+        assign(localized, path, translations[text])
+    return model.model_validate(localized).model_dump()
+
+_worksheets = {}
+_worksheets_lock = threading.Lock()
+
+def locale_worksheet(sheet: "gspread.Worksheet", locale: str, header: list) -> "gspread.Worksheet":
+    # "<worksheet> (<locale>)" next to the English one, created with the header row on first use
+    key = (id(sheet), locale)
+    with _worksheets_lock:
+        if key not in _worksheets:
+            import gspread
+            title = f"{sheet.title} ({locale})"
+            try:
+                worksheet = sheet.spreadsheet.worksheet(title)
+            except gspread.WorksheetNotFound:
+                worksheet = sheet.spreadsheet.add_worksheet(title, rows=1000, cols=len(header))
+                worksheet.append_row(header, value_input_option="RAW")
+            _worksheets[key] = worksheet
+        return _worksheets[key]
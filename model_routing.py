@@ -0,0 +1,89 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("routing")
+
+import os
+import json
+import random
+import asyncio
+from collections import defaultdict
+import usage_history
+import openai_calls
+
+# Models tried in order per content type; a response that fails validation is
+# escalated to the next model. Override with MODEL_ROUTING='{"job_description": ["gpt-4o"]}'
+DEFAULT_MODEL = "gpt-4o"
+ROUTING_POLICY = {
+    "job_description": ["gpt-4o-mini", "gpt-4o"],
+    "skills_guide": ["gpt-4o-mini", "gpt-4o"],
+    "interview_questions": ["gpt-4o"],
+    "resume_template": ["gpt-4o"],
+    "role_profile": ["gpt-4o-mini", "gpt-4o"],
+    "localize": ["gpt-4o-mini", "gpt-4o"],
+}
+ROUTING_POLICY.update(json.loads(os.getenv("MODEL_ROUTING", "{}")))
+
+# A cheaper model whose recent pass rate falls below this is skipped
+ROUTING_MIN_PASS_RATE = float(os.getenv("ROUTING_MIN_PASS_RATE", "0.5"))
+ROUTING_MIN_SAMPLES = int(os.getenv("ROUTING_MIN_SAMPLES", "20"))
+# Share of calls that still try a skipped model so its pass rate keeps being measured
+ROUTING_EXPLORE_RATE = float(os.getenv("ROUTING_EXPLORE_RATE", "0.05"))
+
+def pass_rate(content_type: str, model: str):
+    outcomes = usage_history.recent_values(content_type, "passed", model)
+    if len(outcomes) < ROUTING_MIN_SAMPLES:
+        return None
+    return sum(outcomes) / len(outcomes)
+
+def models_for(content_type: str) -> list:
+    # Sections ("interview_questions:entry_level") inherit their content type's cascade
+    cascade = ROUTING_POLICY.get(content_type) or ROUTING_POLICY.get(content_type.split(":")[0], [DEFAULT_MODEL])
+    models = []
+    for model in cascade[:-1]:
+        rate = pass_rate(content_type, model)
+        if rate is not None and rate < ROUTING_MIN_PASS_RATE and random.random() >= ROUTING_EXPLORE_RATE:
+            print(f"Skipping {model} for {content_type}: pass rate {rate:.0%}")
+            continue
+        models.append(model)
+    # The last model in the cascade is always tried
+    models.append(cascade[-1])
+    return models
+
+async def acreate_routed(content_type: str, request: dict, validate, client=None):
+    # Walks the cascade until a response passes validation; the final model's
+    # response is returned even if it fails so the caller can report it
+    client = client or openai_calls.connect_to_async_openai()
+    models = models_for(content_type)
+    for i, model in enumerate(models):
+        response, problems = await openai_calls.acreate_checked(content_type, dict(request, model=model), validate, client)
+        if not problems or i == len(models) - 1:
+            return response
+        print(f"{model} failed validation for {content_type}, escalating to {models[i + 1]}:", "; ".join(problems))
+
+def create_routed(content_type: str, request: dict, validate):
+    async def run():
+        async with openai_calls.connect_to_async_openai() as client:
+            return await acreate_routed(content_type, request, validate, client)
+    return asyncio.run(run())
+
+def routing_report() -> list:
+    # Per content type and model: calls, pass rate, latency and cost from recorded history
+    grouped = defaultdict(list)
+    for content_type in usage_history.content_types():
+        for record in usage_history.recent_records(content_type):
+            grouped[(content_type, record.get("model"))].append(record)
+    report = []
+    for (content_type, model), records in sorted(grouped.items()):
+        outcomes = [r["passed"] for r in records if r.get("passed") is not None]
+        latencies = [r["latency"] for r in records if r.get("latency") is not None]
+        costs = [r["cost"] for r in records if r.get("cost") is not None]
+        report.append({
+            "content_type": content_type,
+            "model": model,
+            "calls": len(records),
+            "pass_rate": round(sum(outcomes) / len(outcomes), 3) if outcomes else None,
+            "p50_latency": usage_history.percentile(latencies, 50),
+            "p90_latency": usage_history.percentile(latencies, 90),
+            "avg_cost": round(sum(costs) / len(costs), 6) if costs else None,
+        })
+    return report
@@ -0,0 +1,223 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("dedup-audit")
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import defaultdict
+
+# Near-duplicate detection across every generated page. Each text field is reduced to a
+# MinHash signature of its word shingles and indexed with LSH banding, so a new record is
+# compared only against records sharing a band bucket rather than against all of them.
+# Candidates are confirmed by the signature's Jaccard estimate. DUPLICATE_ACTION is
+# "flag" (default: record and print), "regenerate" (ask for a new response up to
+# DUPLICATE_MAX_REGENERATIONS times, keeping the most distinct one) or "off".
+#
+#   python cli.py dedup-audit job_description      # whole worksheet, in memory
+
+DUPLICATE_ACTION = os.getenv("DUPLICATE_ACTION", "flag").lower()
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.8"))
+DUPLICATE_MAX_REGENERATIONS = int(os.getenv("DUPLICATE_MAX_REGENERATIONS", "2"))
+DUPLICATE_INDEX = os.getenv("DUPLICATE_INDEX", "near_duplicates.db")
+SHINGLE_WORDS = 5
+# 16 bands x 8 rows: pairs around 0.7 Jaccard and up become candidates with high probability
+NUM_BANDS = 16
+BAND_ROWS = 8
+NUM_PERM = NUM_BANDS * BAND_ROWS
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_permutations = None
+
+def permutations():
+    # Fixed seed so signatures stay comparable across runs and processes
+    global _permutations
+    if _permutations is None:
+        import numpy as np
+        generator = np.random.RandomState(1)
+        _permutations = (
+            generator.randint(1, _MAX_HASH, size=NUM_PERM, dtype=np.uint64),
+            generator.randint(0, _MAX_HASH, size=NUM_PERM, dtype=np.uint64),
+        )
+    return _permutations
+
+def shingles(text: str) -> set:
+    words = re.sub(r"<[^>]+>", " ", text).lower()
+    words = re.findall(r"[a-z0-9]+", words)
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def signature(text: str):
+    # Returns a uint64 array of NUM_PERM minimum hashes, or None for empty text
+    import numpy as np
+    grams = shingles(text)
+    if not grams:
+        return None
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "little") for gram in grams],
+        dtype=np.uint64)
+    a, b = permutations()
+    permuted = (np.outer(hashes, a) + b) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0)
+
+def similarity(first, second) -> float:
+    return float((first == second).mean())
+
+def band_keys(sig) -> list:
+    return [hashlib.blake2b(sig[band * BAND_ROWS:(band + 1) * BAND_ROWS].tobytes(), digest_size=8).hexdigest()
+            for band in range(NUM_BANDS)]
+
+def column_texts(row: dict, fields: dict) -> dict:
+    # fields maps a field name to the sheet columns whose text makes it up
+    return {field: "\n".join(str(row.get(column) or "") for column in columns) for field, columns in fields.items()}
+
+class DuplicateIndex:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS signatures (field TEXT, title TEXT, signature BLOB, PRIMARY KEY (field, title))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS bands (field TEXT, band INTEGER, bucket TEXT, title TEXT)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS bands_lookup ON bands (field, band, bucket)")
+        # Re-adding a title deletes its old bands by (field, title)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS bands_title ON bands (field, title)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS flags (
+                field TEXT, title TEXT, duplicate_of TEXT, similarity REAL, flagged_at REAL
+            )""")
+        self._lock = threading.Lock()
+
+    def query(self, field: str, sig, exclude: str = None) -> list:
+        # [(other title, estimated Jaccard)] above DUPLICATE_THRESHOLD, most similar first
+        with self._lock:
+            return self._matches(field, sig, exclude)
+
+    def _matches(self, field: str, sig, exclude: str = None) -> list:
+        import numpy as np
+        candidates = set()
+        for band, bucket in enumerate(band_keys(sig)):
+            candidates.update(title for (title,) in self.conn.execute(
+                "SELECT title FROM bands WHERE field = ? AND band = ? AND bucket = ?", (field, band, bucket)))
+        candidates.discard(exclude)
+        matches = []
+        for title in candidates:
+            row = self.conn.execute(
+                "SELECT signature FROM signatures WHERE field = ? AND title = ?", (field, title)).fetchone()
+            score = similarity(sig, np.frombuffer(row[0], dtype=np.uint64))
+            if score >= DUPLICATE_THRESHOLD:
+                matches.append((title, score))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def add(self, field: str, title: str, sig) -> list:
+        # A regenerated title replaces its previous signature. The index is queried again in
+        # the same write transaction, so a title added by another thread or worker since the
+        # caller's check is still matched; returns those matches.
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                matches = self._matches(field, sig, exclude=title)
+                self.conn.execute("DELETE FROM bands WHERE field = ? AND title = ?", (field, title))
+                self.conn.execute("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)", (field, title, sig.tobytes()))
+                self.conn.executemany("INSERT INTO bands VALUES (?, ?, ?, ?)",
+                                      ((field, band, bucket, title) for band, bucket in enumerate(band_keys(sig))))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return matches
+
+    def flag(self, field: str, title: str, duplicate_of: str, score: float) -> None:
+        with self._lock:
+            self.conn.execute("INSERT INTO flags VALUES (?, ?, ?, ?, ?)", (field, title, duplicate_of, score, time.time()))
+
+_index = None
+
+def duplicate_index() -> DuplicateIndex:
+    global _index
+    if _index is None:
+        _index = DuplicateIndex(DUPLICATE_INDEX)
+    return _index
+
+def check(content_type: str, title: str, texts: dict) -> dict:
+    # {field: (signature, matches)} for one record's text fields
+    index = duplicate_index()
+    checked = {}
+    for field, text in texts.items():
+        sig = signature(text)
+        if sig is not None:
+            checked[field] = (sig, index.query(f"{content_type}.{field}", sig, exclude=title))
+    return checked
+
+def first_distinct(content_type: str, title: str, generate, texts_of):
+    # Runs generate(attempt) and checks texts_of(result) against the index. With
+    # DUPLICATE_ACTION=regenerate a near-duplicate is generated again, keeping the result
+    # with the fewest matching fields. The kept result is indexed and any matches flagged.
+    if DUPLICATE_ACTION == "off":
+        return generate(0)
+    attempts = 1 + (DUPLICATE_MAX_REGENERATIONS if DUPLICATE_ACTION == "regenerate" else 0)
+    best = None
+    for attempt in range(attempts):
+        result = generate(attempt)
+        checked = check(content_type, title, texts_of(result))
+        duplicated = [field for field, (sig, matches) in checked.items() if matches]
+        if best is None or len(duplicated) < len(best[2]):
+            best = (result, checked, duplicated)
+        if not duplicated:
+            break
+        if attempt < attempts - 1:
+            print(f"{title}: near-duplicate {', '.join(duplicated)}, regenerating")
+
+    result, checked, duplicated = best
+    index = duplicate_index()
+    for field, (sig, matches) in checked.items():
+        # Flagged against what the index holds when the result is added, which includes
+        # titles generated concurrently since the check
+        for other, score in index.add(f"{content_type}.{field}", title, sig):
+            print(f"{title}: {field} is a near-duplicate of {other} ({score:.0%})")
+            index.flag(f"{content_type}.{field}", title, other, score)
+    return result
+
+def audit_rows(rows: list, fields: dict, title_column: str = "job_title") -> list:
+    # Bulk mode: builds an in-memory LSH over every row and returns each near-duplicate
+    # pair once as {field, title, duplicate_of, similarity}
+    pairs = []
+    for field, columns in fields.items():
+        signatures, buckets = {}, defaultdict(list)
+        for row in rows:
+            title = row.get(title_column)
+            sig = signature(column_texts(row, {field: columns})[field])
+            if not title or sig is None:
+                continue
+            signatures[title] = sig
+            for band, bucket in enumerate(band_keys(sig)):
+                buckets[(band, bucket)].append(title)
+        seen = set()
+        for titles in buckets.values():
+            for i, first in enumerate(titles):
+                for second in titles[i + 1:]:
+                    pair = (first, second) if first < second else (second, first)
+                    if first == second or pair in seen:
+                        continue
+                    seen.add(pair)
+                    score = similarity(signatures[first], signatures[second])
+                    if score >= DUPLICATE_THRESHOLD:
+                        pairs.append({"field": field, "title": pair[0], "duplicate_of": pair[1], "similarity": round(score, 3)})
+    return pairs
+
+def audit_worksheet(generator) -> list:
+    # One read of the whole worksheet; the header row names the columns
+    connect = generator.connect_to_google_sheets_docs()
+    sheet = connect[0] if isinstance(connect, tuple) else connect
+    values = sheet.get_all_values()
+    if not values:
+        return []
+    header = values[0]
+    if not set(column for columns in generator.DUPLICATE_FIELDS.values() for column in columns) <= set(header):
+        header = getattr(generator, "SHEET_COLUMNS", header)
+    rows = [dict(zip(header, row)) for row in values[1:]]
+    print(f"Auditing {len(rows)} rows")
+    return audit_rows(rows, generator.DUPLICATE_FIELDS)
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import asyncio
+import usage_history
+import hedging
+import pricing
+import token_planner
+import concurrency
+
+def connect_to_async_openai() -> "AsyncOpenAI":
+    from openai import AsyncOpenAI
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return client
+
+def check_content(response, validate) -> list:
+    # Runs a generator's validator on the parsed JSON body, returning a list of problems
+    try:
+        content = json.loads(response.choices[0].message.content)
+    except (json.JSONDecodeError, TypeError) as e:
+        return [f"invalid JSON: {e}"]
+    try:
+        return validate(content)
+    except Exception as e:
+        return [str(e)]
+
+async def limited_create(client: "AsyncOpenAI", request: dict, content_type: str):
+    # Every request, hedges included, holds a slot of the adaptive OpenAI concurrency limit.
+    # Latency is judged per completion token and per model, since a long answer or a larger
+    # model is slower without the service being congested.
+    async with concurrency.openai_limiter.aslot((content_type, request.get("model"))) as sample:
+        response = await client.chat.completions.create(**request)
+        if response.usage and response.usage.completion_tokens:
+            sample["work"] = response.usage.completion_tokens
+        return response
+
+async def complete_once(content_type: str, request: dict, validate, client: "AsyncOpenAI"):
+    # One chat completion, recorded with its latency, usage and cost.
+    # With a validator the call is also recorded as passed/failed; returns (response, problems).
+    async def attempt():
+        # Each attempt is timed from its own start, so a winning hedge is recorded with its
+        # own latency like any other call rather than with the wait before it was fired
+        start = time.time()
+        response = await limited_create(client, request, content_type)
+        return response, time.time() - start
+
+    if hedging.hedging_enabled():
+        (response, latency), hedged = await hedging.hedged_call(attempt, content_type, request.get("model"))
+    else:
+        (response, latency), hedged = await attempt(), False
+
+    finish_reason = response.choices[0].finish_reason
+    extra = {"hedged": hedged}
+    problems = []
+    if validate is not None and finish_reason != "length":
+        problems = check_content(response, validate)
+        extra["passed"] = not problems
+
+    usage = response.usage
+    prompt_tokens = usage.prompt_tokens if usage else None
+    completion_tokens = usage.completion_tokens if usage else None
+    usage_history.record_usage(
+        content_type,
+        request.get("model"),
+        latency,
+        prompt_tokens,
+        completion_tokens,
+        finish_reason,
+        cost=pricing.estimate_cost(request.get("model"), prompt_tokens, completion_tokens),
+        token_limit=request.get(token_planner.limit_key(request)),
+        **extra
+    )
+    return response, problems
+
+async def acreate_checked(content_type: str, request: dict, validate, client: "AsyncOpenAI" = None):
+    # Sizes max_tokens from observed usage and retries with a larger cap only on truncation
+    client = client or connect_to_async_openai()
+    request, ceiling = token_planner.size_request(content_type, request)
+    while True:
+        response, problems = await complete_once(content_type, request, validate, client)
+        if response.choices[0].finish_reason != "length":
+            return response, problems
+        larger = token_planner.grow_request(request, ceiling)
+        if larger is None:
+            if validate is not None:
+                problems = check_content(response, validate)
+            return response, problems
+        key = token_planner.limit_key(request)
+        print(f"{content_type} response truncated at {request[key]} tokens, retrying with {larger[key]}")
+        request = larger
+
+async def acreate(content_type: str, request: dict, client: "AsyncOpenAI" = None):
+    response, _ = await acreate_checked(content_type, request, None, client)
+    return response
+
+def create(content_type: str, request: dict):
+    # Blocking wrapper for the scripts' synchronous loops
+    async def run():
+        async with connect_to_async_openai() as client:
+            return await acreate(content_type, request, client)
+    return asyncio.run(run())
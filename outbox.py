@@ -0,0 +1,238 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("outbox")
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import concurrency
+import google_batch
+
+# Every Google write is recorded in a local SQLite outbox before it is attempted and
+# deleted once it has landed, so generation that has already been paid for survives a
+# Docs or Sheets outage, a crash or a killed worker. Each service has a circuit breaker:
+# after BREAKER_FAILURE_THRESHOLD failed calls in a row it opens and writes to that service
+# are deferred (left in the outbox) instead of retried, while generation carries on. After
+# BREAKER_RESET_SECONDS one trial call is let through; if it works the breaker closes and
+# the backlog drains in bulk with the next writes.
+#
+#   python cli.py outbox status
+#   python cli.py outbox drain job_description
+
+OUTBOX_DB = os.getenv("OUTBOX_DB", "outbox.db")
+# Entries replayed per drain; docs go out through batched HTTP requests of up to 100 calls
+OUTBOX_DRAIN_BATCH = int(os.getenv("OUTBOX_DRAIN_BATCH", "100"))
+# After this many failed attempts an entry is left for inspection instead of replayed
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "60"))
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half_open" if time.time() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        # Closed: always. Open: never, until BREAKER_RESET_SECONDS have passed; then one
+        # caller at a time gets a trial call
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.time() - self.opened_at < self.reset_seconds or self.trial:
+                return False
+            self.trial = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                print(f"{self.name} circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                print(f"{self.name} circuit open for {self.reset_seconds:.0f}s after {self.failures} failures")
+                self.opened_at = time.time()
+            self.trial = False
+
+docs_breaker = CircuitBreaker("docs")
+sheets_breaker = CircuitBreaker("sheets")
+
+def is_service_failure(exception) -> bool:
+    # Throttling, server errors and network failures say the service is unwell; a 400
+    # for one bad request does not
+    status = concurrency.status_of(exception)
+    return status is None or status == 429 or status >= 500
+
+class Outbox:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # One live entry per (content type, service, key); recording a key again replaces its
+        # payload and seq, so a write that finishes for an older seq leaves the newer one queued
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                content_type TEXT, service TEXT, key TEXT, seq INTEGER, payload TEXT,
+                attempts INTEGER DEFAULT 0, last_error TEXT, created_at REAL,
+                PRIMARY KEY (content_type, service, key)
+            )""")
+        self._lock = threading.Lock()
+
+    def record(self, content_type: str, service: str, payloads: dict) -> dict:
+        # payloads maps key -> JSON-serialisable payload; returns {key: seq}
+        seqs = {}
+        with self._lock:
+            self.conn.execute("BEGIN")
+            for key, payload in payloads.items():
+                seqs[key] = time.time_ns()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, 0, NULL, ?)",
+                    (content_type, service, key, seqs[key], json.dumps(payload), time.time()))
+            self.conn.execute("COMMIT")
+        return seqs
+
+    def done(self, content_type: str, service: str, seqs: dict) -> None:
+        with self._lock:
+            self.conn.executemany(
+                "DELETE FROM entries WHERE content_type = ? AND service = ? AND key = ? AND seq = ?",
+                ((content_type, service, key, seq) for key, seq in seqs.items()))
+
+    def update(self, content_type: str, service: str, payloads: dict) -> None:
+        # payloads maps key -> (seq, payload); rewrites the payload of an entry that is still at
+        # that seq (progress of a partly done write), keeping its attempts
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE entries SET payload = ? WHERE content_type = ? AND service = ? AND key = ? AND seq = ?",
+                ((json.dumps(payload), content_type, service, key, seq) for key, (seq, payload) in payloads.items()))
+
+    def failed(self, content_type: str, service: str, errors: dict) -> None:
+        # errors maps key -> error
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE entries SET attempts = attempts + 1, last_error = ? WHERE content_type = ? AND service = ? AND key = ?",
+                ((str(error)[:1000], content_type, service, key) for key, error in errors.items()))
+
+    def pending(self, content_type: str, service: str, limit: int = OUTBOX_DRAIN_BATCH) -> list:
+        # [(key, seq, payload)], oldest first
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT key, seq, payload FROM entries WHERE content_type = ? AND service = ? AND attempts < ? ORDER BY seq LIMIT ?",
+                (content_type, service, OUTBOX_MAX_ATTEMPTS, limit)).fetchall()
+        return [(key, seq, json.loads(payload)) for key, seq, payload in rows]
+
+    def count(self, content_type: str, service: str) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE content_type = ? AND service = ? AND attempts < ?",
+                (content_type, service, OUTBOX_MAX_ATTEMPTS)).fetchone()[0]
+
+    def status(self) -> list:
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT content_type, service, COUNT(*), SUM(attempts >= ?), MIN(created_at)
+                FROM entries GROUP BY content_type, service""", (OUTBOX_MAX_ATTEMPTS,)).fetchall()
+        return [
+            {"content_type": content_type, "service": service, "pending": count - (stuck or 0),
+             "given_up": stuck or 0, "oldest_age_seconds": round(time.time() - oldest)}
+            for content_type, service, count, stuck, oldest in rows
+        ]
+
+_outbox = None
+
+def default_outbox() -> Outbox:
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(OUTBOX_DB)
+    return _outbox
+
+def write_docs(content_type: str, pool, docs: dict, rows: dict, sink, box: Outbox = None) -> dict:
+    # docs maps a title to {'title': ..., 'requests': [...]} and rows maps it to its sheet row,
+    # whose last cell takes the doc link. The docs are recorded first, then this batch and
+    # any backlog go out in one create_docs call while the docs breaker allows it. Rows reach
+    # the sink with their link once the doc exists; a row whose doc is deferred or failed goes
+    # to the sheet without one and is upserted again when the doc drains. Returns {title: error}.
+    box = box or default_outbox()
+    payloads = {title: {"doc": docs[title], "row": rows[title]} for title in docs}
+    seqs = box.record(content_type, "docs", payloads)
+    without_link = dict(rows)
+    errors = {}
+
+    account = pool.pick()
+    # This batch always goes out; the backlog fills up to a drain batch, and a drain never asks
+    # for more than a minute of the account's docs quota in one go
+    limit = max(0, min(OUTBOX_DRAIN_BATCH, account.docs_limiter.per_minute) - len(docs))
+    backlog = [entry for entry in box.pending(content_type, "docs", limit + len(docs)) if entry[0] not in docs][:limit]
+    entries = [(title, seqs[title], payloads[title]) for title in docs] + backlog
+    if entries and docs_breaker.allow():
+        sheet, docs_service, drive_service = account.connect()
+        try:
+            # Created and filled docs are saved into their entries as they go, so a replay
+            # continues from batchUpdate or the permission instead of creating a second doc
+            by_key = {key: (seq, payload) for key, seq, payload in entries}
+            document_ids, errors = google_batch.create_docs(
+                docs_service, drive_service, {key: payload["doc"] for key, seq, payload in entries}, account,
+                lambda keys: box.update(content_type, "docs", {key: by_key[key] for key in keys}))
+        except Exception as e:
+            print("Docs batch failed, leaving it in the outbox:", e)
+            document_ids, errors = {}, {key: e for key, seq, payload in entries}
+            docs_breaker.record_failure()
+        else:
+            if entries and not document_ids and any(is_service_failure(error) for error in errors.values()):
+                docs_breaker.record_failure()
+            else:
+                docs_breaker.record_success()
+
+        linked = []
+        for key, seq, payload in entries:
+            if key in document_ids:
+                row = payload["row"]
+                # Assign Google Doc link to the last column of the row
+                row[-1] = "https://docs.google.com/document/d/" + document_ids[key] + "/copy"
+                print("Google doc link:", row[-1])
+                linked.append(row)
+                without_link.pop(key, None)
+        if linked:
+            sink.submit(linked)
+        box.done(content_type, "docs", {key: seq for key, seq, payload in entries if key in document_ids})
+        box.failed(content_type, "docs", {key: errors[key] for key, seq, payload in entries if key in errors})
+    elif entries:
+        print(f"Docs circuit open, {len(docs)} docs deferred to the outbox")
+
+    if without_link:
+        sink.submit(list(without_link.values()))
+    return {title: error for title, error in errors.items() if title in docs}
+
+def drain(generator, content_type: str, box: Outbox = None) -> None:
+    # Replays everything left in the outbox for one content type through the generator's
+    # own outputs; sheet rows are replayed by the SheetSink as soon as it opens, and again
+    # from its writer thread whenever the sheets breaker closes after deferring rows
+    box = box or default_outbox()
+    outputs = generator.open_outputs()
+    if isinstance(outputs, tuple):
+        pool, sink = outputs[0], outputs[-1]
+        while box.count(content_type, "docs"):
+            before = box.count(content_type, "docs")
+            write_docs(content_type, pool, {}, {}, sink, box)
+            if box.count(content_type, "docs") >= before:
+                print("Docs backlog is not shrinking, stopping")
+                break
+    generator.close_outputs(outputs)
+    print(json.dumps(box.status()))
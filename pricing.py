@@ -0,0 +1,15 @@
+import os
+import json
+
+# USD per 1M tokens (input, output). Override with MODEL_PRICES='{"model": [in, out]}'
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("MODEL_PRICES", "{}")).items()})
+
+def estimate_cost(model: str, prompt_tokens, completion_tokens):
+    if model not in MODEL_PRICES:
+        return None
+    input_price, output_price = MODEL_PRICES[model]
+    return round(((prompt_tokens or 0) * input_price + (completion_tokens or 0) * output_price) / 1_000_000, 6)
@@ -1,19 +1,30 @@
-from openai import OpenAI
+if __name__ == "__main__":
+    import cli
+    cli.run_script("resume_template")
+
 import os
-from dotenv import load_dotenv
-load_dotenv()
 import json
 import traceback
 from pydantic import BaseModel, Field
 from typing import List, Optional
-import pandas as pd
 import time
-from oauth2client.service_account import ServiceAccountCredentials
-import gspread
-from googleapiclient.discovery import build
+import model_routing
+import role_profile
+import usage_history
+import sectional
+import title_stream
+import credential_pool
+import sheet_sink
+import concurrency
+import refresh
+import near_duplicates
 import html
+import itertools
 import warnings
-warnings.filterwarnings("ignore")
+
+# Year the overview's growth and salary statistics are stated for; the prompt asks for it
+# and the validator checks for it, so both change together
+STATISTICS_YEAR = os.getenv("RESUME_STATISTICS_YEAR", "2025")
 
 class SkillsToAdd(BaseModel):
     technical_skills: List[str] = Field(..., min_items=3, description="Must have at least 3 skills")
@@ -48,15 +59,52 @@ class BasicSections(BaseModel):
     education: Education
     project: Project
 
-def read_input_csv() -> pd.DataFrame:
-    all_job_titles = pd.read_csv(r"data\HR Templates  - Job titles (B2C).csv")
-    all_job_titles = all_job_titles.apply(lambda x: x.str.title()).copy()
-    return all_job_titles
+class Overview(BaseModel):
+    job_title_and_role_significance: str
+    summary: str
+
+def overview_problems(overview) -> list:
+    problems = []
+    if len(overview.summary.split()) < 25:
+        problems.append("summary is too short")
+    if STATISTICS_YEAR not in overview.job_title_and_role_significance:
+        problems.append("role significance does not date its statistics")
+    return problems
+
+def experience_problems(experience: Experience) -> list:
+    if len(experience.right_example) != len(experience.wrong_example):
+        return ["right and wrong experience examples are unpaired"]
+    return []
 
-def connect_to_openai() -> OpenAI:
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") 
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    return client
+def validate_content(content: dict) -> list:
+    basic_sections = BasicSections(**content)
+    return overview_problems(basic_sections) + experience_problems(basic_sections.experience)
+
+def validate_overview(content: dict) -> list:
+    return overview_problems(Overview(**content))
+
+def validate_experience(content: dict) -> list:
+    return experience_problems(Experience(**content["experience"]))
+
+def section_validator(key: str, model):
+    def validate(content: dict) -> list:
+        model(**content[key])
+        return []
+    return validate
+
+# Sections generated concurrently when RESUME_SECTIONAL=1: schema keys and validator
+RESUME_SECTIONS = {
+    "overview": (["job_title_and_role_significance", "summary"], validate_overview),
+    "skills_to_add": (["skills_to_add"], section_validator("skills_to_add", SkillsToAdd)),
+    "kpis_and_okrs": (["kpis_and_okrs"], section_validator("kpis_and_okrs", KPIsAndOKRs)),
+    "experience": (["experience"], validate_experience),
+    "education": (["education"], section_validator("education", Education)),
+    "project": (["project"], section_validator("project", Project)),
+}
+
+def read_input_titles(schedule: bool = False):
+    # Streams title-cased titles from the CSV (TITLES_INPUT may point at another CSV/JSONL file or "-" for stdin)
+    return title_stream.iter_titles(os.getenv("TITLES_INPUT", r"data\HR Templates  - Job titles (B2C).csv"), "job_titles", str.title, schedule=schedule)
 
 def process_response(response, prompt_tokens, completion_tokens):
     try:
@@ -74,8 +122,8 @@ def process_response(response, prompt_tokens, completion_tokens):
         traceback.print_exc()  # Catch any other unexpected errors
         return {}, None, None
 
-def get_openai_resp(job_title: str):
-    response = connect_to_openai().chat.completions.create(
+def build_request(job_title: str) -> dict:
+    return dict(
     model="gpt-4o",
     messages=[
         {
@@ -83,7 +131,7 @@ def get_openai_resp(job_title: str):
         "content": [
             {
             "type": "text",
-            "text": "Your job is to write a resume template article divided into separate sections.  Return the response in JSON format.\n\n1. The first section talks briefly about the job title and its related attributes:\n\nProvide a brief description of the role's significance in the industry and relevant statistics (e.g., projected growth, average salary).\nWhen you are mentioning the statistics for project growth and average salary, mentioned that these statistics are for 2025.\nEnd the section with a new line: 'Now, we will guide you on how to write a great resume for [Job Title].'\n\nExample: \n[Job Title] professionals are essential for [brief description of the role's significance, e.g., driving business success, creating impactful designs, or leading technical innovations]. The demand for [Job Title] roles is projected to grow/shrink by [insert percentage trend in Middle East region], and the average salary ranges from [insert salary range according to Middle East region].\nA well-crafted resume is the first step toward showcasing your skills, achievements, and experience to potential employers. Now, we will guide you on how to write an impressive resume tailored for a [Job Title] role.\n\n2. Provide an example of a strong summary that highlights key skills, achievements, and career goals.\n\n3. What Skills to Add to Your [Job Title] Resume\n\nCategorize skills into two sections:\nTechnical Skills: Job-specific tools, software, or certifications.\nSoft Skills: Transferable skills like communication, problem-solving, or time management.\n\n4. What are [Job Title] KPIs and OKRs, and How Do They Fit Your Resume?\n\nWhat are top 3 KPIs pf this job title?\nWhat are top 3 OKRs of this job title?\n\n5. How to Describe Your [Job Title] Experience\n\nProvide examples of how to format the experience section using quantifiable achievements.\nUse bullet points starting with action verbs and emphasize measurable outcomes.\nInclude 3 'Right' and 'Wrong' examples to illustrate the difference.\n\n6. How to Present Your Education as a [Job Title]\n\nInclude relevant degrees, certifications, and training programs.\n\nExample structure:\nDegree/Certification Name: [Insert degree or certification name]\nInstitution: [Insert institution name]\nYear: [Insert graduation or completion year]\nRelevant Coursework (optional): [List key courses if relevant to the role].\n\n7. How to Highlight Your Projects as a [Job Title]\nDescribe key projects you've worked on that demonstrate your expertise and impact.\nInclude the project name, your role, tools/technologies used, and quantifiable outcomes.\n\nExample structure:\nProject Name: [Insert project name]\nRole: [Describe your role in the project]\nTools/Technologies: [List relevant tools or technologies used]\nOutcome: [Highlight measurable results or impact]."
+            "text": "Your job is to write a resume template article divided into separate sections.  Return the response in JSON format.\n\n1. The first section talks briefly about the job title and its related attributes:\n\nProvide a brief description of the role's significance in the industry and relevant statistics (e.g., projected growth, average salary).\nWhen you are mentioning the statistics for project growth and average salary, mentioned that these statistics are for " + STATISTICS_YEAR + ".\nEnd the section with a new line: 'Now, we will guide you on how to write a great resume for [Job Title].'\n\nExample: \n[Job Title] professionals are essential for [brief description of the role's significance, e.g., driving business success, creating impactful designs, or leading technical innovations]. The demand for [Job Title] roles is projected to grow/shrink by [insert percentage trend in Middle East region], and the average salary ranges from [insert salary range according to Middle East region].\nA well-crafted resume is the first step toward showcasing your skills, achievements, and experience to potential employers. Now, we will guide you on how to write an impressive resume tailored for a [Job Title] role.\n\n2. Provide an example of a strong summary that highlights key skills, achievements, and career goals.\n\n3. What Skills to Add to Your [Job Title] Resume\n\nCategorize skills into two sections:\nTechnical Skills: Job-specific tools, software, or certifications.\nSoft Skills: Transferable skills like communication, problem-solving, or time management.\n\n4. What are [Job Title] KPIs and OKRs, and How Do They Fit Your Resume?\n\nWhat are top 3 KPIs pf this job title?\nWhat are top 3 OKRs of this job title?\n\n5. How to Describe Your [Job Title] Experience\n\nProvide examples of how to format the experience section using quantifiable achievements.\nUse bullet points starting with action verbs and emphasize measurable outcomes.\nInclude 3 'Right' and 'Wrong' examples to illustrate the difference.\n\n6. How to Present Your Education as a [Job Title]\n\nInclude relevant degrees, certifications, and training programs.\n\nExample structure:\nDegree/Certification Name: [Insert degree or certification name]\nInstitution: [Insert institution name]\nYear: [Insert graduation or completion year]\nRelevant Coursework (optional): [List key courses if relevant to the role].\n\n7. How to Highlight Your Projects as a [Job Title]\nDescribe key projects you've worked on that demonstrate your expertise and impact.\nInclude the project name, your role, tools/technologies used, and quantifiable outcomes.\n\nExample structure:\nProject Name: [Insert project name]\nRole: [Describe your role in the project]\nTools/Technologies: [List relevant tools or technologies used]\nOutcome: [Highlight measurable results or impact]."
             }
         ]
         },
@@ -276,6 +324,25 @@ def get_openai_resp(job_title: str):
     presence_penalty=0
     )
 
+RESUME_SECTIONAL = os.getenv("RESUME_SECTIONAL", "0").lower() in ("1", "true", "yes")
+SECTION_MAX_TOKENS = int(os.getenv("RESUME_SECTION_MAX_TOKENS", "768"))
+
+def build_section_requests(job_title: str) -> dict:
+    request = role_profile.with_profile(build_request(job_title), job_title)
+    return {
+        name: (sectional.section_request(request, name, keys, SECTION_MAX_TOKENS), validate)
+        for name, (keys, validate) in RESUME_SECTIONS.items()
+    }
+
+def get_openai_resp(job_title: str):
+    if RESUME_SECTIONAL:
+        content, prompt_tokens, completion_tokens = sectional.generate_sections("resume_template", build_section_requests(job_title))
+        # Assembled sections are validated as a whole before the row is built
+        BasicSections(**content)
+        return content, prompt_tokens, completion_tokens
+
+    response = model_routing.create_routed("resume_template", role_profile.with_profile(build_request(job_title), job_title), validate_content)
+
     completion_tokens = response.usage.completion_tokens
     prompt_tokens = response.usage.prompt_tokens
     return process_response(response.choices[0].message.content, prompt_tokens, completion_tokens)
@@ -295,7 +362,12 @@ def convert_list_html(class_list: list) -> str:
         return html_list
     return "N/A"
 
-def connect_to_google_sheets_docs():
+DEFAULT_CREDENTIALS_FILE = r".\qureos-engineering.json"
+
+def connect_to_google_sheets_docs(keyfile: str = None):
+    from oauth2client.service_account import ServiceAccountCredentials
+    import gspread
+    from googleapiclient.discovery import build
     # Define the scope to include both Google Sheets and Google Docs
     scope = [
         "https://spreadsheets.google.com/feeds",
@@ -307,7 +379,7 @@ def connect_to_google_sheets_docs():
     
     # Load the credentials from the JSON key file
     credentials = ServiceAccountCredentials.from_json_keyfile_name(
-        r".\qureos-engineering.json", 
+        keyfile or os.getenv("GOOGLE_CREDENTIALS_FILE", DEFAULT_CREDENTIALS_FILE), 
         scope
     )
     
@@ -323,8 +395,10 @@ def connect_to_google_sheets_docs():
     
     return sheet, docs_service, drive_service
 
-def convert_dict_to_df(job_title: str) -> pd.DataFrame:
-    openai_resp = get_openai_resp(job_title)
+def convert_dict_to_df(job_title: str) -> "pd.DataFrame":
+    import pandas as pd
+    with usage_history.tagged(title=job_title, role_profile=role_profile.ROLE_PROFILE):
+        openai_resp = get_openai_resp(job_title)
     text_resp = openai_resp[0]
     print(json.dumps(text_resp))
     validated_data = BasicSections(**text_resp)
@@ -349,18 +423,59 @@ def convert_dict_to_df(job_title: str) -> pd.DataFrame:
 
     return resume_df
 
-def push_to_gs(sheet: gspread.Worksheet, sheet_data: list) -> None:
+# Text checked for near-duplicates across titles, by sheet column
+DUPLICATE_FIELDS = {
+    "summary": ["summary"],
+    "experience": ["exp_right_ex"],
+}
+
+def generate_row(job_title: str) -> "pd.DataFrame":
+    return near_duplicates.first_distinct(
+        "resume_template", job_title,
+        lambda attempt: convert_dict_to_df(job_title),
+        lambda resume_df: near_duplicates.column_texts(resume_df.iloc[0].to_dict(), DUPLICATE_FIELDS))
+
+def push_to_gs(sheet: "gspread.Worksheet", sheet_data: list) -> None:
     # Clear existing data and insert new data
     sheet.append_rows(sheet_data)
 
+# Rows are generated for this many titles before one append to the sheet
+SHEET_BATCH_SIZE = int(os.getenv("SHEET_BATCH_SIZE", "50"))
+
+def open_outputs():
+    # Sheet rows are upserted by job title from a background writer
+    return sheet_sink.SheetSink(
+        credential_pool.load_pool(connect_to_google_sheets_docs, DEFAULT_CREDENTIALS_FILE), content_type="resume_template")
+
+def flush_outputs(outputs) -> dict:
+    # Waits for the rows queued so far; returns {job title: error} for rows that never made it
+    return outputs.take_failed()
+
+def close_outputs(outputs) -> dict:
+    # Waits for queued sheet writes; returns {job title: error} for rows that never made it
+    failed = outputs.close()
+    for job_title, error in failed.items():
+        print(f"Sheet write failed for {job_title}:", error)
+    return failed
 
+def process_titles(job_titles: list, outputs) -> dict:
+    # Runs generate -> sheet for a batch of titles; returns {job title: error} for failed titles
+    frames, errors = concurrency.generate_all(generate_row, job_titles)
+    refresh.record("resume_template", list(frames))
+    sheet_data = [row for frame in frames.values() for row in frame.values.tolist()]
+    if sheet_data:
+        # Pushed to Google Sheets in the background from the least-loaded service account
+        outputs.submit(sheet_data)
+    return errors
 
-if __name__=="__main__":
-    job_title_list = read_input_csv()
+def main() -> None:
+    warnings.filterwarnings("ignore")
+    job_title_list = itertools.islice(read_input_titles(), 1)
+    outputs = open_outputs()
 
-    for _, row in job_title_list[:1].iterrows():
-        resume_df = convert_dict_to_df(row['job_titles'])
-        sheet_data = resume_df.values.tolist() 
-        sheet, docs_service, drive_service = connect_to_google_sheets_docs()
-        # Push to Google Sheets
-        push_to_gs(sheet, sheet_data)
+    while True:
+        batch = list(itertools.islice(job_title_list, SHEET_BATCH_SIZE))
+        if not batch:
+            break
+        process_titles(batch, outputs)
+    close_outputs(outputs)
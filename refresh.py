@@ -0,0 +1,220 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("refresh")
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import importlib
+import threading
+import concurrency
+import usage_history
+
+# Keeps generated pages fresh without regenerating everything at once. Every generated title
+# is recorded in REFRESH_DB with when it was generated and the content version, a fingerprint
+# of the generator's prompt and JSON schema (so editing "statistics are for 2025" or
+# `top_skills_2025` marks every older page as outdated). A record is stale once it is older
+# than REFRESH_MAX_AGE_DAYS or was made with another version. `refresh run` regenerates
+# stale titles, oldest first, under REFRESH_DAILY_TOKENS spread evenly over the day: by any
+# moment it has spent at most the share of the budget for the part of the day that has
+# passed. Refreshes run at low priority, so they never take the OpenAI share reserved for
+# high-tier titles (scheduler.py).
+#
+#   python cli.py refresh status resume_template
+#   python cli.py refresh seed resume_template       # titles generated before tracking began
+#   python cli.py refresh run resume_template [--forever]
+
+REFRESH_DB = os.getenv("REFRESH_DB", "refresh.db")
+REFRESH_MAX_AGE_DAYS = float(os.getenv("REFRESH_MAX_AGE_DAYS", "180"))
+REFRESH_DAILY_TOKENS = int(os.getenv("REFRESH_DAILY_TOKENS", "2000000"))
+REFRESH_BATCH_SIZE = int(os.getenv("REFRESH_BATCH_SIZE", "10"))
+# Used until the usage history shows what a title of this content type costs
+REFRESH_DEFAULT_TITLE_TOKENS = int(os.getenv("REFRESH_DEFAULT_TITLE_TOKENS", "8000"))
+REFRESH_POLL_SECONDS = float(os.getenv("REFRESH_POLL_SECONDS", "300"))
+
+_versions = {}
+
+def content_version(content_type: str) -> str:
+    # Fingerprint of the generator's request for an empty title: system prompt, example turns,
+    # model settings and response schema
+    if content_type not in _versions:
+        from cli import GENERATORS
+        request = importlib.import_module(GENERATORS[content_type]).build_request("")
+        _versions[content_type] = hashlib.sha1(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return _versions[content_type]
+
+def today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+class RefreshLedger:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS generations (
+                content_type TEXT, title TEXT, version TEXT, generated_at REAL,
+                PRIMARY KEY (content_type, title)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS generations_age ON generations (content_type, generated_at)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS spend (day TEXT, content_type TEXT, tokens INTEGER, PRIMARY KEY (day, content_type))")
+        self._lock = threading.Lock()
+
+    def record(self, content_type: str, titles: list, version: str, generated_at: float = None) -> None:
+        generated_at = time.time() if generated_at is None else generated_at
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?)",
+                ((content_type, title, version, generated_at) for title in titles))
+
+    def seed(self, content_type: str, titles) -> int:
+        # Titles with no record get one with an unknown version, so they count as stale
+        with self._lock:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO generations VALUES (?, ?, '', 0)",
+                ((content_type, title) for title in titles))
+        return cursor.rowcount
+
+    def stale(self, content_type: str, version: str, limit: int) -> list:
+        cutoff = time.time() - REFRESH_MAX_AGE_DAYS * 86400
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT title FROM generations
+                WHERE content_type = ? AND (version != ? OR generated_at < ?)
+                ORDER BY generated_at LIMIT ?""", (content_type, version, cutoff, limit)).fetchall()
+        return [title for (title,) in rows]
+
+    def status(self, content_type: str, version: str) -> dict:
+        cutoff = time.time() - REFRESH_MAX_AGE_DAYS * 86400
+        with self._lock:
+            total, outdated, aged, oldest = self.conn.execute("""
+                SELECT COUNT(*), SUM(version != ?), SUM(version = ? AND generated_at < ?), MIN(NULLIF(generated_at, 0))
+                FROM generations WHERE content_type = ?""", (version, version, cutoff, content_type)).fetchone()
+        return {
+            "content_type": content_type,
+            "version": version,
+            "tracked": total,
+            "outdated_version": outdated or 0,
+            "older_than_max_age": aged or 0,
+            "oldest_age_days": round((time.time() - oldest) / 86400, 1) if oldest else None,
+            "spent_today": self.spent(today()),
+        }
+
+    def add_spend(self, day: str, content_type: str, tokens: int) -> None:
+        with self._lock:
+            self.conn.execute("""
+                INSERT INTO spend VALUES (?, ?, ?)
+                ON CONFLICT (day, content_type) DO UPDATE SET tokens = tokens + excluded.tokens""",
+                (day, content_type, tokens))
+
+    def spent(self, day: str) -> int:
+        # The budget is shared by every content type
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(SUM(tokens), 0) FROM spend WHERE day = ?", (day,)).fetchone()[0]
+
+_ledger = None
+
+def refresh_ledger() -> RefreshLedger:
+    global _ledger
+    if _ledger is None:
+        _ledger = RefreshLedger(REFRESH_DB)
+    return _ledger
+
+def record(content_type: str, titles: list) -> None:
+    # Called by each generator for the titles it has just generated
+    if titles:
+        refresh_ledger().record(content_type, titles, content_version(content_type))
+
+# Calls made for a title under another content-type key: the role profile and translations
+SHARED_STAGES = ("role_profile", "localize")
+
+def tokens_per_title(content_type: str) -> float:
+    # Mean total tokens per title over the recent history (all models, validation retries
+    # included). A title's calls are spread over several keys: its own content type, one
+    # "<content type>:<section>" key per section for sectional generators, and the shared
+    # stages, which are only counted for titles that also have calls of this content type.
+    totals = {}
+    shared = {}
+    for key in usage_history.content_types():
+        if key in SHARED_STAGES:
+            target = shared
+        elif key == content_type or key.startswith(content_type + ":"):
+            target = totals
+        else:
+            continue
+        for r in usage_history.recent_records(key):
+            if r.get("title"):
+                target[r["title"]] = target.get(r["title"], 0) + (r.get("prompt_tokens") or 0) + (r.get("completion_tokens") or 0)
+    for title, tokens in shared.items():
+        if title in totals:
+            totals[title] += tokens
+    return sum(totals.values()) / len(totals) if totals else REFRESH_DEFAULT_TITLE_TOKENS
+
+def allowance(now: float = None) -> float:
+    # Share of the daily budget available by now (UTC day), so spending is spread evenly
+    now = now or time.time()
+    return REFRESH_DAILY_TOKENS * (now % 86400) / 86400
+
+def run(content_type: str, forever: bool = False) -> None:
+    from cli import GENERATORS
+    generator = importlib.import_module(GENERATORS[content_type])
+    ledger = refresh_ledger()
+    version = content_version(content_type)
+    outputs = generator.open_outputs()
+    # Titles that failed this run are not retried until the next one
+    failed = set()
+
+    while True:
+        per_title = tokens_per_title(content_type)
+        available = allowance() - ledger.spent(today())
+        count = min(REFRESH_BATCH_SIZE, int(available // per_title))
+        titles = [title for title in ledger.stale(content_type, version, count + len(failed))
+                  if title not in failed][:count] if count > 0 else []
+        if not titles:
+            if count > 0:
+                print("Nothing stale to refresh")
+                wait = REFRESH_POLL_SECONDS
+            else:
+                # Until the budget has accrued enough for one more title
+                wait = (per_title - available) * 86400 / REFRESH_DAILY_TOKENS
+                print(f"Refresh budget used up for now, next title in {wait / 60:.0f} minutes")
+            if not forever:
+                break
+            time.sleep(min(max(wait, 1), REFRESH_POLL_SECONDS))
+            continue
+
+        print(f"Refreshing {len(titles)} titles ({per_title:.0f} tokens each, {available:.0f} available)")
+        for title in titles:
+            concurrency.title_priorities[title] = "low"
+        try:
+            # Every call made for these titles is charged, whatever key it is recorded under
+            # (sections, role profile, translations)
+            with usage_history.collected() as records, usage_history.tagged(refresh=True):
+                errors = generator.process_titles(titles, outputs)
+            if hasattr(generator, "flush_outputs"):
+                unwritten = {title: error for title, error in generator.flush_outputs(outputs).items() if title in titles}
+                # Recorded as fresh by process_titles; marked outdated again so the next run retries them
+                ledger.record(content_type, list(unwritten), "")
+                errors.update(unwritten)
+        finally:
+            for title in titles:
+                concurrency.title_priorities.pop(title, None)
+        spent = sum((r.get("prompt_tokens") or 0) + (r.get("completion_tokens") or 0) for r in records)
+        ledger.add_spend(today(), content_type, spent)
+        print(f"Refreshed {len(titles) - len(errors)} titles, {len(errors)} failed, {spent} tokens")
+        failed.update(errors)
+
+    if hasattr(generator, "close_outputs"):
+        generator.close_outputs(outputs)
+
+def main(command: str, content_type: str, forever: bool = False) -> None:
+    ledger = refresh_ledger()
+    if command == "status":
+        print(json.dumps(ledger.status(content_type, content_version(content_type))))
+    elif command == "seed":
+        from cli import GENERATORS
+        generator = importlib.import_module(GENERATORS[content_type])
+        print("Tracking", ledger.seed(content_type, generator.read_input_titles()), "untracked titles")
+    elif command == "run":
+        run(content_type, forever)
@@ -0,0 +1,237 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("related")
+
+import os
+import re
+import json
+import math
+import html
+import sqlite3
+import hashlib
+from collections import Counter
+
+# Related-roles internal links for job description pages. Each title becomes a sparse
+# TF-IDF vector over its skills, tools, team structure and responsibility words; cosine
+# top-k neighbours are computed with blocked sparse matrix products, so 100k titles never
+# need a dense title x title matrix. Features and neighbour lists persist in
+# RELATED_ROLES_DB, and a run only multiplies the titles that are new or changed since the
+# last one, merging them into existing neighbours' lists. Results go to the worksheet's
+# `related_titles` and `related_titles_html` columns in one values.batchUpdate.
+#
+#   python cli.py related [--rebuild]
+
+RELATED_ROLES_DB = os.getenv("RELATED_ROLES_DB", "related_roles.db")
+RELATED_TOP_K = int(os.getenv("RELATED_TOP_K", "8"))
+RELATED_MIN_SIMILARITY = float(os.getenv("RELATED_MIN_SIMILARITY", "0.1"))
+# Rows multiplied against the whole matrix at a time; bounds the memory of each product
+RELATED_BLOCK_ROWS = int(os.getenv("RELATED_BLOCK_ROWS", "2000"))
+# Terms on more than this share of titles carry no signal and make products dense
+RELATED_MAX_DF = float(os.getenv("RELATED_MAX_DF", "0.2"))
+RELATED_URL_PREFIX = os.getenv("RELATED_URL_PREFIX", "/job-description/")
+
+# Sheet column -> (term prefix, weight, how the cell splits into terms)
+FEATURE_COLUMNS = {
+    "skills_text": ("skill", 1.0, "lines"),
+    "tools_text": ("tool", 1.0, "lines"),
+    "collaborates_with": ("team", 0.7, "commas"),
+    "reports_to": ("team", 0.7, "commas"),
+    "key_responsibilities_text": ("word", 0.3, "words"),
+}
+RELATED_COLUMNS = ["related_titles", "related_titles_html"]
+_STOPWORDS = {"and", "the", "to", "of", "for", "in", "with", "a", "an", "on", "by", "or", "as", "their", "all"}
+
+def normalize(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9+#]+", text.lower()))
+
+def terms(row: dict) -> dict:
+    # Weighted term counts for one sheet row
+    counts = Counter()
+    for column, (prefix, weight, split) in FEATURE_COLUMNS.items():
+        value = row.get(column) or ""
+        if split == "lines":
+            parts = value.split("\n")
+        elif split == "commas":
+            parts = re.split(r"[,;/]| and ", value)
+        else:
+            parts = [word for word in normalize(value).split() if word not in _STOPWORDS and len(word) > 2]
+        for part in parts:
+            part = normalize(part)
+            if part:
+                counts[f"{prefix}:{part}"] += weight
+    return dict(counts)
+
+def fingerprint(features: dict) -> str:
+    return hashlib.sha1(json.dumps(features, sort_keys=True).encode("utf-8")).hexdigest()
+
+class RelatedStore:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS features (title TEXT PRIMARY KEY, fingerprint TEXT, terms TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS related (title TEXT PRIMARY KEY, related TEXT)")
+
+    def upsert_features(self, rows: dict) -> list:
+        # rows maps title -> sheet row dict; returns the titles that are new or changed
+        known = dict(self.conn.execute("SELECT title, fingerprint FROM features"))
+        changed = []
+        self.conn.execute("BEGIN")
+        for title, row in rows.items():
+            features = terms(row)
+            digest = fingerprint(features)
+            if known.get(title) != digest:
+                self.conn.execute("INSERT OR REPLACE INTO features VALUES (?, ?, ?)", (title, digest, json.dumps(features)))
+                changed.append(title)
+        self.conn.execute("COMMIT")
+        return changed
+
+    def features(self):
+        titles, features = [], []
+        for title, encoded in self.conn.execute("SELECT title, terms FROM features ORDER BY title"):
+            titles.append(title)
+            features.append(json.loads(encoded))
+        return titles, features
+
+    def related(self) -> dict:
+        return {title: [tuple(pair) for pair in json.loads(encoded)]
+                for title, encoded in self.conn.execute("SELECT title, related FROM related")}
+
+    def save_related(self, related: dict) -> None:
+        self.conn.execute("BEGIN")
+        self.conn.executemany("INSERT OR REPLACE INTO related VALUES (?, ?)",
+                              ((title, json.dumps(pairs)) for title, pairs in related.items()))
+        self.conn.execute("COMMIT")
+
+def tfidf_matrix(features: list):
+    # Rows are L2-normalised, so X[i] . X[j] is the cosine similarity of titles i and j
+    import numpy as np
+    from scipy import sparse
+    document_frequency = Counter(term for counts in features for term in counts)
+    max_df = max(2, RELATED_MAX_DF * len(features))
+    vocabulary = {term: i for i, term in enumerate(t for t, df in document_frequency.items() if 1 < df <= max_df)}
+    idf = {term: math.log(len(features) / document_frequency[term]) + 1 for term in vocabulary}
+    indptr, indices, data = [0], [], []
+    for counts in features:
+        for term, count in counts.items():
+            if term in vocabulary:
+                indices.append(vocabulary[term])
+                data.append(count * idf[term])
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix((np.array(data, dtype=np.float32), indices, indptr), shape=(len(features), len(vocabulary)))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+def top_k(matrix, rows: list) -> dict:
+    # {row: [(column, similarity)]} for the given rows, RELATED_BLOCK_ROWS at a time
+    import numpy as np
+    transposed = matrix.T.tocsc()
+    neighbours = {}
+    for start in range(0, len(rows), RELATED_BLOCK_ROWS):
+        block = rows[start:start + RELATED_BLOCK_ROWS]
+        products = (matrix[block] @ transposed).tocsr()
+        for offset, row in enumerate(block):
+            begin, end = products.indptr[offset], products.indptr[offset + 1]
+            columns, scores = products.indices[begin:end], products.data[begin:end]
+            keep = (columns != row) & (scores >= RELATED_MIN_SIMILARITY)
+            columns, scores = columns[keep], scores[keep]
+            if len(scores) > RELATED_TOP_K:
+                best = np.argpartition(-scores, RELATED_TOP_K)[:RELATED_TOP_K]
+                columns, scores = columns[best], scores[best]
+            order = np.argsort(-scores)
+            neighbours[row] = [(int(columns[i]), round(float(scores[i]), 4)) for i in order]
+    return neighbours
+
+def update(rows: dict, rebuild: bool = False, store: RelatedStore = None) -> dict:
+    # Returns {title: [(related title, similarity)]} for every title whose list changed
+    store = store or RelatedStore(RELATED_ROLES_DB)
+    changed = set(store.upsert_features(rows))
+    titles, features = store.features()
+    if not titles:
+        return {}
+    related = {} if rebuild else store.related()
+    full = rebuild or not related
+    query = titles if full else [title for title in titles if title in changed or title not in related]
+    if not query:
+        return {}
+    position = {title: i for i, title in enumerate(titles)}
+    queried = set(query)
+    neighbours = top_k(tfidf_matrix(features), [position[title] for title in query])
+
+    updated = {}
+    if not full:
+        # A changed title's old similarity scores are stale: drop it from every other list,
+        # and the merge below puts it back wherever it still belongs
+        for other, pairs in related.items():
+            if other not in queried and any(pair[0] in changed for pair in pairs):
+                related[other] = updated[other] = [pair for pair in pairs if pair[0] not in changed]
+    for row, pairs in neighbours.items():
+        title = titles[row]
+        updated[title] = [(titles[column], score) for column, score in pairs]
+        # Similarity is symmetric: a new title may also belong in its neighbours' lists
+        if not full:
+            for other, score in updated[title]:
+                if other in queried:
+                    continue
+                current = [pair for pair in related.get(other, []) if pair[0] != title]
+                merged = sorted(current + [(title, score)], key=lambda pair: -pair[1])[:RELATED_TOP_K]
+                if merged != related.get(other, []):
+                    updated[other] = merged
+                    related[other] = merged
+    related.update(updated)
+    store.save_related({title: related[title] for title in updated})
+    return {title: related[title] for title in updated}
+
+def related_html(pairs: list, slugs: dict) -> str:
+    items = []
+    for title, _ in pairs:
+        slug = slugs.get(title)
+        if slug:
+            items.append(f'<li><a href="{RELATED_URL_PREFIX}{html.escape(slug)}">{html.escape(title)}</a></li>')
+        else:
+            items.append(f"<li>{html.escape(title)}</li>")
+    return "<ul>" + "".join(items) + "</ul>"
+
+def sync_worksheet(generator, rebuild: bool = False) -> int:
+    # One read of the worksheet, one values.batchUpdate with every changed cell
+    from gspread.utils import rowcol_to_a1, absolute_range_name
+    sheet = generator.connect_to_google_sheets_docs()[0]
+    values = sheet.get_all_values()
+    if not values:
+        return 0
+    header = values[0]
+    first_row = 2
+    if not set(FEATURE_COLUMNS) & set(header):
+        # No header row (as near_duplicates.audit_worksheet allows): the generator's columns
+        # name the cells and the data starts on the first row
+        header = list(getattr(generator, "SHEET_COLUMNS", header))
+        first_row = 1
+    rows = {row[0]: dict(zip(header, row)) for row in values[first_row - 1:] if row and row[0]}
+    row_numbers = {row[0]: number for number, row in enumerate(values[first_row - 1:], start=first_row) if row and row[0]}
+    changed = update(rows, rebuild)
+
+    data = []
+    if first_row == 1 and "related_titles" not in header:
+        # Nowhere to put a header; the related columns go right after the generator's
+        start = len(header) + 1
+        if sheet.col_count < start + 1:
+            sheet.add_cols(start + 1 - sheet.col_count)
+    elif "related_titles" not in header:
+        start = len(header) + 1
+        if sheet.col_count < start + 1:
+            sheet.add_cols(start + 1 - sheet.col_count)
+        data.append({"range": absolute_range_name(sheet.title, rowcol_to_a1(1, start)), "values": [RELATED_COLUMNS]})
+    else:
+        start = header.index("related_titles") + 1
+    slugs = {title: row.get("slug") for title, row in rows.items()}
+    for title, pairs in changed.items():
+        if title not in row_numbers:
+            continue
+        data.append({
+            "range": absolute_range_name(sheet.title, rowcol_to_a1(row_numbers[title], start)),
+            "values": [["\n".join(other for other, _ in pairs), related_html(pairs, slugs)]],
+        })
+    if data:
+        sheet.spreadsheet.values_batch_update({"valueInputOption": "RAW", "data": data})
+    print(f"Related titles updated for {len(changed)} titles")
+    return len(changed)
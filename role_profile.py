@@ -0,0 +1,236 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("profile")
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import List
+from pydantic import BaseModel, Field
+import usage_history
+import model_routing
+
+# Optional shared stage: a compact profile of each role is generated once per title and
+# cached, then handed to every content type (job description, interview questions, resume
+# template, skills guide) as short context. The four generators then agree on skills,
+# tools and team structure instead of each re-deriving them. A generator can list passages
+# of its prompt the profile makes redundant (worked examples, mostly); they are cut from the
+# request whenever the profile is injected, so the profile does not only add tokens. Enable
+# with ROLE_PROFILE=1; `python cli.py profile --report` compares total tokens per title, and
+# prompt and completion tokens per call of each content type, with and without it.
+ROLE_PROFILE = os.getenv("ROLE_PROFILE", "0") == "1"
+ROLE_PROFILE_CACHE = os.getenv("ROLE_PROFILE_CACHE", "role_profiles.db")
+# Bump when the prompt or schema changes so stale profiles are regenerated
+ROLE_PROFILE_VERSION = 1
+
+class TeamContext(BaseModel):
+    reports_to: str = Field(..., description="Role this position reports to")
+    collaborates_with: List[str] = Field(..., description="Teams or roles this position works with")
+    leads: List[str] = Field(..., description="Roles this position leads, empty if none")
+
+class RoleProfile(BaseModel):
+    job_title: str = Field(..., description="The job title")
+    summary: str = Field(..., description="One sentence on what the role does")
+    core_skills: List[str] = Field(..., description="5-8 technical skills")
+    soft_skills: List[str] = Field(..., description="3-5 soft skills")
+    tools: List[str] = Field(..., description="4-8 tools or software")
+    kpis: List[str] = Field(..., description="3 key performance indicators")
+    team: TeamContext
+    qualification: str = Field(..., description="Typical education and years of experience")
+
+def validate_profile(content: dict) -> list:
+    profile = RoleProfile(**content)
+    problems = []
+    if not 5 <= len(profile.core_skills) <= 8:
+        problems.append(f"expected 5-8 core skills, got {len(profile.core_skills)}")
+    if not profile.tools:
+        problems.append("no tools listed")
+    if len(profile.kpis) != 3:
+        problems.append(f"expected 3 KPIs, got {len(profile.kpis)}")
+    return problems
+
+def build_request(job_title: str) -> dict:
+    return dict(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": "Write a compact, factual profile of the job title given by the user. "
+                           "Use short phrases, not sentences, except for the summary. "
+                           "It is shared as background by several documents about the same role, so stay generic to the role and avoid company specifics."
+            },
+            {"role": "user", "content": job_title}
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {
+                "name": "role_profile",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "job_title": {"type": "string"},
+                        "summary": {"type": "string"},
+                        "core_skills": {"type": "array", "items": {"type": "string"}},
+                        "soft_skills": {"type": "array", "items": {"type": "string"}},
+                        "tools": {"type": "array", "items": {"type": "string"}},
+                        "kpis": {"type": "array", "items": {"type": "string"}},
+                        "team": {
+                            "type": "object",
+                            "properties": {
+                                "reports_to": {"type": "string"},
+                                "collaborates_with": {"type": "array", "items": {"type": "string"}},
+                                "leads": {"type": "array", "items": {"type": "string"}}
+                            },
+                            "required": ["reports_to", "collaborates_with", "leads"],
+                            "additionalProperties": False
+                        },
+                        "qualification": {"type": "string"}
+                    },
+                    "required": ["job_title", "summary", "core_skills", "soft_skills", "tools", "kpis", "team", "qualification"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        temperature=0.3,
+        max_tokens=600
+    )
+
+def cache_key(job_title: str) -> str:
+    return " ".join(job_title.lower().split())
+
+class ProfileCache:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS profiles (
+                title_key TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                profile TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        self._lock = threading.Lock()
+
+    def get(self, job_title: str):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT profile FROM profiles WHERE title_key = ? AND version = ?",
+                (cache_key(job_title), ROLE_PROFILE_VERSION)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, job_title: str, profile: dict) -> None:
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO profiles (title_key, version, profile, created_at) VALUES (?, ?, ?, ?)",
+                (cache_key(job_title), ROLE_PROFILE_VERSION, json.dumps(profile), time.time()))
+
+_cache = None
+
+def profile_cache() -> ProfileCache:
+    global _cache
+    if _cache is None:
+        _cache = ProfileCache(ROLE_PROFILE_CACHE)
+    return _cache
+
+def get_profile(job_title: str) -> dict:
+    profile = profile_cache().get(job_title)
+    if profile is None:
+        with usage_history.tagged(title=job_title, role_profile=True):
+            response = model_routing.create_routed("role_profile", build_request(job_title), validate_profile)
+        profile = json.loads(response.choices[0].message.content)
+        profile_cache().put(job_title, profile)
+    return profile
+
+async def aget_profile(job_title: str, client=None) -> dict:
+    profile = profile_cache().get(job_title)
+    if profile is None:
+        with usage_history.tagged(title=job_title, role_profile=True):
+            response = await model_routing.acreate_routed("role_profile", build_request(job_title), validate_profile, client)
+        profile = json.loads(response.choices[0].message.content)
+        profile_cache().put(job_title, profile)
+    return profile
+
+def profile_message(profile: dict) -> dict:
+    # Compact JSON keeps the injected context to roughly 150 prompt tokens
+    return {
+        "role": "system",
+        "content": "Role profile shared by all content about this role. Stay consistent with it "
+                   "(skills, tools, KPIs, team) and do not contradict it:\n"
+                   + json.dumps(profile, separators=(",", ":"), ensure_ascii=False)
+    }
+
+def without_passages(message: dict, redundant) -> dict:
+    # redundant is [(start, end)]: the text from start up to end (or to the end of the
+    # prompt when end is None) is cut from the message's text parts
+    def cut(text: str) -> str:
+        for start, end in redundant:
+            i = text.find(start)
+            if i < 0:
+                continue
+            j = text.find(end, i) if end is not None else len(text)
+            if j >= 0:
+                text = text[:i].rstrip() + ("\n\n" + text[j:] if end is not None else "")
+        return text
+    content = message["content"]
+    if isinstance(content, str):
+        return dict(message, content=cut(content))
+    return dict(message, content=[dict(part, text=cut(part["text"])) if part.get("type") == "text" else part for part in content])
+
+def with_profile(request: dict, job_title: str, redundant=()) -> dict:
+    # Returns the request with the role profile as a second system message, and the passages
+    # in `redundant` cut from its first system message; unchanged when disabled
+    if not ROLE_PROFILE:
+        return request
+    try:
+        profile = get_profile(job_title)
+    except Exception as e:
+        print(f"Role profile for {job_title} unavailable, generating without it:", e)
+        return request
+    system = without_passages(request["messages"][0], redundant) if redundant else request["messages"][0]
+    return dict(request, messages=[system, profile_message(profile)] + request["messages"][1:])
+
+def tokens_per_title() -> dict:
+    # Total tokens per title across every content type (the profile call included), split by
+    # whether the profile was used
+    totals = {True: {}, False: {}}
+    for record in usage_history.iter_history():
+        title = record.get("title")
+        if not title:
+            continue
+        used = bool(record.get("role_profile"))
+        titles = totals[used]
+        titles[title] = titles.get(title, 0) + (record.get("prompt_tokens") or 0) + (record.get("completion_tokens") or 0)
+    return {
+        ("with_profile" if used else "without_profile"): {
+            "titles": len(titles),
+            "mean_tokens_per_title": round(sum(titles.values()) / len(titles)) if titles else None,
+        }
+        for used, titles in totals.items()
+    }
+
+def tokens_per_call() -> dict:
+    # Mean prompt and completion tokens per call of each content type, split by whether the
+    # profile was used: the profile's added context against the prompt passages it replaced
+    calls = {}
+    for record in usage_history.iter_history():
+        if not record.get("title") or record.get("content_type") == "role_profile":
+            continue
+        key = (record.get("content_type"), bool(record.get("role_profile")))
+        totals = calls.setdefault(key, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += record.get("prompt_tokens") or 0
+        totals[2] += record.get("completion_tokens") or 0
+    report = {}
+    for (content_type, used), (count, prompt_tokens, completion_tokens) in sorted(calls.items()):
+        report.setdefault(content_type, {})["with_profile" if used else "without_profile"] = {
+            "calls": count,
+            "mean_prompt_tokens": round(prompt_tokens / count),
+            "mean_completion_tokens": round(completion_tokens / count),
+        }
+    return report
+
+def report() -> dict:
+    return {"per_title": tokens_per_title(), "per_call": tokens_per_call()}
@@ -0,0 +1,181 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("plan")
+
+import os
+import json
+import importlib
+import pricing
+import usage_history
+import model_routing
+import token_planner
+import credential_pool
+from cli import GENERATORS
+
+# Pre-flight estimate for a run: API calls, dollars and wall-clock time per content type.
+# Prompt tokens are counted locally from each generator's request (system prompt, example
+# turns and JSON schema), completion tokens and latency come from the usage history, and
+# the time is bounded by OpenAI and Google rate limits for the chosen execution mode:
+#
+#   serial  one title at a time, as the scripts ran originally
+#   async   OPENAI_CONCURRENCY_MAX calls in flight (concurrency.py)
+#   batch   OpenAI Batch API: half price, results within BATCH_TURNAROUND_HOURS
+#   packed  PACK_SIZE titles per request sharing one system prompt
+#
+#   python cli.py plan job_description interview_questions --input titles.csv --mode all
+
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "5000"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "800000"))
+BATCH_TURNAROUND_HOURS = float(os.getenv("BATCH_TURNAROUND_HOURS", "24"))
+BATCH_DISCOUNT = 0.5
+PACK_SIZE = int(os.getenv("PACK_SIZE", "5"))
+# Used until the usage history has calls for a content type
+DEFAULT_LATENCY = 30.0
+# Validation pass rate assumed for a model with no history. 0 is the pessimistic prior:
+# every model down the cascade is called for every title.
+PLAN_DEFAULT_PASS_RATE = float(os.getenv("PLAN_DEFAULT_PASS_RATE", "0"))
+MODES = ("serial", "async", "batch", "packed")
+
+# Google writes per title: docs.create + docs.batchUpdate, then one Drive permission per share
+DOC_CONTENT_TYPES = {"job_description", "interview_questions"}
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    # tiktoken when installed, otherwise the usual ~4 characters per token
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except ImportError:
+            print("tiktoken is not installed, approximating 4 characters per token")
+            _encoding = False
+    if _encoding is False:
+        return (len(text) + 3) // 4
+    return len(_encoding.encode(text))
+
+def message_text(message: dict) -> str:
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content)
+    return content
+
+def request_tokens(request: dict) -> int:
+    # About 4 tokens of framing per message; the JSON schema is sent as part of the prompt
+    tokens = sum(count_tokens(message_text(message)) + 4 for message in request["messages"])
+    response_format = request.get("response_format")
+    if response_format:
+        tokens += count_tokens(json.dumps(response_format.get("json_schema", response_format)))
+    return tokens
+
+def completion_estimate(content_type: str, request: dict):
+    # (mean completion tokens, source); falls back to the request's cap with no history
+    observed = token_planner.completion_tokens_seen(content_type)
+    if observed:
+        return sum(observed) / len(observed), f"history ({len(observed)} calls)"
+    return request.get(token_planner.limit_key(request)) or 0, "max_tokens cap (no history)"
+
+def latency_estimate(content_type: str) -> float:
+    latencies = usage_history.recent_values(content_type, "latency")
+    return usage_history.percentile(latencies, 50) if latencies else DEFAULT_LATENCY
+
+def calls_per_title(content_type: str) -> dict:
+    # Expected calls per model down the routing cascade: a model is reached when every
+    # cheaper one failed validation (recorded pass rate, or PLAN_DEFAULT_PASS_RATE with no history)
+    cascade = model_routing.ROUTING_POLICY.get(content_type, [model_routing.DEFAULT_MODEL])
+    calls, reach = {}, 1.0
+    for model in cascade:
+        calls[model] = reach
+        rate = model_routing.pass_rate(content_type, model)
+        reach *= 1 - (rate if rate is not None else PLAN_DEFAULT_PASS_RATE)
+    return calls
+
+def not_estimated(content_type: str, generator) -> list:
+    # Calls this run will make that the plan leaves out: they are recorded under other
+    # content-type keys and depend on settings the per-title request does not show
+    import localize
+    import role_profile
+    missing = []
+    if any(getattr(generator, name) for name in dir(generator) if name.endswith("_SECTIONAL")):
+        missing.append("sectional requests (estimated as one whole request per title)")
+    if role_profile.ROLE_PROFILE:
+        missing.append("role profile calls (one per uncached title)")
+    if localize.LOCALES and content_type == "job_description":
+        missing.append(f"translations into {', '.join(localize.LOCALES)}")
+    return missing
+
+def google_minutes(content_type: str, titles: int) -> float:
+    accounts = len(credential_pool.keyfiles_from_env("default"))
+    sheets_writes = titles / int(os.getenv("DOCS_BATCH_SIZE", "50"))
+    minutes = sheets_writes / (int(os.getenv("SHEETS_WRITES_PER_MINUTE", "60")) * accounts)
+    if content_type in DOC_CONTENT_TYPES:
+        shares = 1 + len([email for email in os.getenv("DOCS_SHARE_WITH", "").split(",") if email.strip()])
+        minutes = max(
+            minutes,
+            titles * 2 / (int(os.getenv("DOCS_WRITES_PER_MINUTE", "60")) * accounts),
+            titles * shares / (int(os.getenv("DRIVE_WRITES_PER_MINUTE", "600")) * accounts),
+        )
+    return minutes
+
+def plan(content_type: str, titles: list, mode: str) -> dict:
+    generator = importlib.import_module(GENERATORS[content_type])
+    base_request = generator.build_request("")
+    base_tokens = request_tokens(base_request)
+    title_tokens = sum(count_tokens(title) for title in titles)
+    completion_tokens, completion_source = completion_estimate(content_type, base_request)
+    latency = latency_estimate(content_type)
+    cascade_calls = calls_per_title(content_type)
+
+    n = len(titles)
+    if mode == "packed":
+        requests = -(-n // PACK_SIZE)
+        prompt_tokens = requests * base_tokens + title_tokens
+    else:
+        requests = n
+        prompt_tokens = n * base_tokens + title_tokens
+    total_completion = n * completion_tokens
+
+    cost, calls = 0.0, 0.0
+    for model, share in cascade_calls.items():
+        prices = pricing.estimate_cost(model, prompt_tokens * share, total_completion * share)
+        cost += prices or 0.0
+        calls += requests * share
+    if mode == "batch":
+        cost *= BATCH_DISCOUNT
+
+    # The OpenAI part runs at the slowest of: latency / concurrency, request rate, token rate
+    tokens_per_call = (prompt_tokens + total_completion) / max(requests, 1)
+    rate_minutes = max(calls / OPENAI_RPM, calls * tokens_per_call / OPENAI_TPM)
+    if mode == "serial":
+        openai_minutes = calls * latency / 60
+    elif mode == "batch":
+        openai_minutes = BATCH_TURNAROUND_HOURS * 60
+    else:
+        concurrency = int(os.getenv("OPENAI_CONCURRENCY_MAX", "32"))
+        call_latency = latency * (PACK_SIZE if mode == "packed" else 1)
+        openai_minutes = max(calls * call_latency / concurrency / 60, rate_minutes)
+    sheets_docs_minutes = google_minutes(content_type, n)
+
+    return {
+        "content_type": content_type,
+        "mode": mode,
+        "titles": n,
+        "api_calls": round(calls),
+        "prompt_tokens": round(prompt_tokens * sum(cascade_calls.values())),
+        "completion_tokens": round(total_completion * sum(cascade_calls.values())),
+        "completion_source": completion_source,
+        "cost_usd": round(cost, 2),
+        "openai_minutes": round(openai_minutes, 1),
+        "google_minutes": round(sheets_docs_minutes, 1),
+        # Google writes overlap generation (sheet_sink, batched docs), so the slower side wins
+        "wall_clock_hours": round(max(openai_minutes, sheets_docs_minutes) / 60, 2),
+        "not_estimated": not_estimated(content_type, generator),
+    }
+
+def main(content_types: list, mode: str = "async") -> None:
+    for content_type in content_types:
+        generator = importlib.import_module(GENERATORS[content_type])
+        titles = list(generator.read_input_titles())
+        for each_mode in (MODES if mode == "all" else (mode,)):
+            print(json.dumps(plan(content_type, titles, each_mode)))
@@ -0,0 +1,85 @@
+import os
+import time
+from datetime import datetime, timezone
+
+# Priority tiers and deadlines for the work queue. Each title is enqueued as high, normal
+# or low: the priority cell may name the tier or hold a number such as search volume,
+# which maps to a tier by PRIORITY_HIGH_MIN / PRIORITY_LOW_MAX. Workers claim the highest
+# tier first; a title whose deadline is within DEADLINE_ESCALATION_HOURS is claimed as high
+# whatever its tier, and inside a tier earlier deadlines, then higher scores, go first. A
+# share of the OpenAI concurrency (HIGH_PRIORITY_RESERVE, see concurrency.py) is kept free
+# for high-tier titles while any are waiting or running, so a worker deep in a backfill still
+# has room for urgent ones and a worker without them uses the whole limit.
+#
+#   python cli.py queue eta job_description
+
+TIERS = ("high", "normal", "low")
+TIER_RANK = {tier: rank for rank, tier in enumerate(TIERS)}
+DEFAULT_TIER = "normal"
+PRIORITY_HIGH_MIN = float(os.getenv("PRIORITY_HIGH_MIN", "1000"))
+PRIORITY_LOW_MAX = float(os.getenv("PRIORITY_LOW_MAX", "0"))
+DEADLINE_ESCALATION_HOURS = float(os.getenv("DEADLINE_ESCALATION_HOURS", "24"))
+# Completed titles in this window set the throughput the ETAs are based on
+THROUGHPUT_WINDOW_SECONDS = int(os.getenv("THROUGHPUT_WINDOW_SECONDS", "3600"))
+
+def parse_priority(value):
+    # (tier, score) from a priority cell: "high"/"normal"/"low", a number, or blank
+    if value is None or str(value).strip() == "":
+        return DEFAULT_TIER, 0.0
+    text = str(value).strip().lower()
+    if text in TIER_RANK:
+        return text, 0.0
+    try:
+        score = float(text.replace(",", ""))
+    except ValueError:
+        print(f"Unrecognised priority {value!r}, using {DEFAULT_TIER}")
+        return DEFAULT_TIER, 0.0
+    if score >= PRIORITY_HIGH_MIN:
+        return "high", score
+    if score <= PRIORITY_LOW_MAX:
+        return "low", score
+    return "normal", score
+
+def parse_deadline(value):
+    # Epoch seconds from an ISO date or datetime (UTC unless it carries an offset), or None
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        deadline = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        print(f"Unrecognised deadline {value!r}, ignoring it")
+        return None
+    if deadline.tzinfo is None:
+        deadline = deadline.replace(tzinfo=timezone.utc)
+    return deadline.timestamp()
+
+def schedule_item(item) -> dict:
+    # item is a plain title or the (title, priority, deadline) a generator yields with schedule=True
+    if isinstance(item, str):
+        return {"title": item, "tier": DEFAULT_TIER, "score": 0.0, "deadline": None}
+    title, priority, deadline = item
+    tier, score = parse_priority(priority)
+    return {"title": title, "tier": tier, "score": score, "deadline": parse_deadline(deadline)}
+
+def effective_tier(tier: str, deadline, now: float = None) -> str:
+    now = now or time.time()
+    if deadline is not None and deadline < now + DEADLINE_ESCALATION_HOURS * 3600:
+        return "high"
+    return tier
+
+def eta_report(backlog: list, done_recently: int, now: float = None) -> list:
+    # backlog is [(effective tier, deadline)] in claim order for everything queued or leased;
+    # done_recently is how many titles finished in the last THROUGHPUT_WINDOW_SECONDS.
+    # Tiers are served strictly in order, so a tier is done once everything ahead of it is.
+    now = now or time.time()
+    per_hour = done_recently * 3600 / THROUGHPUT_WINDOW_SECONDS
+    report = {tier: {"tier": tier, "remaining": 0, "eta_hours": None, "deadlines_at_risk": 0} for tier in TIERS}
+    for position, (tier, deadline) in enumerate(backlog, start=1):
+        row = report[tier]
+        row["remaining"] += 1
+        if per_hour:
+            finish = now + position / per_hour * 3600
+            row["eta_hours"] = round((finish - now) / 3600, 2)
+            if deadline is not None and finish > deadline:
+                row["deadlines_at_risk"] += 1
+    return [dict(row, titles_per_hour=round(per_hour, 1)) for row in report.values()]
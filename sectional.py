@@ -0,0 +1,64 @@
+import os
+import copy
+import json
+import asyncio
+import openai_calls
+import model_routing
+
+# Sectional generation splits one large structured completion into concurrent
+# sub-requests, each asking for a subset of the top-level keys of the same schema.
+# Wall-clock time falls to roughly the slowest section, and a section that fails
+# validation is regenerated on its own.
+SECTION_MAX_ATTEMPTS = int(os.getenv("SECTION_MAX_ATTEMPTS", "3"))
+
+def section_request(request: dict, name: str, keys: list, max_tokens: int = None) -> dict:
+    # Narrows a generator's full request to the given top-level schema keys
+    section = copy.deepcopy(request)
+    json_schema = section["response_format"]["json_schema"]
+    schema = json_schema["schema"]
+    schema["properties"] = {key: schema["properties"][key] for key in keys}
+    schema["required"] = list(keys)
+    json_schema["name"] = f"{json_schema['name']}_{name}"[:64]
+
+    instruction = (
+        f"Only produce the following part of the template: {', '.join(keys)}. "
+        "The other parts are generated separately, so do not repeat them."
+    )
+    section["messages"] = [section["messages"][0], {"role": "system", "content": instruction}] + section["messages"][1:]
+
+    if max_tokens is not None:
+        limit_key = "max_completion_tokens" if "max_completion_tokens" in section else "max_tokens"
+        section[limit_key] = max_tokens
+    return section
+
+async def agenerate_section(content_type: str, name: str, request: dict, validate, client):
+    section_type = f"{content_type}:{name}"
+    problems = []
+    for attempt in range(1, SECTION_MAX_ATTEMPTS + 1):
+        response = await model_routing.acreate_routed(section_type, request, validate, client)
+        problems = openai_calls.check_content(response, validate)
+        if not problems:
+            return json.loads(response.choices[0].message.content), response.usage
+        print(f"Section {section_type} failed validation (attempt {attempt}):", "; ".join(problems))
+    raise ValueError(f"Section {section_type} failed validation: " + "; ".join(problems))
+
+async def agenerate_sections(content_type: str, sections: dict, client=None):
+    # sections maps a section name to (request, validate). Returns the merged content with
+    # summed prompt and completion tokens, in the same shape as process_response.
+    client = client or openai_calls.connect_to_async_openai()
+    names = list(sections)
+    results = await asyncio.gather(*[
+        agenerate_section(content_type, name, sections[name][0], sections[name][1], client) for name in names
+    ])
+    content, prompt_tokens, completion_tokens = {}, 0, 0
+    for section_content, usage in results:
+        content.update(section_content)
+        prompt_tokens += usage.prompt_tokens if usage else 0
+        completion_tokens += usage.completion_tokens if usage else 0
+    return content, prompt_tokens, completion_tokens
+
+def generate_sections(content_type: str, sections: dict):
+    async def run():
+        async with openai_calls.connect_to_async_openai() as client:
+            return await agenerate_sections(content_type, sections, client)
+    return asyncio.run(run())
@@ -0,0 +1,280 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("shards")
+
+import os
+import json
+import sqlite3
+import threading
+import credential_pool
+
+# Sharding for SheetSink output. Google Sheets caps a spreadsheet at 10 million cells counted
+# over every tab's grid, and a tab with tens of thousands of wide rows (interview questions
+# has 62 columns of long text) gets slow to append to and read. With SHEET_SHARDING on, each
+# sink writes to shards: its usual worksheet first, then "<worksheet> (2)", "(3)", ... added
+# once a shard would pass SHEET_SHARD_MAX_CELLS. When the spreadsheet itself would pass
+# SHEET_SPREADSHEET_MAX_CELLS the next shard goes into a new spreadsheet (in
+# SHEET_SHARD_FOLDER_ID, shared with every pooled account and SHEET_SHARD_SHARE_WITH). Where
+# each title lives is kept in SHEET_MANIFEST_DB, so upserts and lookups read no sheet at all;
+# the manifest is built from the existing worksheet the first time a sink is sharded. Workers
+# writing the same sheet from several machines need to share the manifest, so sharding is
+# opt-in.
+#
+#   python cli.py shards interview_questions
+#   python cli.py shards interview_questions "Data Analyst" "Nurse"
+
+SHEET_SHARDING = os.getenv("SHEET_SHARDING", "0").lower() in ("1", "true", "yes")
+SHEET_MANIFEST_DB = os.getenv("SHEET_MANIFEST_DB", "sheet_manifest.db")
+SHEET_SHARD_MAX_CELLS = int(os.getenv("SHEET_SHARD_MAX_CELLS", "2000000"))
+SHEET_SPREADSHEET_MAX_CELLS = int(os.getenv("SHEET_SPREADSHEET_MAX_CELLS", "9000000"))
+SHEET_SHARD_FOLDER_ID = os.getenv("SHEET_SHARD_FOLDER_ID") or None
+SHEET_SHARD_SHARE_WITH = [email.strip() for email in os.getenv("SHEET_SHARD_SHARE_WITH", "").split(",") if email.strip()]
+
+class ShardManifest:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # rows is the last row in use, header included; columns is the grid width
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS shards (
+                sink TEXT, shard INTEGER, spreadsheet_id TEXT, worksheet TEXT, columns INTEGER, rows INTEGER,
+                PRIMARY KEY (sink, shard)
+            )""")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS locations (
+                sink TEXT, title TEXT, shard INTEGER, row INTEGER,
+                PRIMARY KEY (sink, title)
+            )""")
+        self._lock = threading.Lock()
+
+    def shards(self, sink: str) -> list:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT shard, spreadsheet_id, worksheet, columns, rows FROM shards WHERE sink = ? ORDER BY shard",
+                (sink,)).fetchall()
+        return [dict(zip(("shard", "spreadsheet_id", "worksheet", "columns", "rows"), row)) for row in rows]
+
+    def add_shard(self, sink: str, spreadsheet_id: str, worksheet: str, columns: int, rows: int) -> dict:
+        with self._lock:
+            self.conn.execute("BEGIN")
+            number = self.conn.execute("SELECT COALESCE(MAX(shard), 0) + 1 FROM shards WHERE sink = ?", (sink,)).fetchone()[0]
+            self.conn.execute("INSERT INTO shards VALUES (?, ?, ?, ?, ?, ?)", (sink, number, spreadsheet_id, worksheet, columns, rows))
+            self.conn.execute("COMMIT")
+        return {"shard": number, "spreadsheet_id": spreadsheet_id, "worksheet": worksheet, "columns": columns, "rows": rows}
+
+    def place(self, sink: str, shard: int, positions: dict) -> None:
+        # positions maps title -> row number within the shard
+        if not positions:
+            return
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO locations VALUES (?, ?, ?, ?)",
+                ((sink, title, shard, row) for title, row in positions.items()))
+            self.conn.execute(
+                "UPDATE shards SET rows = MAX(rows, ?) WHERE sink = ? AND shard = ?",
+                (max(positions.values()), sink, shard))
+            self.conn.execute("COMMIT")
+
+    def locations(self, sink: str) -> dict:
+        with self._lock:
+            rows = self.conn.execute("SELECT title, shard, row FROM locations WHERE sink = ?", (sink,)).fetchall()
+        return {title: (shard, row) for title, shard, row in rows}
+
+    def positions(self, sink: str, titles: list) -> dict:
+        # {title: (shard, row)} for those of titles that are placed
+        with self._lock:
+            return {
+                title: (shard, row) for title, shard, row in self.conn.execute(
+                    "SELECT title, shard, row FROM locations WHERE sink = ? AND title IN (SELECT value FROM json_each(?))",
+                    (sink, json.dumps(titles)))
+            }
+
+    def locate(self, sink: str, title: str) -> dict:
+        # Where one title lives, or None
+        with self._lock:
+            found = self.conn.execute("""
+                SELECT s.spreadsheet_id, s.worksheet, l.row FROM locations l
+                JOIN shards s ON s.sink = l.sink AND s.shard = l.shard
+                WHERE l.sink = ? AND l.title = ?""", (sink, title)).fetchone()
+        return dict(zip(("spreadsheet_id", "worksheet", "row"), found)) if found else None
+
+_manifest = None
+
+def shard_manifest() -> ShardManifest:
+    global _manifest
+    if _manifest is None:
+        _manifest = ShardManifest(SHEET_MANIFEST_DB)
+    return _manifest
+
+def grid_cells(spreadsheet: "gspread.Spreadsheet") -> int:
+    # Cells counted against the spreadsheet limit: every tab's full grid, used or not
+    return sum(
+        sheet["properties"]["gridProperties"]["rowCount"] * sheet["properties"]["gridProperties"]["columnCount"]
+        for sheet in spreadsheet.fetch_sheet_metadata()["sheets"])
+
+class ShardedSheet:
+    def __init__(self, sink: str, pool, worksheet, key_column: int = 1, manifest: ShardManifest = None):
+        # worksheet(account) returns the sink's usual worksheet, which becomes shard 1
+        self.sink = sink
+        self.pool = pool
+        self.base_worksheet = worksheet
+        self.key_column = key_column
+        self.manifest = manifest or shard_manifest()
+        self.shards = None
+        self.index = None
+        # (account, shard) -> gspread Worksheet, so a shard is opened once per account
+        self._worksheets = {}
+
+    def worksheet(self, account, shard: dict) -> "gspread.Worksheet":
+        if shard["shard"] == 1:
+            return self.base_worksheet(account)
+        key = (id(account), shard["shard"])
+        if key not in self._worksheets:
+            import gspread
+            base = self.base_worksheet(account).spreadsheet
+            if shard["spreadsheet_id"] == base.id:
+                spreadsheet = base
+            else:
+                spreadsheet = gspread.Spreadsheet(base.client, {"id": shard["spreadsheet_id"]})
+            self._worksheets[key] = spreadsheet.worksheet(shard["worksheet"])
+        return self._worksheets[key]
+
+    def load(self) -> None:
+        self.shards = self.manifest.shards(self.sink)
+        if not self.shards:
+            # First sharded run: the existing worksheet becomes shard 1 and its title column
+            # is read once to seed the manifest
+            def read(account):
+                sheet = self.base_worksheet(account)
+                return sheet.spreadsheet.id, sheet.title, sheet.col_count, sheet.col_values(self.key_column)
+            spreadsheet_id, title, columns, titles = self.pool.call(read)
+            shard = self.manifest.add_shard(self.sink, spreadsheet_id, title, columns, max(len(titles), 1))
+            positions = {}
+            for row_number, key in enumerate(titles[1:], start=2):
+                if key and key not in positions:
+                    positions[key] = row_number
+            self.manifest.place(self.sink, shard["shard"], positions)
+            self.shards = self.manifest.shards(self.sink)
+            print(f"Sheet manifest seeded for {self.sink}: {len(positions)} titles")
+        self.index = self.manifest.locations(self.sink)
+        print(f"Sheet manifest loaded for {self.sink}: {len(self.index)} titles in {len(self.shards)} shards")
+
+    def share_with(self) -> list:
+        # Every pooled account has to reach a new spreadsheet, whichever worker or account
+        # created it
+        emails = list(SHEET_SHARD_SHARE_WITH)
+        for keyfile in self.pool.keyfiles:
+            email = credential_pool.service_account_email(keyfile)
+            if email and email not in emails:
+                emails.append(email)
+        return emails
+
+    def roll_over(self, full: dict) -> dict:
+        number = full["shard"] + 1
+
+        def create(account):
+            import gspread
+            from gspread.urls import DRIVE_FILES_API_V3_URL
+            base = self.base_worksheet(account)
+            header = base.row_values(1)
+            columns = max(full["columns"], len(header))
+            title = f"{base.title} ({number})"
+            spreadsheet = self.worksheet(account, full).spreadsheet
+            if grid_cells(spreadsheet) + SHEET_SHARD_MAX_CELLS > SHEET_SPREADSHEET_MAX_CELLS:
+                body = {"name": f"{base.spreadsheet.title} ({number})", "mimeType": "application/vnd.google-apps.spreadsheet"}
+                if SHEET_SHARD_FOLDER_ID:
+                    body["parents"] = [SHEET_SHARD_FOLDER_ID]
+                created = base.client.request("post", DRIVE_FILES_API_V3_URL, json=body, params={"supportsAllDrives": True}).json()
+                spreadsheet = gspread.Spreadsheet(base.client, {"id": created["id"]})
+                for email in self.share_with():
+                    spreadsheet.share(email, perm_type="user", role="writer", notify=False)
+                worksheet = spreadsheet.sheet1
+                worksheet.update_title(title)
+                worksheet.resize(rows=1, cols=columns)
+                print(f"Sheet shard {number} for {self.sink} in new spreadsheet {spreadsheet.id}")
+            else:
+                worksheet = spreadsheet.add_worksheet(title, rows=1, cols=columns)
+                print(f"Sheet shard {number} for {self.sink}: {title}")
+            worksheet.append_row(header, value_input_option="RAW")
+            return spreadsheet.id, title, columns
+        spreadsheet_id, title, columns = self.pool.call(create)
+        shard = self.manifest.add_shard(self.sink, spreadsheet_id, title, columns, 1)
+        self.shards.append(shard)
+        return shard
+
+    def load_new_rows(self, titles: list) -> None:
+        # Titles placed by other workers since the manifest was loaded, then the rows below the
+        # last placed one in the last shard (an append whose response was lost before a retry)
+        from gspread.utils import rowcol_to_a1
+        self.index.update(self.manifest.positions(self.sink, titles))
+        self.shards = self.manifest.shards(self.sink)
+        if all(title in self.index for title in titles):
+            return
+        shard = self.shards[-1]
+        column = rowcol_to_a1(1, self.key_column)[:-1]
+        start = shard["rows"] + 1
+        values = self.pool.call(lambda account: self.worksheet(account, shard).get(f"{column}{start}:{column}"))
+        positions = {}
+        for row_number, cells in enumerate(values, start=start):
+            if cells and cells[0] and cells[0] not in self.index and cells[0] not in positions:
+                positions[cells[0]] = row_number
+        self.manifest.place(self.sink, shard["shard"], positions)
+        self.index.update((title, (shard["shard"], row_number)) for title, row_number in positions.items())
+        shard["rows"] = max(shard["rows"], start + len(values) - 1)
+
+    def write(self, rows: dict) -> None:
+        # rows maps title -> row values; updates go out as one values.batchUpdate per
+        # spreadsheet, appends fill the last shard and roll over to new ones as needed
+        from gspread.utils import absolute_range_name
+        from sheet_sink import first_row
+        if self.index is None:
+            self.load()
+        elif any(title not in self.index for title in rows):
+            self.load_new_rows([title for title in rows if title not in self.index])
+        by_number = {shard["shard"]: shard for shard in self.shards}
+        updates = {title: row for title, row in rows.items() if title in self.index}
+        appends = [(title, row) for title, row in rows.items() if title not in self.index]
+
+        by_spreadsheet = {}
+        for title, row in updates.items():
+            shard, row_number = self.index[title]
+            by_spreadsheet.setdefault(by_number[shard]["spreadsheet_id"], []).append((by_number[shard], row_number, row))
+        for entries in by_spreadsheet.values():
+            def update(account, entries=entries):
+                sheet = self.worksheet(account, entries[0][0])
+                sheet.spreadsheet.values_batch_update({
+                    "valueInputOption": "RAW",
+                    "data": [
+                        {"range": absolute_range_name(shard["worksheet"], f"A{row_number}"), "values": [row]}
+                        for shard, row_number, row in entries
+                    ]
+                })
+            self.pool.call(update)
+
+        appended = 0
+        while appended < len(appends):
+            shard = self.shards[-1]
+            capacity = SHEET_SHARD_MAX_CELLS // max(shard["columns"], len(appends[appended][1])) - shard["rows"]
+            if capacity <= 0:
+                self.roll_over(shard)
+                continue
+            chunk = appends[appended:appended + capacity]
+            response = self.pool.call(
+                lambda account: self.worksheet(account, shard).append_rows([row for title, row in chunk], value_input_option="RAW"))
+            start = first_row(response["updates"]["updatedRange"])
+            positions = {title: start + offset for offset, (title, row) in enumerate(chunk)}
+            self.manifest.place(self.sink, shard["shard"], positions)
+            self.index.update((title, (shard["shard"], row_number)) for title, row_number in positions.items())
+            shard["rows"] = max(shard["rows"], start + len(chunk) - 1)
+            appended += len(chunk)
+        print(f"Sheet flush: {len(updates)} rows updated, {len(appends)} rows appended across {len(self.shards)} shards")
+
+def main(sink: str, titles: list) -> None:
+    manifest = shard_manifest()
+    if titles:
+        for title in titles:
+            print(json.dumps({"title": title, "location": manifest.locate(sink, title)}))
+        return
+    for shard in manifest.shards(sink):
+        print(json.dumps(dict(shard, cells=shard["rows"] * shard["columns"], max_cells=SHEET_SHARD_MAX_CELLS)))
@@ -0,0 +1,227 @@
+import os
+import re
+import time
+import queue
+import threading
+import outbox
+import sheet_shards
+
+# Sheet writes run on a background thread so generation never waits on Sheets. Rows are
+# upserted by their title column: a title already on the sheet is overwritten in place
+# (all changed rows in one values.batchUpdate per flush) and new titles are appended in
+# bulk, so regenerating a title no longer leaves a duplicate row behind. The title -> row
+# index is loaded once from a single column read and kept current as rows are appended.
+# Before each append the rows below the last known one are read back, so titles appended
+# by another worker, or by an earlier attempt whose response was lost, are updated instead
+# of appended twice. Two workers appending the same new title at the same moment can still
+# both append it.
+# With an outbox, rows are recorded before they are queued and removed once written; while
+# the sheets circuit breaker is open they stay there and are replayed by the writer thread
+# once Sheets answers again; rows left from an earlier run are replayed when the sink opens.
+# With SHEET_SHARDING on, rows are spread over worksheets and spreadsheets by cell count and
+# located through a manifest instead (sheet_shards.py).
+
+SHEET_SINK_MAX_PENDING = int(os.getenv("SHEET_SINK_MAX_PENDING", "20"))
+SHEET_SINK_MAX_RETRIES = int(os.getenv("SHEET_SINK_MAX_RETRIES", "5"))
+
+_CLOSE = object()
+
+def first_row(updated_range: str) -> int:
+    # "'Sheet1'!A10:AA12" -> 10
+    return int(re.search(r"![A-Z]+(\d+)", updated_range).group(1))
+
+class SheetSink:
+    def __init__(self, pool, worksheet=lambda account: account.connect()[0], key_column: int = 1,
+                 content_type: str = None, box: "outbox.Outbox" = None):
+        # worksheet(account) returns the gspread Worksheet for a pooled account;
+        # key_column is the 1-based column holding the title. Rows go through the outbox
+        # when content_type is given (box defaults to outbox.default_outbox()).
+        self.pool = pool
+        self.worksheet = worksheet
+        self.key_column = key_column
+        self.content_type = content_type
+        self.box = (box or outbox.default_outbox()) if content_type else None
+        # Sharding is keyed on the content type, which names the sink in the manifest
+        self.shards = sheet_shards.ShardedSheet(content_type, pool, worksheet, key_column) if content_type and sheet_shards.SHEET_SHARDING else None
+        self.index = None
+        # Last sheet row the index has seen
+        self.last_row = 1
+        self.failed = {}
+        # Set while rows deferred by the open sheets breaker are waiting in the outbox
+        self.deferred = False
+        # Bounded so a slow sheet pushes back on generation instead of buffering without limit
+        self._queue = queue.Queue(maxsize=SHEET_SINK_MAX_PENDING)
+        self._thread = threading.Thread(target=self._run, name="sheet-sink", daemon=True)
+        self._thread.start()
+        if self.box is not None:
+            self.replay()
+
+    def key(self, row: list) -> str:
+        return str(row[self.key_column - 1])
+
+    def submit(self, rows: list) -> None:
+        if not rows:
+            return
+        seqs = {}
+        if self.box is not None:
+            seqs = self.box.record(self.content_type, "sheets", {self.key(row): row for row in rows})
+        self._queue.put((rows, seqs))
+
+    def replay(self) -> int:
+        # Queues rows the outbox still holds, e.g. from a run that ended while Sheets was down
+        entries = self.box.pending(self.content_type, "sheets", limit=-1)
+        for start in range(0, len(entries), outbox.OUTBOX_DRAIN_BATCH):
+            chunk = entries[start:start + outbox.OUTBOX_DRAIN_BATCH]
+            self._queue.put(([payload for key, seq, payload in chunk], {key: seq for key, seq, payload in chunk}))
+        if entries:
+            print(f"Replaying {len(entries)} sheet rows from the outbox")
+        return len(entries)
+
+    def flush(self) -> None:
+        # Blocks until everything submitted so far has been written (or given up on)
+        self._queue.join()
+
+    def take_failed(self) -> dict:
+        # Waits for everything submitted so far, then returns and forgets {title: error} for
+        # rows given up on. Rows deferred by the open breaker are not failures: the outbox
+        # holds them until they are written.
+        self.flush()
+        failed, self.failed = self.failed, {}
+        return failed
+
+    def close(self) -> dict:
+        # Writes what is left and stops the thread; returns {title: error} for rows never written
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        return self.failed
+
+    def load_index(self) -> dict:
+        titles = self.pool.call(lambda account: self.worksheet(account).col_values(self.key_column))
+        index = {}
+        # Row 1 is the header; on a sheet that already has duplicates the first row wins
+        for row_number, title in enumerate(titles[1:], start=2):
+            if title and title not in index:
+                index[title] = row_number
+        self.last_row = max(len(titles), 1)
+        print(f"Sheet index loaded: {len(index)} titles")
+        return index
+
+    def load_new_rows(self) -> None:
+        # Adds the titles below the last row the index has seen
+        from gspread.utils import rowcol_to_a1
+        column = rowcol_to_a1(1, self.key_column)[:-1]
+        start = self.last_row + 1
+        values = self.pool.call(lambda account: self.worksheet(account).get(f"{column}{start}:{column}"))
+        for row_number, cells in enumerate(values, start=start):
+            if cells and cells[0] and cells[0] not in self.index:
+                self.index[cells[0]] = row_number
+        self.last_row += len(values)
+
+    def write(self, rows: dict) -> None:
+        # rows maps title -> row values; the last submitted row for a title wins
+        if self.shards is not None:
+            self.shards.write(rows)
+            return
+        if self.index is None:
+            self.index = self.load_index()
+        elif any(title not in self.index for title in rows):
+            self.load_new_rows()
+        updates = {title: row for title, row in rows.items() if title in self.index}
+        appends = {title: row for title, row in rows.items() if title not in self.index}
+
+        if updates:
+            from gspread.utils import absolute_range_name
+
+            def update(account):
+                sheet = self.worksheet(account)
+                sheet.spreadsheet.values_batch_update({
+                    "valueInputOption": "RAW",
+                    "data": [
+                        {"range": absolute_range_name(sheet.title, f"A{self.index[title]}"), "values": [row]}
+                        for title, row in updates.items()
+                    ]
+                })
+            self.pool.call(update)
+
+        if appends:
+            response = self.pool.call(lambda account: self.worksheet(account).append_rows(list(appends.values()), value_input_option="RAW"))
+            start = first_row(response["updates"]["updatedRange"])
+            for offset, title in enumerate(appends):
+                self.index[title] = start + offset
+            self.last_row = max(self.last_row, start + len(appends) - 1)
+        print(f"Sheet flush: {len(updates)} rows updated, {len(appends)} rows appended")
+
+    def write_with_retries(self, rows: dict, seqs: dict) -> None:
+        for attempt in range(SHEET_SINK_MAX_RETRIES + 1):
+            if self.box is not None and not outbox.sheets_breaker.allow():
+                # Left in the outbox; the next run (or `cli.py outbox drain`) replays them
+                print(f"Sheets circuit open, {len(rows)} rows deferred to the outbox")
+                self.deferred = True
+                return
+            try:
+                self.write(rows)
+            except Exception as e:
+                print(f"Sheet flush of {len(rows)} rows failed (attempt {attempt + 1}):", e)
+                if outbox.is_service_failure(e):
+                    outbox.sheets_breaker.record_failure()
+                else:
+                    # Sheets answered; the request itself was bad
+                    outbox.sheets_breaker.record_success()
+                if attempt == SHEET_SINK_MAX_RETRIES:
+                    # Kept in the outbox for a later replay, and reported to the caller either way
+                    if self.box is not None:
+                        self.box.failed(self.content_type, "sheets", {title: e for title in rows})
+                    self.failed.update({title: e for title in rows})
+                    return
+                time.sleep(2 ** attempt)
+                continue
+            outbox.sheets_breaker.record_success()
+            if self.box is not None:
+                self.box.done(self.content_type, "sheets", seqs)
+            for title in rows:
+                self.failed.pop(title, None)
+            return
+
+    def replay_deferred(self) -> None:
+        # Writes what the outbox holds for this sink from the writer thread, so a long-running
+        # process catches up after a Sheets outage without reopening the sink
+        self.deferred = False
+        entries = self.box.pending(self.content_type, "sheets", limit=-1)
+        if entries:
+            print(f"Sheets available again, replaying {len(entries)} deferred rows")
+        for start in range(0, len(entries), outbox.OUTBOX_DRAIN_BATCH):
+            chunk = entries[start:start + outbox.OUTBOX_DRAIN_BATCH]
+            self.write_with_retries({self.key(payload): payload for key, seq, payload in chunk},
+                                    {key: seq for key, seq, payload in chunk})
+            if self.deferred:
+                return
+
+    def _run(self) -> None:
+        while True:
+            # Everything queued while the previous flush ran goes out as one flush. With rows
+            # deferred, an idle writer wakes up to retry them once the breaker may let a trial through
+            try:
+                first = self._queue.get(timeout=outbox.BREAKER_RESET_SECONDS if self.deferred else None)
+            except queue.Empty:
+                self.replay_deferred()
+                continue
+            batches = [first]
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows, seqs = {}, {}
+            for batch in batches:
+                if batch is not _CLOSE:
+                    batch_rows, batch_seqs = batch
+                    rows.update((self.key(row), row) for row in batch_rows)
+                    seqs.update(batch_seqs)
+            if rows:
+                self.write_with_retries(rows, seqs)
+            if self.deferred and outbox.sheets_breaker.state() == "closed":
+                self.replay_deferred()
+            for _ in batches:
+                self._queue.task_done()
+            if any(batch is _CLOSE for batch in batches):
+                return
@@ -1,14 +1,21 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("skills_guide")
+
 # import libraries
-import openai
 import os
 import json
+import traceback
 import time
-from dotenv import load_dotenv
-import pandas as pd
-from oauth2client.service_account import ServiceAccountCredentials
-import gspread
+from pydantic import BaseModel
+from typing import List
 
-load_dotenv()
+import model_routing
+import role_profile
+import usage_history
+import title_stream
+import credential_pool
+import concurrency
 
 response_format = {
         "type": "json_schema",
@@ -120,12 +127,61 @@ response_format = {
         }
     }
 
-# connect to openai
-def connect_to_openai():
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    return openai
+class Introduction(BaseModel):
+    overview: str
+    impact_on_success: str
+    adaptation_importance: str
+
+class SkillLevel(BaseModel):
+    skills: List[str]
+    examples_with_action_steps: List[str]
+
+class SkillProgression(BaseModel):
+    beginner: SkillLevel
+    intermediate: SkillLevel
+    advanced: SkillLevel
+
+class TopSkills(BaseModel):
+    technical_skills: List[str]
+    soft_skills: List[str]
+    industry_trends: List[str]
+    future_requirements: List[str]
+
+class Influencer(BaseModel):
+    name: str
+    expertise: str
+    why_follow: str
+
+class LearningResource(BaseModel):
+    course_link: str
+    why_recommended: str
 
-def connect_to_google_sheets_docs() -> gspread.Worksheet:
+class SkillsGuide(BaseModel):
+    introduction: Introduction
+    skill_progression: SkillProgression
+    top_skills_2025: TopSkills
+    top_influencers: List[Influencer]
+    learning_resources: List[LearningResource]
+
+def validate_content(content: dict) -> list:
+    # process_skill_progression pairs skills with examples by index, so the lists must line up
+    skills_guide = SkillsGuide(**content)
+    problems = []
+    for level in ("beginner", "intermediate", "advanced"):
+        skill_level = getattr(skills_guide.skill_progression, level)
+        if len(skill_level.skills) != 4 or len(skill_level.examples_with_action_steps) != 4:
+            problems.append(f"{level}: expected 4 skills and 4 examples, got {len(skill_level.skills)} and {len(skill_level.examples_with_action_steps)}")
+    if not 1 <= len(skills_guide.top_influencers) <= 5:
+        problems.append(f"expected 1-5 influencers, got {len(skills_guide.top_influencers)}")
+    if not 1 <= len(skills_guide.learning_resources) <= 2:
+        problems.append(f"expected 1-2 learning resources, got {len(skills_guide.learning_resources)}")
+    return problems
+
+DEFAULT_CREDENTIALS_FILE = r"/home/abdrafay/AllWork/Qureos/AllWork/Modules/qureos-a1006.json"
+
+def connect_to_google_sheets_docs(keyfile: str = None) -> "gspread.Worksheet":
+    from oauth2client.service_account import ServiceAccountCredentials
+    import gspread
     # Define the scope to include both Google Sheets and Google Docs
     scope = [
         "https://www.googleapis.com/auth/spreadsheets"
@@ -133,7 +189,7 @@ def connect_to_google_sheets_docs() -> gspread.Worksheet:
     
     # Load the credentials from the JSON key file
     credentials = ServiceAccountCredentials.from_json_keyfile_name(
-        r"/home/abdrafay/AllWork/Qureos/AllWork/Modules/qureos-a1006.json", 
+        keyfile or os.getenv("GOOGLE_CREDENTIALS_FILE", DEFAULT_CREDENTIALS_FILE), 
         scope
     )
     
@@ -146,8 +202,8 @@ def connect_to_google_sheets_docs() -> gspread.Worksheet:
     return sheet
 
 # request to openai for skills generation
-def skills_openai(profession: str) -> tuple:
-    response = connect_to_openai().chat.completions.create(
+def build_request(profession: str) -> dict:
+    return dict(
     model="gpt-4o",
     messages=[
         {
@@ -209,6 +265,9 @@ Return the response in JSON format with snake_case naming convention."""
     presence_penalty=0
     )
 
+def skills_openai(profession: str) -> tuple:
+    response = model_routing.create_routed("skills_guide", role_profile.with_profile(build_request(profession), profession), validate_content)
+
     completion_tokens = response.usage.completion_tokens
     prompt_tokens = response.usage.prompt_tokens
     return response.choices[0].message.content, prompt_tokens, completion_tokens
@@ -252,19 +311,21 @@ def process_skill_progression(data: dict) -> dict:
     del data['skill_progression']
     return data
 
-def convert_to_dataframe(data: dict) -> pd.DataFrame:
+def convert_to_dataframe(data: dict) -> "pd.DataFrame":
+    import pandas as pd
     new_df = pd.DataFrame({k: [str(v)] for k, v in data.items()})
     return new_df
 
-def push_to_google_sheet(sheet: gspread.Worksheet, data: pd.DataFrame) -> None:
+def push_to_google_sheet(sheet: "gspread.Worksheet", data: "pd.DataFrame") -> None:
     sheet.append_rows(data.values.tolist())
 
-jobtitles = ['Software Engineer', 'Data Analyst', 'Product Manager', 'UX Designer', 'Digital Marketer']
-count = 0
-for skill in jobtitles:
-    print("Started: Profession:", skill)
+def generate_row(profession: str) -> "pd.DataFrame":
+    import pandas as pd
+    # Generation stage for one profession: a one-row frame in output.csv's column order
+    print("Started: Profession:", profession)
     start = time.time()
-    response = skills_openai(skill)
+    with usage_history.tagged(title=profession, role_profile=role_profile.ROLE_PROFILE):
+        response = skills_openai(profession)
     content, prompt_tokens, completion_tokens = response
     content = json.loads(content)
     
@@ -288,20 +349,42 @@ for skill in jobtitles:
 
     # Fill missing values with None
     out_df_combined = out_df_combined.where(pd.notnull(out_df_combined), None)
-    
-    sheet = connect_to_google_sheets_docs()
-    
-    push_to_google_sheet(sheet, out_df_combined)
-    
-    # append to csv as well
-    if count == 0:
-        out_df_combined.to_csv("skills.csv", index=False)
-    out_df_combined.to_csv("skills.csv", mode='a', header=False, index=False)
-    count += 1
-    
-    print("Data has been pushed successfully")   
+
     end = time.time()
     print("Time taken:", round(end - start, 2), "seconds")
-        
-    
-    
\ No newline at end of file
+    return out_df_combined
+
+def open_outputs():
+    return credential_pool.load_pool(connect_to_google_sheets_docs, DEFAULT_CREDENTIALS_FILE)
+
+def process_titles(professions: list, outputs) -> dict:
+    # Runs generate -> sheet -> skills.csv for a batch; returns {profession: error} for failures
+    frames, errors = concurrency.generate_all(generate_row, professions)
+    if frames:
+        import pandas as pd
+        out_df_combined = pd.concat(list(frames.values()), ignore_index=True)
+        try:
+            # Push from the least-loaded service account
+            outputs.call(lambda account: push_to_google_sheet(account.connect(), out_df_combined))
+        except Exception as e:
+            print("Writing batch failed:", e)
+            traceback.print_exc()
+            errors.update({profession: e for profession in professions if profession not in errors})
+            return errors
+
+        # append to csv as well
+        out_df_combined.to_csv("skills.csv", mode='a', header=not os.path.exists("skills.csv"), index=False)
+        print("Data has been pushed successfully")
+    return errors
+
+def read_input_titles(schedule: bool = False):
+    # Professions default to the built-in list; TITLES_INPUT streams them from a CSV/JSONL file or stdin
+    if os.getenv("TITLES_INPUT"):
+        return title_stream.iter_titles(os.getenv("TITLES_INPUT"), "job_titles", str.title, schedule=schedule)
+    jobtitles = ['Software Engineer', 'Data Analyst', 'Product Manager', 'UX Designer', 'Digital Marketer']
+    if schedule:
+        return ((title, None, None) for title in jobtitles)
+    return iter(jobtitles)
+
+def main() -> None:
+    process_titles(list(read_input_titles()), open_outputs())
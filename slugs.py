@@ -0,0 +1,127 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("slugs")
+
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+# URL slugs for generated pages. A title is normalised to lowercase ASCII words joined by
+# hyphens; when another title in the same collection already owns that slug, "-2", "-3", ...
+# is appended. Every slug a collection has handed out lives in SLUG_INDEX, loaded into
+# memory once per collection, so assigning a slug is a dict lookup plus one insert rather
+# than a scan of everything published. A title always gets back the slug it was given first,
+# which keeps regenerated rows on the same URL.
+#
+#   python cli.py slugs job_description     # seed the index from the worksheet's slug column
+
+SLUG_INDEX = os.getenv("SLUG_INDEX", "slugs.db")
+SLUG_MAX_LENGTH = int(os.getenv("SLUG_MAX_LENGTH", "80"))
+
+def slugify(title: str) -> str:
+    text = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode("ascii").lower()
+    text = text.replace("&", " and ").replace("+", " plus ").replace("#", " sharp ")
+    slug = re.sub(r"[^a-z0-9]+", "-", text).strip("-")
+    if len(slug) > SLUG_MAX_LENGTH:
+        # Cut on a word boundary so a slug never ends in half a word
+        slug = slug[:SLUG_MAX_LENGTH + 1].rsplit("-", 1)[0]
+    return slug or "item"
+
+class SlugIndex:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS slugs (
+                collection TEXT, slug TEXT, title TEXT,
+                PRIMARY KEY (collection, slug)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS slugs_by_title ON slugs (collection, title)")
+        # collection -> {slug: title} and {title: slug}, loaded on first use
+        self._slugs = {}
+        self._titles = {}
+        # collection -> {base slug: last suffix tried}, so a popular base is not re-probed from 2
+        self._suffixes = {}
+        self._lock = threading.Lock()
+
+    def _load(self, collection: str, reload: bool = False) -> None:
+        if collection in self._slugs and not reload:
+            return
+        slugs, titles = {}, {}
+        for slug, title in self.conn.execute("SELECT slug, title FROM slugs WHERE collection = ?", (collection,)):
+            slugs[slug] = title
+            titles.setdefault(title, slug)
+        self._slugs[collection] = slugs
+        self._titles[collection] = titles
+        self._suffixes[collection] = {}
+        print(f"Slug index loaded: {len(slugs)} slugs in {collection}")
+
+    def _insert(self, collection: str, slug: str, title: str) -> bool:
+        # False when the slug is already owned in the database, e.g. taken by another worker
+        # since this process loaded the collection
+        try:
+            self.conn.execute("INSERT INTO slugs VALUES (?, ?, ?)", (collection, slug, title))
+        except sqlite3.IntegrityError:
+            return False
+        self._slugs[collection][slug] = title
+        self._titles[collection].setdefault(title, slug)
+        return True
+
+    def assign(self, collection: str, title: str) -> str:
+        with self._lock:
+            self._load(collection)
+            while True:
+                if title in self._titles[collection]:
+                    return self._titles[collection][title]
+                slugs, suffixes = self._slugs[collection], self._suffixes[collection]
+                base = slug = slugify(title)
+                suffix = suffixes.get(base, 1)
+                while slug in slugs:
+                    suffix += 1
+                    slug = f"{base}-{suffix}"
+                if suffix > 1:
+                    suffixes[base] = suffix
+                if self._insert(collection, slug, title):
+                    return slug
+                # Another process got there first; its slugs (and possibly this title) are picked
+                # up and the next free suffix is tried
+                self._load(collection, reload=True)
+
+    def seed(self, collection: str, pairs) -> int:
+        # pairs of (title, slug) already published, e.g. from a worksheet; the existing
+        # owner of a slug is kept. Returns how many slugs were new to the index.
+        added = 0
+        with self._lock:
+            self._load(collection)
+            self.conn.execute("BEGIN")
+            for title, slug in pairs:
+                if slug and slug not in self._slugs[collection] and self._insert(collection, slug, title):
+                    added += 1
+            self.conn.execute("COMMIT")
+        return added
+
+_index = None
+
+def slug_index() -> SlugIndex:
+    global _index
+    if _index is None:
+        _index = SlugIndex(SLUG_INDEX)
+    return _index
+
+def assign(collection: str, title: str) -> str:
+    return slug_index().assign(collection, title)
+
+def seed_from_worksheet(collection: str, generator) -> int:
+    # One read of the worksheet; rows whose slug cell is set reserve that slug
+    connect = generator.connect_to_google_sheets_docs()
+    sheet = connect[0] if isinstance(connect, tuple) else connect
+    values = sheet.get_all_values()
+    if not values or "slug" not in values[0]:
+        return 0
+    title_column, slug_column = 0, values[0].index("slug")
+    added = slug_index().seed(collection, (
+        (row[title_column], row[slug_column]) for row in values[1:] if len(row) > slug_column))
+    print(f"Seeded {added} slugs into {collection}")
+    return added
@@ -0,0 +1,68 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_cms
+from cms_sink import CMSClient, CMSSink
+
+COLUMNS = ["job_title", "slug", "job_description", "collection_id", "locale_id", "item_id", "created_on", "updated_on", "published_on"]
+
+class ListSink:
+    # Stands in for the SheetSink: keeps every row handed on by the CMS sink
+    def __init__(self):
+        self.rows = []
+
+    def submit(self, rows: list) -> None:
+        self.rows.extend(rows)
+
+    def flush(self) -> None:
+        pass
+
+    def take_failed(self) -> dict:
+        return {}
+
+    def close(self) -> dict:
+        return {}
+
+def make_row(title: str, slug: str, description: str) -> list:
+    return [title, slug, description] + [""] * 6
+
+class CMSSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.server, self.cms, base_url = fake_cms.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.sheet = ListSink()
+        self.sink = CMSSink(COLUMNS, then=self.sheet, client=CMSClient(base_url, "token", "jobs"))
+
+    def test_rows_are_created_and_get_their_item_ids(self):
+        self.sink.submit([make_row("Data Analyst", "data-analyst", "Analyses data."),
+                          make_row("SEO Manager", "seo-manager", "Runs SEO.")])
+        self.assertEqual(self.sink.close(), {})
+
+        items = {item["fieldData"]["slug"]: item for item in self.cms.collections["jobs"].values()}
+        self.assertEqual(set(items), {"data-analyst", "seo-manager"})
+        self.assertEqual(items["seo-manager"]["fieldData"]["name"], "SEO Manager")
+        self.assertEqual(items["seo-manager"]["fieldData"]["job-description"], "Runs SEO.")
+        for row in self.sheet.rows:
+            item = items[row[COLUMNS.index("slug")]]
+            self.assertEqual(row[COLUMNS.index("item_id")], item["id"])
+            self.assertEqual(row[COLUMNS.index("collection_id")], "jobs")
+            self.assertEqual(row[COLUMNS.index("locale_id")], item["cmsLocaleId"])
+            self.assertEqual(row[COLUMNS.index("created_on")], item["createdOn"])
+
+    def test_known_slugs_are_updated_in_place(self):
+        self.sink.submit([make_row("Data Analyst", "data-analyst", "First draft.")])
+        self.assertEqual(self.sink.take_failed(), {})
+        self.sink.submit([make_row("Data Analyst", "data-analyst", "Second draft.")])
+        self.assertEqual(self.sink.close(), {})
+
+        items = list(self.cms.collections["jobs"].values())
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]["fieldData"]["job-description"], "Second draft.")
+        self.assertEqual([row[COLUMNS.index("item_id")] for row in self.sheet.rows], [items[0]["id"]] * 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google_batch
+from google_batch import RateLimiter
+
+class FakeClock:
+    # Stands in for the time module: sleeping moves the clock forward and is recorded
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class RateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(google_batch, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_calls_within_the_bucket_do_not_wait(self):
+        limiter = RateLimiter(60)
+        limiter.acquire(30)
+        limiter.acquire(30)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_a_batch_larger_than_the_bucket_waits_off_its_debt(self):
+        limiter = RateLimiter(60)
+        limiter.acquire(90)
+        self.assertEqual(self.clock.sleeps, [30])
+        # The debt was slept off, so the bucket starts again from empty
+        limiter.acquire(1)
+        self.assertEqual(self.clock.sleeps, [30, 1])
+
+    def test_later_callers_wait_until_the_debt_is_repaid(self):
+        limiter = RateLimiter(60)
+        with mock.patch.object(self.clock, "sleep", self.clock.sleeps.append):
+            # Two callers take their tokens before either has slept
+            limiter.acquire(90)
+            limiter.acquire(6)
+        self.assertEqual(self.clock.sleeps, [30, 36])
+
+    def test_the_bucket_refills_only_up_to_a_minute_of_calls(self):
+        limiter = RateLimiter(60)
+        limiter.acquire(60)
+        self.clock.now += 3600
+        limiter.acquire(60)
+        limiter.acquire(6)
+        self.assertEqual(self.clock.sleeps, [6])
+
+if __name__ == "__main__":
+    unittest.main()
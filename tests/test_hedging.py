@@ -0,0 +1,44 @@
+import os
+import sys
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hedging
+
+def attempts(*seconds):
+    # make_call for hedged_call: each attempt sleeps for the next duration, then returns a
+    # response using 15 tokens
+    durations = list(seconds)
+
+    async def attempt():
+        duration = durations.pop(0)
+        await asyncio.sleep(duration)
+        return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5), duration=duration)
+    return attempt
+
+class HedgedCallTest(unittest.TestCase):
+    def setUp(self):
+        self.budget = hedging.HedgeBudget(1000)
+        for patcher in [mock.patch.object(hedging, "hedge_delay", lambda *args: 0.05),
+                        mock.patch.object(hedging, "estimated_tokens", lambda *args: 100)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_cancelled_hedge_stays_charged_at_the_estimate(self):
+        response, hedged = asyncio.run(hedging.hedged_call(attempts(0.2, 1.0), "job_description", budget=self.budget))
+        self.assertFalse(hedged)
+        self.assertEqual(response.duration, 0.2)
+        self.assertEqual(self.budget.spent, 100)
+
+    def test_winning_hedge_is_charged_its_usage(self):
+        response, hedged = asyncio.run(hedging.hedged_call(attempts(1.0, 0.05), "job_description", budget=self.budget))
+        self.assertTrue(hedged)
+        self.assertEqual(response.duration, 0.05)
+        self.assertEqual(self.budget.spent, 15)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import near_duplicates
+
+TEXT = ("The data analyst collects, cleans and models sales data from every region, builds weekly "
+        "dashboards for the leadership team and explains the trends behind the numbers to product managers.")
+
+OTHER_TEXT = ("The registered nurse assesses patients on the ward, gives medication on schedule, keeps care "
+              "plans up to date and works with doctors and families to plan each discharge safely.")
+
+def texts_of(text: str) -> dict:
+    return {"text": text}
+
+class DuplicateIndexTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.index = near_duplicates.DuplicateIndex(os.path.join(tmp.name, "index.db"))
+        patcher = mock.patch.object(near_duplicates, "_index", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add(self, title: str, text: str) -> list:
+        return self.index.add("job_description.text", title, near_duplicates.signature(text))
+
+    def test_signatures_estimate_jaccard_similarity(self):
+        sig = near_duplicates.signature(TEXT)
+        self.assertEqual(near_duplicates.similarity(sig, near_duplicates.signature(TEXT.upper())), 1.0)
+        self.assertLess(near_duplicates.similarity(sig, near_duplicates.signature(OTHER_TEXT)), 0.1)
+        self.assertIsNone(near_duplicates.signature("<p> </p>"))
+
+    def test_check_matches_indexed_near_duplicates_only(self):
+        self.assertEqual(self.add("Data Analyst", TEXT), [])
+        self.add("Nurse", OTHER_TEXT)
+
+        [(sig, matches)] = near_duplicates.check("job_description", "Sales Analyst", texts_of(TEXT + " Daily.")).values()
+        self.assertEqual([title for title, score in matches], ["Data Analyst"])
+        self.assertGreaterEqual(matches[0][1], near_duplicates.DUPLICATE_THRESHOLD)
+        # A title is never its own duplicate, and other content types have their own index
+        self.assertEqual(near_duplicates.check("job_description", "Data Analyst", texts_of(TEXT))["text"][1], [])
+        self.assertEqual(near_duplicates.check("interview_questions", "Sales Analyst", texts_of(TEXT))["text"][1], [])
+
+    def test_add_returns_matches_and_replaces_a_regenerated_title(self):
+        self.add("Data Analyst", TEXT)
+        self.assertEqual([title for title, score in self.add("Sales Analyst", TEXT)], ["Data Analyst"])
+        # Regenerated with different text: the old signature no longer matches
+        self.add("Sales Analyst", OTHER_TEXT)
+        self.assertEqual(self.index.query("job_description.text", near_duplicates.signature(TEXT), exclude="Data Analyst"), [])
+
+class FirstDistinctTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.index = near_duplicates.DuplicateIndex(os.path.join(tmp.name, "index.db"))
+        patcher = mock.patch.object(near_duplicates, "_index", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def flags(self) -> list:
+        return self.index.conn.execute("SELECT field, title, duplicate_of FROM flags").fetchall()
+
+    def test_title_added_between_check_and_add_is_flagged(self):
+        real_check = near_duplicates.check
+
+        def check_then_race(content_type, title, texts):
+            # A concurrent title with the same text is indexed right after this one is checked
+            checked = real_check(content_type, title, texts)
+            if title == "Data Analyst":
+                near_duplicates.first_distinct(content_type, "Sales Analyst", lambda attempt: TEXT, texts_of)
+            return checked
+
+        with mock.patch.object(near_duplicates, "check", check_then_race):
+            near_duplicates.first_distinct("job_description", "Data Analyst", lambda attempt: TEXT, texts_of)
+        self.assertEqual(self.flags(), [("job_description.text", "Data Analyst", "Sales Analyst")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outbox
+from google_batch import RateLimiter
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, (phase, call) in self.requests:
+            if phase in self.service.down:
+                raise ConnectionError(f"{phase} unavailable")
+        for request_id, (phase, call) in self.requests:
+            self.callback(request_id, call(), None)
+
+class FakeService:
+    # Docs and Drive in one: every call is a (phase, function) pair run by the batch, and a
+    # batch holding a call of a phase listed in `down` fails as a whole
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.shared = []
+        self.down = set()
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+    def documents(self):
+        return self
+
+    def permissions(self):
+        return self
+
+    def create(self, body=None, fileId=None, **kwargs):
+        if fileId is not None:
+            return "share", lambda: self.shared.append(fileId) or {"id": "permission"}
+        document_id = f"doc-{body['title']}"
+        return "create", lambda: self.created.append(document_id) or {"documentId": document_id}
+
+    def batchUpdate(self, documentId, body):
+        return "update", lambda: self.updated.append(documentId) or {}
+
+class FakeAccount:
+    def __init__(self, service):
+        self.service = service
+        self.docs_limiter = RateLimiter(6000)
+        self.drive_limiter = RateLimiter(6000)
+
+    def connect(self):
+        return None, self.service, self.service
+
+    def record(self, calls):
+        pass
+
+    def record_throttle(self):
+        pass
+
+class FakePool:
+    def __init__(self, account):
+        self.account = account
+
+    def pick(self):
+        return self.account
+
+class ListSink:
+    def __init__(self):
+        self.rows = []
+
+    def submit(self, rows):
+        self.rows.extend(rows)
+
+def doc(title: str) -> dict:
+    return {"title": title, "requests": [{"insertText": {"text": title}}]}
+
+class WriteDocsTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.box = outbox.Outbox(os.path.join(tmp.name, "outbox.db"))
+        self.service = FakeService()
+        self.pool = FakePool(FakeAccount(self.service))
+        self.sink = ListSink()
+        patcher = mock.patch.object(outbox, "docs_breaker", outbox.CircuitBreaker("docs"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_replay_continues_a_doc_that_was_already_created(self):
+        # Create goes through, then the batchUpdate round trip fails
+        self.service.down = {"update"}
+        errors = outbox.write_docs("job_description", self.pool, {"Data Analyst": doc("Data Analyst")},
+                                   {"Data Analyst": ["Data Analyst", ""]}, self.sink, self.box)
+        self.assertIn("Data Analyst", errors)
+        self.assertEqual(self.service.created, ["doc-Data Analyst"])
+        [(key, seq, payload)] = self.box.pending("job_description", "docs")
+        self.assertEqual(payload["doc"]["document_id"], "doc-Data Analyst")
+
+        self.service.down = set()
+        outbox.write_docs("job_description", self.pool, {}, {}, self.sink, self.box)
+        self.assertEqual(self.service.created, ["doc-Data Analyst"])
+        self.assertEqual(self.service.updated, ["doc-Data Analyst"])
+        self.assertEqual(self.service.shared, ["doc-Data Analyst"])
+        self.assertEqual(self.box.count("job_description", "docs"), 0)
+        self.assertEqual(self.sink.rows[-1], ["Data Analyst", "https://docs.google.com/document/d/doc-Data Analyst/copy"])
+
+    def test_current_docs_go_out_ahead_of_a_capped_backlog(self):
+        self.box.record("job_description", "docs", {
+            f"Old {i}": {"doc": doc(f"Old {i}"), "row": [f"Old {i}", ""]} for i in range(3)})
+        with mock.patch.object(outbox, "OUTBOX_DRAIN_BATCH", 2):
+            errors = outbox.write_docs("job_description", self.pool, {"New": doc("New")}, {"New": ["New", ""]},
+                                       self.sink, self.box)
+        self.assertEqual(errors, {})
+        self.assertEqual(self.service.created, ["doc-New", "doc-Old 0"])
+        self.assertEqual(self.box.count("job_description", "docs"), 2)
+
+if __name__ == "__main__":
+    unittest.main()
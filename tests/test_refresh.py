@@ -0,0 +1,77 @@
+import os
+import sys
+import types
+import tempfile
+import unittest
+from collections import defaultdict, deque
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cli
+import concurrency
+import refresh
+import usage_history
+
+SECTION_TOKENS = 300
+
+def make_sectional_generator() -> types.ModuleType:
+    # Stands in for a sectional generator: each title is two calls recorded under
+    # "sectional_fake:<section>", none under the content type itself
+    generator = types.ModuleType("sectional_fake_gen")
+    generator.processed = []
+
+    def generate_row(title):
+        with usage_history.tagged(title=title):
+            for section in ("basic", "advanced"):
+                usage_history.record_usage(f"sectional_fake:{section}", "gpt-4o-mini", 0.1, SECTION_TOKENS - 100, 100)
+        generator.processed.append(title)
+
+    def process_titles(titles, outputs):
+        _, errors = concurrency.generate_all(generate_row, titles)
+        return errors
+
+    generator.build_request = lambda title: {"messages": [{"role": "user", "content": title}]}
+    generator.open_outputs = lambda: None
+    generator.process_titles = process_titles
+    return generator
+
+class RefreshBudgetTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.generator = make_sectional_generator()
+        self.ledger = refresh.RefreshLedger(os.path.join(tmp.name, "refresh.db"))
+        for patcher in [
+            mock.patch.dict(sys.modules, {"sectional_fake_gen": self.generator}),
+            mock.patch.dict(cli.GENERATORS, {"sectional_fake": "sectional_fake_gen"}),
+            mock.patch.object(usage_history, "USAGE_HISTORY_PATH", os.path.join(tmp.name, "usage.jsonl")),
+            mock.patch.object(usage_history, "_recent", defaultdict(lambda: deque(maxlen=usage_history.RECENT_WINDOW))),
+            mock.patch.object(usage_history, "_loaded", True),
+            mock.patch.object(refresh, "_ledger", self.ledger),
+            mock.patch.object(refresh, "REFRESH_BATCH_SIZE", 1),
+            # Lower than a title really costs, as before any history exists
+            mock.patch.object(refresh, "REFRESH_DEFAULT_TITLE_TOKENS", 100),
+            mock.patch.object(refresh, "allowance", lambda now=None: 1000),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ledger.seed("sectional_fake", [f"Title {i}" for i in range(10)])
+
+    def test_section_calls_are_charged_and_stop_the_run(self):
+        refresh.run("sectional_fake")
+
+        # One title at the default estimate; its two sections then cost more than is left
+        self.assertEqual(self.generator.processed, ["Title 0"])
+        self.assertEqual(self.ledger.spent(refresh.today()), 2 * SECTION_TOKENS)
+        self.assertEqual(refresh.tokens_per_title("sectional_fake"), 2 * SECTION_TOKENS)
+
+    def test_shared_stages_count_only_for_titles_of_the_content_type(self):
+        refresh.run("sectional_fake")
+        usage_history.record_usage("role_profile", "gpt-4o-mini", 0.1, 50, 50, title="Title 0")
+        usage_history.record_usage("role_profile", "gpt-4o-mini", 0.1, 50, 50, title="Other title")
+
+        self.assertEqual(refresh.tokens_per_title("sectional_fake"), 2 * SECTION_TOKENS + 100)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import re
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sheet_shards
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.id = "spreadsheet-1"
+        self.title = "Interview questions"
+        self.client = None
+        self.worksheets = []
+
+    def worksheet(self, title):
+        return next(sheet for sheet in self.worksheets if sheet.title == title)
+
+    def add_worksheet(self, title, rows, cols):
+        sheet = FakeWorksheet(self, title, cols)
+        self.worksheets.append(sheet)
+        return sheet
+
+    def fetch_sheet_metadata(self):
+        return {"sheets": [
+            {"properties": {"gridProperties": {"rowCount": max(len(sheet.rows), 1), "columnCount": sheet.col_count}}}
+            for sheet in self.worksheets]}
+
+    def values_batch_update(self, body):
+        for data in body["data"]:
+            title, row_number = re.match(r"'(.+)'!A(\d+)$", data["range"]).groups()
+            self.worksheet(title).rows[int(row_number) - 1] = data["values"][0]
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, columns):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.col_count = columns
+        self.rows = []
+
+    def col_values(self, column):
+        return [row[column - 1] for row in self.rows]
+
+    def row_values(self, row_number):
+        return self.rows[row_number - 1]
+
+    def append_row(self, row, value_input_option=None):
+        self.rows.append(row)
+
+    def append_rows(self, rows, value_input_option=None):
+        start = len(self.rows) + 1
+        self.rows.extend(rows)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:B{len(self.rows)}"}}
+
+class FakePool:
+    def __init__(self):
+        self.keyfiles = []
+
+    def call(self, fn, limiter="sheets_limiter"):
+        return fn(None)
+
+class ShardedSheetTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.spreadsheet = FakeSpreadsheet()
+        self.base = self.spreadsheet.add_worksheet("Sheet1", 1, 2)
+        self.base.append_row(["job_title", "text"])
+        self.manifest = sheet_shards.ShardManifest(os.path.join(tmp.name, "manifest.db"))
+        # Two columns: four rows, header included, fit in a shard
+        patcher = mock.patch.object(sheet_shards, "SHEET_SHARD_MAX_CELLS", 8)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sharded(self) -> sheet_shards.ShardedSheet:
+        return sheet_shards.ShardedSheet("interview_questions", FakePool(), lambda account: self.base,
+                                         manifest=self.manifest)
+
+    def test_appends_roll_over_to_a_new_worksheet(self):
+        self.sharded().write({f"Title {i}": [f"Title {i}", "v1"] for i in range(5)})
+
+        self.assertEqual([sheet.title for sheet in self.spreadsheet.worksheets], ["Sheet1", "Sheet1 (2)"])
+        self.assertEqual(self.base.col_values(1), ["job_title", "Title 0", "Title 1", "Title 2"])
+        second = self.spreadsheet.worksheet("Sheet1 (2)")
+        self.assertEqual(second.col_values(1), ["job_title", "Title 3", "Title 4"])
+        self.assertEqual([shard["rows"] for shard in self.manifest.shards("interview_questions")], [4, 3])
+        self.assertEqual(self.manifest.locate("interview_questions", "Title 4"),
+                         {"spreadsheet_id": "spreadsheet-1", "worksheet": "Sheet1 (2)", "row": 3})
+
+    def test_rows_in_later_shards_are_updated_in_place(self):
+        self.sharded().write({f"Title {i}": [f"Title {i}", "v1"] for i in range(5)})
+        # A new sink reads the manifest, not the sheet
+        self.sharded().write({"Title 4": ["Title 4", "v2"], "Title 5": ["Title 5", "v1"]})
+
+        second = self.spreadsheet.worksheet("Sheet1 (2)")
+        self.assertEqual(second.rows, [["job_title", "text"], ["Title 3", "v1"], ["Title 4", "v2"], ["Title 5", "v1"]])
+        self.assertEqual(len(self.spreadsheet.worksheets), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sheet_sink import SheetSink
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def values_batch_update(self, body):
+        for data in body["data"]:
+            row_number = int(re.search(r"A(\d+)$", data["range"]).group(1))
+            self.worksheet.rows[row_number - 1] = data["values"][0]
+
+class FakeWorksheet:
+    # Rows as lists, header first; lose_next_response makes the next append land on the sheet
+    # and then fail as if its response had timed out
+    def __init__(self, header):
+        self.title = "Sheet1"
+        self.rows = [header]
+        self.spreadsheet = FakeSpreadsheet(self)
+        self.lose_next_response = False
+
+    def col_values(self, column):
+        return [row[column - 1] for row in self.rows]
+
+    def get(self, range_name):
+        start = int(re.match(r"[A-Z]+(\d+):", range_name).group(1))
+        return [[row[0]] for row in self.rows[start - 1:]]
+
+    def append_rows(self, rows, value_input_option=None):
+        start = len(self.rows) + 1
+        self.rows.extend(rows)
+        if self.lose_next_response:
+            self.lose_next_response = False
+            raise TimeoutError("response lost")
+        return {"updates": {"updatedRange": f"'Sheet1'!A{start}:B{len(self.rows)}"}}
+
+class FakePool:
+    def call(self, fn, limiter="sheets_limiter"):
+        return fn(None)
+
+class SheetSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.sheet = FakeWorksheet(["job_title", "text"])
+        self.sink = SheetSink(FakePool(), lambda account: self.sheet)
+
+    def test_titles_appended_elsewhere_are_updated_not_appended(self):
+        self.sink.submit([["Data Analyst", "v1"]])
+        self.sink.flush()
+        # Another worker appends a title this sink has not seen
+        self.sheet.rows.append(["SEO Manager", "theirs"])
+        self.sink.submit([["SEO Manager", "ours"], ["Data Analyst", "v2"]])
+        self.assertEqual(self.sink.close(), {})
+        self.assertEqual(self.sheet.rows, [["job_title", "text"], ["Data Analyst", "v2"], ["SEO Manager", "ours"]])
+
+    def test_retry_after_a_lost_append_response_does_not_duplicate(self):
+        self.sink.submit([["Data Analyst", "v1"]])
+        self.sink.flush()
+        self.sheet.lose_next_response = True
+        self.sink.submit([["SEO Manager", "v1"]])
+        self.assertEqual(self.sink.close(), {})
+        self.assertEqual(self.sheet.col_values(1), ["job_title", "Data Analyst", "SEO Manager"])
+
+if __name__ == "__main__":
+    unittest.main()
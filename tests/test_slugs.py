@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import slugs
+
+class SlugifyTest(unittest.TestCase):
+    def test_titles_become_ascii_words_joined_by_hyphens(self):
+        self.assertEqual(slugs.slugify("Café Manager (Night Shift)"), "cafe-manager-night-shift")
+        self.assertEqual(slugs.slugify("C# & C++ Developer"), "c-sharp-and-c-plus-plus-developer")
+        self.assertEqual(slugs.slugify("!!!"), "item")
+
+    def test_long_slugs_are_cut_on_a_word_boundary(self):
+        slug = slugs.slugify("Senior " * 20 + "Engineer")
+        self.assertLessEqual(len(slug), slugs.SLUG_MAX_LENGTH)
+        self.assertTrue(slug.endswith("senior"))
+
+class SlugIndexTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "slugs.db")
+        self.index = slugs.SlugIndex(self.path)
+
+    def test_colliding_titles_get_the_next_free_suffix(self):
+        self.assertEqual(self.index.assign("job_description", "Data Analyst"), "data-analyst")
+        self.assertEqual(self.index.assign("job_description", "Data-Analyst"), "data-analyst-2")
+        self.assertEqual(self.index.assign("job_description", "Data analyst!"), "data-analyst-3")
+        # Collections do not share slugs
+        self.assertEqual(self.index.assign("interview_questions", "Data-Analyst"), "data-analyst")
+
+    def test_a_title_keeps_the_slug_it_was_given_first(self):
+        self.index.assign("job_description", "Data Analyst")
+        slug = self.index.assign("job_description", "Data-Analyst")
+        self.assertEqual(self.index.assign("job_description", "Data-Analyst"), slug)
+        self.assertEqual(slugs.SlugIndex(self.path).assign("job_description", "Data-Analyst"), slug)
+
+    def test_slug_taken_by_another_process_is_skipped(self):
+        self.index.assign("job_description", "Nurse")
+        other = slugs.SlugIndex(self.path)
+        self.assertEqual(other.assign("job_description", "Data Analyst"), "data-analyst")
+        # This index loaded the collection before the other process took the slug
+        self.assertEqual(self.index.assign("job_description", "Data-Analyst"), "data-analyst-2")
+        self.assertEqual(self.index.assign("job_description", "Data Analyst"), "data-analyst")
+
+    def test_seeded_slugs_are_kept_by_their_owner(self):
+        added = self.index.seed("job_description", [("Data Analyst", "analyst"), ("Nurse", ""), ("Other", "analyst")])
+        self.assertEqual(added, 1)
+        self.assertEqual(self.index.assign("job_description", "Data Analyst"), "analyst")
+        self.assertEqual(self.index.assign("job_description", "Analyst"), "analyst-2")
+
+if __name__ == "__main__":
+    unittest.main()
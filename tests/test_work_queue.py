@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import work_queue
+
+class SqliteQueueTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.queue = work_queue.SqliteQueue(os.path.join(tmp.name, "queue.db"))
+        self.queue.enqueue("job_description", ["Data Analyst", "Nurse"])
+
+    def titles(self, items: list) -> list:
+        return [item["title"] for item in items]
+
+    def test_leased_items_are_not_claimed_twice(self):
+        self.assertEqual(self.titles(self.queue.claim("job_description", "worker-1", 1)), ["Data Analyst"])
+        self.assertEqual(self.titles(self.queue.claim("job_description", "worker-2", 10)), ["Nurse"])
+        self.assertEqual(self.queue.claim("job_description", "worker-3", 10), [])
+
+    def test_lapsed_lease_is_handed_to_another_worker(self):
+        # A lease that has already run out, as for a worker that died mid-batch
+        [item] = self.queue.claim("job_description", "worker-1", 1, lease_seconds=-1)
+        [again] = self.queue.claim("job_description", "worker-2", 1)
+        self.assertEqual(again["id"], item["id"])
+
+    def test_ack_from_a_worker_that_lost_its_lease_is_ignored(self):
+        [item] = self.queue.claim("job_description", "worker-1", 1, lease_seconds=-1)
+        self.queue.claim("job_description", "worker-2", 1)
+        self.queue.ack("job_description", [item["id"]], "worker-1")
+        self.assertEqual(self.queue.status("job_description"), {"leased": 1, "queued": 1})
+
+        self.queue.ack("job_description", [item["id"]], "worker-2")
+        self.assertEqual(self.queue.status("job_description"), {"done": 1, "queued": 1})
+
+    def test_lease_lapsing_on_the_last_attempt_parks_the_item(self):
+        with mock.patch.object(work_queue, "MAX_ATTEMPTS", 2):
+            for worker in ("worker-1", "worker-2"):
+                self.queue.claim("job_description", worker, 1, lease_seconds=-1)
+            self.assertEqual(self.titles(self.queue.claim("job_description", "worker-3", 10)), ["Nurse"])
+        self.assertEqual(self.queue.status("job_description"), {"failed": 1, "leased": 1})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import io
+import csv
+import sys
+import json
+
+# Titles are read lazily, one row at a time, so memory stays flat for any input size and
+# the first request goes out as soon as the first row is parsed. A source may be a CSV
+# path, a .jsonl path (one {"<column>": ...} object per line) or "-" for stdin (CSV, or
+# JSONL when TITLES_FORMAT=jsonl). With schedule=True each title comes with the raw
+# PRIORITY_COLUMN and DEADLINE_COLUMN cells of its row, for the work queue's scheduler.
+
+PRIORITY_COLUMN = os.getenv("PRIORITY_COLUMN", "priority")
+DEADLINE_COLUMN = os.getenv("DEADLINE_COLUMN", "deadline")
+
+def open_source(source: str):
+    if source == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+    # utf-8-sig drops the byte-order mark spreadsheet exports often start with
+    return open(source, "r", encoding="utf-8-sig", newline="")
+
+def is_jsonl(source: str) -> bool:
+    if source == "-":
+        return os.getenv("TITLES_FORMAT", "csv").lower() == "jsonl"
+    return source.lower().endswith((".jsonl", ".ndjson"))
+
+def iter_rows(source: str, column: str = None):
+    # With column set, a CSV whose header lacks it is an error rather than zero titles
+    with open_source(source) as f:
+        if is_jsonl(source):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            reader = csv.DictReader(f)
+            if column is not None and reader.fieldnames is not None and column not in reader.fieldnames:
+                raise ValueError(f"{source} has no {column!r} column (header: {', '.join(reader.fieldnames)})")
+            yield from reader
+
+def iter_titles(source: str, column: str, normalize=None, schedule: bool = False):
+    # Yields each non-empty title, whitespace-collapsed and normalized on the fly, or
+    # (title, priority, deadline) when schedule is set
+    for row in iter_rows(source, column):
+        title = row.get(column)
+        if title is None:
+            continue
+        title = " ".join(str(title).split())
+        if normalize is not None:
+            title = normalize(title)
+        if title:
+            yield (title, row.get(PRIORITY_COLUMN), row.get(DEADLINE_COLUMN)) if schedule else title
@@ -0,0 +1,50 @@
+import os
+import math
+import usage_history
+
+# max_tokens is sized from the recorded completion-token distribution so each call
+# reserves less rate-limit capacity; the generator's own value stays the ceiling.
+TOKEN_PLAN_PERCENTILE = float(os.getenv("TOKEN_PLAN_PERCENTILE", "99.9"))
+TOKEN_PLAN_MARGIN = float(os.getenv("TOKEN_PLAN_MARGIN", "1.15"))
+TOKEN_PLAN_MIN_SAMPLES = int(os.getenv("TOKEN_PLAN_MIN_SAMPLES", "30"))
+TOKEN_PLAN_FLOOR = int(os.getenv("TOKEN_PLAN_FLOOR", "256"))
+
+def token_planning_enabled() -> bool:
+    return os.getenv("TOKEN_PLANNING", "1").lower() in ("1", "true", "yes")
+
+def limit_key(request: dict) -> str:
+    # py_resume_temp_gen.py uses the newer max_completion_tokens parameter
+    return "max_completion_tokens" if "max_completion_tokens" in request else "max_tokens"
+
+def completion_tokens_seen(content_type: str) -> list:
+    # Truncated calls only tell us the cap, not the real length, so they are left out
+    return [
+        r["completion_tokens"] for r in usage_history.recent_records(content_type)
+        if r.get("completion_tokens") is not None and r.get("finish_reason") != "length"
+    ]
+
+def planned_max_tokens(content_type: str, ceiling: int):
+    observed = completion_tokens_seen(content_type)
+    if len(observed) < TOKEN_PLAN_MIN_SAMPLES:
+        return None
+    planned = math.ceil(usage_history.percentile(observed, TOKEN_PLAN_PERCENTILE) * TOKEN_PLAN_MARGIN)
+    return max(TOKEN_PLAN_FLOOR, min(ceiling, planned))
+
+def size_request(content_type: str, request: dict):
+    # Returns (request with a tightened token cap, the generator's original cap)
+    key = limit_key(request)
+    ceiling = request.get(key)
+    if not token_planning_enabled() or ceiling is None:
+        return request, ceiling
+    planned = planned_max_tokens(content_type, ceiling)
+    if planned is None or planned >= ceiling:
+        return request, ceiling
+    return dict(request, **{key: planned}), ceiling
+
+def grow_request(request: dict, ceiling):
+    # After a finish_reason == "length" truncation: double the cap up to the ceiling,
+    # or None when the call already ran at the generator's full allowance
+    key = limit_key(request)
+    if ceiling is None or request.get(key) is None or request[key] >= ceiling:
+        return None
+    return dict(request, **{key: min(ceiling, request[key] * 2)})
@@ -0,0 +1,112 @@
+import os
+import math
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict, deque
+
+# Every OpenAI call is appended here as one JSON line so latency and token
+# distributions per content type survive between runs
+USAGE_HISTORY_PATH = os.getenv("USAGE_HISTORY_PATH", "usage_history.jsonl")
+RECENT_WINDOW = int(os.getenv("USAGE_HISTORY_WINDOW", "500"))
+
+# Tags (job title, flags) merged into every record written inside a `tagged` block
+_call_tags = contextvars.ContextVar("call_tags", default={})
+# Lists receiving every record written inside a `collected` block, e.g. all calls for one title
+_collectors = contextvars.ContextVar("collectors", default=())
+
+_lock = threading.Lock()
+_recent = defaultdict(lambda: deque(maxlen=RECENT_WINDOW))
+_loaded = False
+
+def _load_recent() -> None:
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    if not os.path.exists(USAGE_HISTORY_PATH):
+        return
+    with open(USAGE_HISTORY_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            _recent[record.get("content_type")].append(record)
+
+@contextmanager
+def tagged(**tags):
+    token = _call_tags.set({**_call_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _call_tags.reset(token)
+
+@contextmanager
+def collected():
+    # Yields a list that fills with the records of calls made inside the block, including
+    # calls from asyncio tasks started inside it
+    records = []
+    token = _collectors.set(_collectors.get() + (records,))
+    try:
+        yield records
+    finally:
+        _collectors.reset(token)
+
+def record_usage(content_type: str, model: str, latency: float, prompt_tokens, completion_tokens, finish_reason=None, **extra) -> dict:
+    record = {
+        "ts": time.time(),
+        "content_type": content_type,
+        "model": model,
+        "latency": round(latency, 3),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "finish_reason": finish_reason,
+    }
+    record.update(_call_tags.get())
+    record.update(extra)
+    for records in _collectors.get():
+        records.append(record)
+    with _lock:
+        _load_recent()
+        _recent[content_type].append(record)
+        with open(USAGE_HISTORY_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    return record
+
+def recent_records(content_type: str, model: str = None) -> list:
+    with _lock:
+        _load_recent()
+        records = list(_recent[content_type])
+    if model is not None:
+        records = [r for r in records if r.get("model") == model]
+    return records
+
+def iter_history():
+    # Streams the full history file, not just the in-memory recent window
+    if not os.path.exists(USAGE_HISTORY_PATH):
+        return
+    with open(USAGE_HISTORY_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def content_types() -> list:
+    with _lock:
+        _load_recent()
+        return sorted(k for k in _recent if k)
+
+def recent_values(content_type: str, key: str, model: str = None) -> list:
+    return [r[key] for r in recent_records(content_type, model) if r.get(key) is not None]
+
+def percentile(values: list, q: float):
+    # Nearest-rank percentile, q in [0, 100]
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
@@ -0,0 +1,362 @@
+if __name__ == "__main__":
+    import cli
+    cli.run_script("queue")
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import importlib
+import concurrency
+import scheduler
+
+# Queue-backed mode: titles are enqueued once, then any number of workers (on any number
+# of hosts) claim batches under a lease, run generate -> doc -> sheet and ack. A worker
+# that dies simply lets its lease expire and the titles are handed to someone else.
+#
+#   python cli.py queue enqueue job_description [titles.csv]
+#   python cli.py queue work job_description [--forever]
+#   python cli.py queue status job_description
+#   python cli.py queue eta job_description
+#
+# Titles are claimed by priority tier and deadline (scheduler.py) rather than file order.
+#
+# WORK_QUEUE_URL picks the backend: sqlite:///work_queue.db (default) or redis://host:6379/0
+
+from cli import GENERATORS
+
+LEASE_SECONDS = int(os.getenv("WORK_QUEUE_LEASE_SECONDS", "1800"))
+MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+# A claimed batch must finish inside the lease, so keep batch size * per-title time well below it
+CLAIM_BATCH_SIZE = int(os.getenv("WORK_QUEUE_BATCH_SIZE", "10"))
+IDLE_POLL_SECONDS = float(os.getenv("WORK_QUEUE_POLL_SECONDS", "10"))
+
+class SqliteQueue:
+    def __init__(self, path: str):
+        # WAL lets many local workers read while one claims
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_type TEXT NOT NULL,
+                title TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                lease_until REAL,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                enqueued_at REAL NOT NULL
+            )""")
+        # Scheduling columns; added in place to queues created before them
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(items)")}
+        for column, definition in [("tier", "INTEGER NOT NULL DEFAULT 1"), ("score", "REAL NOT NULL DEFAULT 0"),
+                                   ("deadline", "REAL"), ("done_at", "REAL")]:
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE items ADD COLUMN {column} {definition}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS items_claim ON items (content_type, status, lease_until)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS workers (seq INTEGER PRIMARY KEY AUTOINCREMENT, worker TEXT UNIQUE)")
+
+    def enqueue(self, content_type: str, titles) -> int:
+        # titles are plain titles or (title, priority, deadline) tuples
+        now = time.time()
+        items = (scheduler.schedule_item(title) for title in titles)
+        # One transaction: the connection autocommits, which would otherwise sync every row
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self.conn.executemany(
+                "INSERT INTO items (content_type, title, enqueued_at, tier, score, deadline) VALUES (?, ?, ?, ?, ?, ?)",
+                ((content_type, item["title"], now, scheduler.TIER_RANK[item["tier"]], item["score"], item["deadline"])
+                 for item in items))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    # Claim order: effective tier (a near deadline counts as high), earliest deadline,
+    # highest score, then enqueue order
+    _CLAIM_ORDER = """
+        CASE WHEN deadline IS NOT NULL AND deadline < :soon THEN 0 ELSE tier END,
+        deadline IS NULL, deadline, score DESC, id"""
+    _CLAIMABLE = """
+        content_type = :content_type
+        AND (status = 'queued' OR (status = 'leased' AND lease_until < :now AND attempts < :max_attempts))"""
+
+    def claim(self, content_type: str, worker: str, count: int, lease_seconds: int = LEASE_SECONDS) -> list:
+        # Queued items and items whose lease has lapsed are both claimable
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # A lease that lapsed on its last attempt is parked as failed, not left leased
+            self.conn.execute("""
+                UPDATE items SET status = 'failed', lease_until = NULL, last_error = 'lease expired on the last attempt'
+                WHERE content_type = ? AND status = 'leased' AND lease_until < ? AND attempts >= ?""",
+                (content_type, now, MAX_ATTEMPTS))
+            rows = self.conn.execute(f"""
+                SELECT id, title, tier, deadline FROM items
+                WHERE {self._CLAIMABLE}
+                ORDER BY {self._CLAIM_ORDER} LIMIT :count""", {
+                    "content_type": content_type, "now": now, "max_attempts": MAX_ATTEMPTS, "count": count,
+                    "soon": now + scheduler.DEADLINE_ESCALATION_HOURS * 3600}).fetchall()
+            self.conn.executemany(
+                "UPDATE items SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                ((worker, now + lease_seconds, item_id) for item_id, _, _, _ in rows))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return [
+            {"id": item_id, "title": title, "tier": scheduler.effective_tier(scheduler.TIERS[tier], deadline, now)}
+            for item_id, title, tier, deadline in rows
+        ]
+
+    def ack(self, content_type: str, item_ids: list, worker: str) -> None:
+        now = time.time()
+        self.conn.executemany(
+            "UPDATE items SET status = 'done', lease_until = NULL, done_at = ? WHERE id = ? AND worker = ?",
+            ((now, item_id, worker) for item_id in item_ids))
+
+    def nack(self, content_type: str, item_id: int, worker: str, error: str) -> None:
+        # Back to the queue until MAX_ATTEMPTS, then parked as failed
+        self.conn.execute("""
+            UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                lease_until = NULL, last_error = ?
+            WHERE id = ? AND worker = ?""", (MAX_ATTEMPTS, error, item_id, worker))
+
+    def register_worker(self, worker: str) -> int:
+        self.conn.execute("INSERT OR IGNORE INTO workers (worker) VALUES (?)", (worker,))
+        return self.conn.execute("SELECT seq FROM workers WHERE worker = ?", (worker,)).fetchone()[0]
+
+    def status(self, content_type: str) -> dict:
+        rows = self.conn.execute(
+            "SELECT status, COUNT(*) FROM items WHERE content_type = ? GROUP BY status", (content_type,)).fetchall()
+        return dict(rows)
+
+    def backlog(self, content_type: str) -> list:
+        # [(effective tier, deadline)] for everything not yet done, in claim order
+        now = time.time()
+        rows = self.conn.execute(f"""
+            SELECT tier, deadline FROM items
+            WHERE content_type = :content_type AND status IN ('queued', 'leased') AND attempts < :max_attempts
+            ORDER BY {self._CLAIM_ORDER}""", {
+                "content_type": content_type, "max_attempts": MAX_ATTEMPTS,
+                "soon": now + scheduler.DEADLINE_ESCALATION_HOURS * 3600}).fetchall()
+        return [(scheduler.effective_tier(scheduler.TIERS[tier], deadline, now), deadline) for tier, deadline in rows]
+
+    def done_since(self, content_type: str, since: float) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM items WHERE content_type = ? AND status = 'done' AND done_at >= ?",
+            (content_type, since)).fetchone()[0]
+
+class RedisQueue:
+    # Same contract on a Redis-compatible server: a list of queued ids per tier, a sorted set
+    # of leases scored by expiry, a sorted set of deadlines, and a hash per item
+    # Pops up to ARGV[1] ids from the tier lists (KEYS, highest tier first, leases set last) and
+    # leases them to ARGV[2] until ARGV[3], all in one step, so a worker that dies midway can
+    # neither lose an item nor leave it popped without a lease. ARGV[4] is the item key prefix.
+    # Returns [id, title, tier index, ...].
+    _CLAIM_SCRIPT = """
+        local claimed = {}
+        local leases = KEYS[#KEYS]
+        local remaining = tonumber(ARGV[1])
+        for tier = 1, #KEYS - 1 do
+            while remaining > 0 do
+                local item_id = redis.call('LPOP', KEYS[tier])
+                if not item_id then break end
+                local item_key = ARGV[4] .. item_id
+                redis.call('ZADD', leases, ARGV[3], item_id)
+                redis.call('HSET', item_key, 'status', 'leased', 'worker', ARGV[2])
+                redis.call('HINCRBY', item_key, 'attempts', 1)
+                table.insert(claimed, item_id)
+                table.insert(claimed, redis.call('HGET', item_key, 'title'))
+                table.insert(claimed, tier - 1)
+                remaining = remaining - 1
+            end
+        end
+        return claimed"""
+
+    def __init__(self, url: str):
+        import redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self._claim = self.redis.register_script(self._CLAIM_SCRIPT)
+
+    def _key(self, content_type: str, name: str) -> str:
+        return f"work_queue:{content_type}:{name}"
+
+    def _queued(self, content_type: str, tier: str) -> str:
+        # The normal tier keeps the original list name, so queues filled before tiers still drain
+        return self._key(content_type, "queued" if tier == scheduler.DEFAULT_TIER else f"queued:{tier}")
+
+    def enqueue(self, content_type: str, titles) -> int:
+        # titles are plain titles or (title, priority, deadline) tuples
+        count = 0
+        pipe = self.redis.pipeline()
+        for title in titles:
+            item = scheduler.schedule_item(title)
+            item_id = uuid.uuid4().hex
+            pipe.hset(self._key(content_type, item_id), mapping={
+                "title": item["title"], "attempts": 0, "status": "queued", "tier": item["tier"],
+                "deadline": item["deadline"] if item["deadline"] is not None else ""})
+            pipe.rpush(self._queued(content_type, item["tier"]), item_id)
+            if item["deadline"] is not None and item["tier"] != "high":
+                pipe.zadd(self._key(content_type, "deadlines"), {item_id: item["deadline"]})
+            count += 1
+            if count % 1000 == 0:
+                pipe.execute()
+        pipe.execute()
+        return count
+
+    def _requeue_expired(self, content_type: str) -> None:
+        leases = self._key(content_type, "leases")
+        for item_id in self.redis.zrangebyscore(leases, 0, time.time()):
+            # zrem succeeds for exactly one worker, so an expired item is requeued once
+            if self.redis.zrem(leases, item_id):
+                item_key = self._key(content_type, item_id)
+                if int(self.redis.hget(item_key, "attempts") or 0) >= MAX_ATTEMPTS:
+                    self.redis.hset(item_key, mapping={"status": "failed", "last_error": "lease expired on the last attempt"})
+                    continue
+                self.redis.hset(item_key, "status", "queued")
+                self.redis.lpush(self._queued(content_type, self.redis.hget(item_key, "tier") or scheduler.DEFAULT_TIER), item_id)
+
+    def _escalate(self, content_type: str) -> None:
+        # Items whose deadline is near move to the front of the high tier
+        deadlines = self._key(content_type, "deadlines")
+        soon = time.time() + scheduler.DEADLINE_ESCALATION_HOURS * 3600
+        for item_id in self.redis.zrangebyscore(deadlines, 0, soon):
+            if self.redis.zrem(deadlines, item_id):
+                item_key = self._key(content_type, item_id)
+                tier = self.redis.hget(item_key, "tier") or scheduler.DEFAULT_TIER
+                if self.redis.lrem(self._queued(content_type, tier), 1, item_id):
+                    self.redis.lpush(self._queued(content_type, "high"), item_id)
+                self.redis.hset(item_key, "tier", "high")
+
+    def claim(self, content_type: str, worker: str, count: int, lease_seconds: int = LEASE_SECONDS) -> list:
+        self._requeue_expired(content_type)
+        self._escalate(content_type)
+        keys = [self._queued(content_type, tier) for tier in scheduler.TIERS] + [self._key(content_type, "leases")]
+        claimed = self._claim(keys=keys, args=[count, worker, time.time() + lease_seconds, self._key(content_type, "")])
+        return [
+            {"id": claimed[i], "title": claimed[i + 1], "tier": scheduler.TIERS[int(claimed[i + 2])]}
+            for i in range(0, len(claimed), 3)
+        ]
+
+    def _holds(self, content_type: str, item_id: str, worker: str) -> bool:
+        # An item whose lease lapsed may have been claimed by another worker since; only the
+        # current holder may ack or nack it
+        return self.redis.hget(self._key(content_type, item_id), "worker") == worker
+
+    def ack(self, content_type: str, item_ids: list, worker: str) -> None:
+        now = time.time()
+        for item_id in item_ids:
+            if not self._holds(content_type, item_id, worker):
+                continue
+            self.redis.zrem(self._key(content_type, "leases"), item_id)
+            self.redis.hset(self._key(content_type, item_id), "status", "done")
+            self.redis.zadd(self._key(content_type, "done"), {item_id: now})
+
+    def nack(self, content_type: str, item_id: str, worker: str, error: str) -> None:
+        if not self._holds(content_type, item_id, worker):
+            return
+        item_key = self._key(content_type, item_id)
+        self.redis.zrem(self._key(content_type, "leases"), item_id)
+        attempts = int(self.redis.hget(item_key, "attempts") or 0)
+        if attempts >= MAX_ATTEMPTS:
+            self.redis.hset(item_key, mapping={"status": "failed", "last_error": error})
+        else:
+            self.redis.hset(item_key, mapping={"status": "queued", "last_error": error})
+            self.redis.rpush(self._queued(content_type, self.redis.hget(item_key, "tier") or scheduler.DEFAULT_TIER), item_id)
+
+    def register_worker(self, worker: str) -> int:
+        return self.redis.incr("work_queue:workers")
+
+    def status(self, content_type: str) -> dict:
+        return {
+            "queued": sum(self.redis.llen(self._queued(content_type, tier)) for tier in scheduler.TIERS),
+            "leased": self.redis.zcard(self._key(content_type, "leases")),
+        }
+
+    def backlog(self, content_type: str) -> list:
+        # [(tier, deadline)] for leased items, then queued ones in claim order
+        item_ids = [(item_id, None) for item_id in self.redis.zrange(self._key(content_type, "leases"), 0, -1)]
+        for tier in scheduler.TIERS:
+            item_ids += [(item_id, tier) for item_id in self.redis.lrange(self._queued(content_type, tier), 0, -1)]
+        pipe = self.redis.pipeline()
+        for item_id, _ in item_ids:
+            pipe.hmget(self._key(content_type, item_id), "tier", "deadline")
+        backlog = []
+        for (item_id, tier), (stored_tier, deadline) in zip(item_ids, pipe.execute()):
+            backlog.append((tier or stored_tier or scheduler.DEFAULT_TIER, float(deadline) if deadline else None))
+        return backlog
+
+    def done_since(self, content_type: str, since: float) -> int:
+        return self.redis.zcount(self._key(content_type, "done"), since, "+inf")
+
+def connect_queue(url: str = None):
+    url = url or os.getenv("WORK_QUEUE_URL", "sqlite:///work_queue.db")
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisQueue(url)
+    return SqliteQueue(url[len("sqlite:///"):] if url.startswith("sqlite:///") else url)
+
+def assign_credentials(queue, worker: str) -> None:
+    # Workers split the service accounts (GOOGLE_CREDENTIALS_FILES) by registration index,
+    # so together they stay within each account's per-user quota (credential_pool.py)
+    os.environ["CREDENTIAL_POOL_WORKER"] = str(queue.register_worker(worker) - 1)
+
+def run_worker(content_type: str, queue=None, worker: str = None, forever: bool = False) -> None:
+    # The same loop serves one local worker or twenty on different hosts
+    queue = queue or connect_queue()
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    assign_credentials(queue, worker)
+    generator = importlib.import_module(GENERATORS[content_type])
+    outputs = generator.open_outputs()
+
+    while True:
+        items = queue.claim(content_type, worker, CLAIM_BATCH_SIZE)
+        if not items:
+            if not forever:
+                print(f"Worker {worker}: queue drained")
+                if hasattr(generator, "close_outputs"):
+                    generator.close_outputs(outputs)
+                return
+            time.sleep(IDLE_POLL_SECONDS)
+            continue
+        ids_by_title = {}
+        for item in items:
+            ids_by_title.setdefault(item["title"], []).append(item["id"])
+            # High-tier titles may use the OpenAI concurrency held back from the rest
+            concurrency.title_priorities[item["title"]] = item.get("tier", scheduler.DEFAULT_TIER)
+        errors = generator.process_titles(list(ids_by_title), outputs)
+        if hasattr(generator, "flush_outputs"):
+            # Rows are written in the background, so a title is only acked once its row has
+            # reached the sheet (or is held in the outbox); rows given up on go back to the queue
+            for title, error in generator.flush_outputs(outputs).items():
+                if title in ids_by_title:
+                    errors.setdefault(title, error)
+        for title, error in errors.items():
+            for item_id in ids_by_title[title]:
+                queue.nack(content_type, item_id, worker, str(error))
+        queue.ack(content_type, [item_id for title, item_ids in ids_by_title.items() if title not in errors for item_id in item_ids], worker)
+        for title in ids_by_title:
+            concurrency.title_priorities.pop(title, None)
+        print(f"Worker {worker}: {len(ids_by_title) - len(errors)} titles done, {len(errors)} returned to queue")
+        print(json.dumps(concurrency.metrics()))
+
+def main(command: str, content_type: str, source: str = None, forever: bool = False) -> None:
+    queue = connect_queue()
+    if command == "enqueue":
+        # Titles are read and normalized exactly as the generator's own input
+        if source:
+            os.environ["TITLES_INPUT"] = source
+        generator = importlib.import_module(GENERATORS[content_type])
+        print("Enqueued", queue.enqueue(content_type, generator.read_input_titles(schedule=True)), "titles")
+    elif command == "work":
+        run_worker(content_type, queue, forever=forever)
+    elif command == "status":
+        print(json.dumps(queue.status(content_type)))
+    elif command == "eta":
+        done = queue.done_since(content_type, time.time() - scheduler.THROUGHPUT_WINDOW_SECONDS)
+        for row in scheduler.eta_report(queue.backlog(content_type), done):
+            print(json.dumps(row))